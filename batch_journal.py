@@ -0,0 +1,177 @@
+import os
+import json
+from dataclasses import dataclass, field, is_dataclass
+from typing import Any, Dict, Iterator, Optional
+
+import events
+import results
+from results import Record
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка файла недоступна, запись одного процесса остается атомарной
+    fcntl = None
+
+def source_signature(path: str) -> str:
+    """Размер и время изменения книги: если файл изменился, сохраненные результаты не используются"""
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+def settings_key(**settings) -> str:
+    """Параметры пакета, от которых зависят результаты; записи с другими параметрами не восстанавливаются"""
+    return json.dumps(settings, ensure_ascii=False, sort_keys=True)
+
+# Типы, которые восстанавливаются из журнала: только результаты из results.py. Имя типа
+# в строке журнала не импортируется, поэтому испорченный журнал не загрузит чужой модуль
+RESULT_TYPES = {
+    f"{cls.__module__}:{cls.__qualname__}": cls for cls in vars(results).values()
+    if isinstance(cls, type) and issubclass(cls, Record) and cls is not Record and cls.__module__ == results.__name__
+}
+
+def encode_value(value: Any) -> Any:
+    """Переводит результат этапа (Record из results.py) в JSON с указанием типа"""
+    if is_dataclass(value) and not isinstance(value, type):
+        cls = type(value)
+        name = f"{cls.__module__}:{cls.__qualname__}"
+        if RESULT_TYPES.get(name) is not cls:
+            raise TypeError(f"{name} не относится к результатам results.py и не записывается в журнал")
+        # Вложенные результаты восстанавливает from_dict по аннотациям полей
+        return {'__dataclass__': name, 'fields': value.to_dict()}
+    if isinstance(value, dict):
+        return {key: encode_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+    return value
+
+def decode_value(value: Any) -> Any:
+    """Восстанавливает значение, записанное encode_value"""
+    if isinstance(value, dict):
+        if '__dataclass__' in value:
+            cls = RESULT_TYPES.get(value['__dataclass__'])
+            if cls is None:
+                raise ValueError(f"Недопустимый тип в журнале: {value['__dataclass__']}")
+            return cls.from_dict({key: decode_value(item) for key, item in value['fields'].items()})
+        return {key: decode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+    return value
+
+@dataclass
+class JournalState:
+    books: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # книга -> запись об успешной обработке
+    stages: Dict[str, Dict[str, Dict[str, Any]]] = field(default_factory=dict)  # книга -> этап -> поля результата
+
+class BatchJournal:
+    """Журнал пакетной обработки: одна JSON запись на строку, только дозапись.
+
+    Родительский процесс записывает итог каждой книги, рабочие процессы - каждый
+    завершенный этап вместе с его результатом. Каждая запись пишется одним вызовом
+    write под блокировкой файла и сбрасывается на диск через fsync, поэтому записи
+    разных процессов не перемешиваются, а после сбоя теряется не больше одной строки.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def append(self, record: Dict[str, Any]):
+        data = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+            os.fsync(fd)
+        finally:
+            os.close(fd)  # Закрытие снимает блокировку
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Читает записи журнала; оборванная при сбое строка пропускается"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def _terminate_torn_line(self):
+        """Завершает оборванную последнюю строку, чтобы следующая запись не склеилась с ней"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n":
+                return
+        with open(self.path, 'ab') as f:
+            f.write(b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self, book_settings: str, stage_settings: str) -> JournalState:
+        """Состояние прошлых запусков: обработанные книги и завершенные этапы необработанных.
+
+        Учитываются только записи с теми же параметрами, сделанные для неизмененных файлов.
+        """
+        self._terminate_torn_line()
+        state = JournalState()
+        signatures: Dict[str, Optional[str]] = {}
+
+        def current(book: str) -> Optional[str]:
+            if book not in signatures:
+                try:
+                    signatures[book] = source_signature(book)
+                except OSError:
+                    signatures[book] = None
+            return signatures[book]
+
+        for record in self.records():
+            book = record.get('book')
+            if not book or record.get('source') != current(book):
+                continue
+            if record.get('type') == 'book' and record.get('settings') == book_settings and record.get('ok'):
+                state.books[book] = record
+            elif record.get('type') == 'stage' and record.get('settings') == stage_settings:
+                state.stages.setdefault(book, {})[record['stage']] = record['fields']
+        # Для обработанных книг этапы не понадобятся
+        for book in state.books:
+            state.stages.pop(book, None)
+        return state
+
+    def record_book(self, path: str, settings: str, ok: bool, error: Optional[str] = None,
+                    elapsed: float = 0.0, report_path: Optional[str] = None):
+        self.append({
+            'type': 'book', 'book': os.path.abspath(path), 'source': source_signature(path), 'settings': settings,
+            'ok': ok, 'error': error, 'elapsed': elapsed, 'report_path': report_path,
+        })
+
+class BookCheckpoint:
+    """Завершенные этапы одной книги: восстановленные из журнала и записываемые по ходу обработки"""
+
+    def __init__(self, journal: BatchJournal, book: str, settings: str,
+                 stages: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.journal = journal
+        self.book = os.path.abspath(book)
+        self.settings = settings
+        self.source = source_signature(book)
+        self.stages = stages or {}
+
+    def completed(self) -> Dict[str, Dict[str, Any]]:
+        """Этап -> поля ProcessingResult; этапы, которые не удалось восстановить, будут выполнены заново"""
+        restored = {}
+        for stage, encoded in self.stages.items():
+            try:
+                restored[stage] = {name: decode_value(value) for name, value in encoded.items()}
+            except Exception as e:
+                events.problem(f"Не удалось восстановить этап {stage} из журнала: {str(e)}", item=stage,
+                               level="warning", book=self.book)
+        return restored
+
+    def record(self, stage: str, values: Dict[str, Any]):
+        self.journal.append({
+            'type': 'stage', 'book': self.book, 'source': self.source, 'settings': self.settings,
+            'stage': stage, 'fields': {name: encode_value(value) for name, value in values.items()},
+        })
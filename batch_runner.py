@@ -0,0 +1,456 @@
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import argparse
+import multiprocessing
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows: ограничение памяти процесса недоступно
+    resource = None
+
+import events
+import runtime
+from batch_journal import BatchJournal, BookCheckpoint, settings_key
+from report_sink import ReportSink, select_fields
+from metrics import ProcessingMetrics, TextfileExporter
+
+@dataclass
+class BookOutcome:
+    path: str
+    ok: bool = False
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    report_path: Optional[str] = None
+    report: Optional[Dict[str, Any]] = None  # Заполняется, только если нужен общий отчет
+    resumed: bool = False  # Книга обработана в прошлом запуске и взята из журнала
+    metrics: Optional[Dict[str, Any]] = None  # Метрики книги из рабочего процесса (MetricsRegistry.snapshot)
+
+@dataclass
+class BatchSummary:
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    outcomes: List[BookOutcome] = field(default_factory=list)
+
+    @property
+    def books_per_second(self) -> float:
+        return (self.succeeded + self.failed) / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def failures(self) -> List[Tuple[str, str]]:
+        return [(outcome.path, outcome.error) for outcome in self.outcomes if not outcome.ok]
+
+def collect_books(inputs: List[str]) -> List[str]:
+    """Раскрывает директории (рекурсивно) и glob-шаблоны в список EPUB файлов"""
+    books = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                books.extend(os.path.join(root, name) for name in files if name.lower().endswith('.epub'))
+        elif glob.has_magic(item):
+            books.extend(path for path in glob.glob(item, recursive=True) if os.path.isfile(path))
+        else:
+            books.append(item)
+    # Убираем дубликаты, сохраняя порядок
+    return list(dict.fromkeys(os.path.normpath(path) for path in books))
+
+def book_key(index: int, path: str) -> str:
+    """Уникальное имя книги в рамках пакета для отчетов и выходных директорий"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{index:05d}-{stem}"
+
+def process_book(path: str, key: str, options: Dict[str, Any]) -> BookOutcome:
+    """Обрабатывает одну книгу в рабочем процессе собственным EpubProcessor"""
+    from main import EpubProcessor
+    from memory_budget import MemoryBudget
+
+    outcome = BookOutcome(path=path)
+    output_dir = os.path.join(options['output_root'], key) if options.get('output_root') else None
+    memory_budget = MemoryBudget(options['memory_budget_mb']) if options.get('memory_budget_mb') else None
+    checkpoint = None
+    if options.get('journal'):
+        checkpoint = BookCheckpoint(BatchJournal(options['journal']), path, options['stage_settings'],
+                                    options.get('completed_stages'))
+    processor = EpubProcessor(path, options.get('search_pattern'), options.get('library_dir', './library'), output_dir,
+                              memory_budget=memory_budget, checkpoint=checkpoint)
+    processor.process_parallel(options.get('stages'))
+
+    if options.get('report_dir'):
+        outcome.report_path = os.path.join(options['report_dir'], f"{key}.json")
+        processor.save_results(outcome.report_path, compact=True)
+    if options.get('collect_reports') or options.get('report_stream'):
+        # Родителю передаются только выбранные поля: меньше данных через очередь и в памяти
+        outcome.report = select_fields(processor.build_report(), options.get('report_fields'))
+
+    failed_stages = [name for name, status in processor.result.thread_statuses.items() if status.startswith("Ошибка")]
+    outcome.ok = not failed_stages
+    if failed_stages:
+        outcome.error = f"Ошибки в этапах: {', '.join(sorted(failed_stages))}"
+    return outcome
+
+def _worker_main(worker_id: int, tasks, results, options: Dict[str, Any], handler: Callable):
+    """Цикл рабочего процесса: получает книги по одной и отправляет результат"""
+    if resource is not None and options.get('memory_limit'):
+        # Ограничиваем адресное пространство, чтобы перерасход памяти одной книгой
+        # приводил к MemoryError в этом процессе, а не к OOM всей машины
+        limit = options['memory_limit']
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if options.get('verbose'):
+        # События этапов выводит сам рабочий процесс; без подписчика они ничего не стоят
+        events.subscribe(events.ConsoleRenderer(verbose=True))
+    # Процессорный бюджет делится между рабочими процессами, иначе каждый заведет по потоку на ядро
+    runtime.configure(options.get('io_workers'), options.get('cpu_workers'))
+    # Метрики собираются по событиям процесса и уходят родителю вместе с итогом каждой книги
+    collector = ProcessingMetrics().subscribe() if options.get('metrics') else None
+
+    handled = 0
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        index, path, key, completed_stages = task
+        # Этапы книги, завершенные в прошлом запуске, передаются только вместе с ней
+        book_options = dict(options, completed_stages=completed_stages) if completed_stages else options
+        start = time.perf_counter()
+        exit_code = None
+        try:
+            outcome = handler(path, key, book_options)
+        except MemoryError:
+            outcome = BookOutcome(path=path, error="Превышен лимит памяти")
+            # После MemoryError состояние процесса ненадежно - процесс будет заменен
+            exit_code = 3
+        except Exception as e:
+            outcome = BookOutcome(path=path, error=f"{type(e).__name__}: {str(e)}")
+        outcome.elapsed = time.perf_counter() - start
+        if collector is not None:
+            if not collector.books.snapshot():
+                # Обработка прервалась до завершения книги (например, неизвестный этап)
+                collector.books.inc(status="done" if outcome.ok else "failed")
+            outcome.metrics = collector.registry.snapshot()
+            collector.registry.reset()
+
+        handled += 1
+        if exit_code is None and options.get('max_books_per_worker') and handled >= options['max_books_per_worker']:
+            exit_code = 0
+        # Последний элемент сообщает родителю, что процесс завершается и новых книг ему не нужно
+        results.put((worker_id, index, outcome, exit_code is not None))
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+class BatchRunner:
+    """Пакетная обработка книг пулом долгоживущих процессов.
+
+    Каждый процесс обрабатывает книги по одной; падение процесса, зависание или
+    перерасход памяти засчитывается как ошибка только той книги, которую он обрабатывал,
+    а вместо упавшего процесса запускается новый.
+
+    Если задан журнал (journal), итог каждой книги и каждый завершенный этап записываются
+    в него; повторный запуск с тем же журналом пропускает обработанные книги, а у
+    прерванных не повторяет уже выполненные этапы (преобразования изображений, архив глав).
+
+    Если задан report_stream, отчет каждой книги дописывается строкой в NDJSON файл
+    (.gz - со сжатием) сразу по готовности и не хранится до конца пакета.
+
+    Если задан metrics_textfile, метрики обработки (metrics.ProcessingMetrics) всех
+    процессов собираются в self.metrics и периодически пишутся в файл в формате
+    Prometheus для textfile collector.
+    """
+
+    def __init__(self, workers: Optional[int] = None, library_dir: str = "./library",
+                 search_pattern: Optional[str] = None, output_root: Optional[str] = None,
+                 report_dir: Optional[str] = None, collect_reports: bool = False,
+                 memory_limit_mb: Optional[int] = None, timeout: Optional[float] = None,
+                 max_books_per_worker: Optional[int] = None, progress: bool = True,
+                 stages: Optional[List[str]] = None, memory_budget_mb: Optional[int] = None,
+                 journal: Optional[str] = None, verbose: bool = False, report_stream: Optional[str] = None,
+                 report_fields: Optional[List[str]] = None, io_workers: Optional[int] = None,
+                 cpu_workers: Optional[int] = None, metrics_textfile: Optional[str] = None,
+                 metrics_interval: float = 15.0, handler: Callable[[str, str, Dict[str, Any]], BookOutcome] = process_book):
+        self.workers = workers or os.cpu_count() or 4
+        self.timeout = timeout
+        self.progress = progress
+        self.handler = handler
+        self.metrics = ProcessingMetrics()
+        self.metrics_textfile = metrics_textfile
+        self.metrics_interval = metrics_interval
+        self.options = {
+            'library_dir': library_dir,
+            'search_pattern': search_pattern,
+            'output_root': output_root,
+            'report_dir': report_dir,
+            'collect_reports': collect_reports,
+            'memory_limit': memory_limit_mb * 1024 * 1024 if memory_limit_mb else None,
+            'max_books_per_worker': max_books_per_worker,
+            'stages': stages,
+            'memory_budget_mb': memory_budget_mb,
+            'journal': journal,
+            'verbose': verbose,
+            'report_stream': report_stream,
+            'report_fields': report_fields,
+            'io_workers': io_workers,
+            'cpu_workers': cpu_workers or max(1, (os.cpu_count() or 4) // self.workers),
+            'metrics': bool(metrics_textfile),
+            # Результаты этапов зависят от слова для поиска, а набор обработанного в книге - еще и от этапов
+            'stage_settings': settings_key(search_pattern=search_pattern),
+            'book_settings': settings_key(search_pattern=search_pattern, stages=stages, output_root=output_root),
+        }
+        self._context = multiprocessing.get_context()
+
+    def _spawn(self, worker_id: int, results) -> Tuple[Any, Any]:
+        tasks = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main, args=(worker_id, tasks, results, self.options, self.handler), daemon=True
+        )
+        process.start()
+        return process, tasks
+
+    def run(self, books: List[str]) -> BatchSummary:
+        """Обрабатывает список книг и возвращает сводку"""
+        start = time.perf_counter()
+        summary = BatchSummary(total=len(books))
+        if self.options['report_dir']:
+            os.makedirs(self.options['report_dir'], exist_ok=True)
+
+        journal = BatchJournal(self.options['journal']) if self.options['journal'] else None
+        state = journal.load(self.options['book_settings'], self.options['stage_settings']) if journal else None
+
+        sink = ReportSink(self.options['report_stream']) if self.options['report_stream'] else None
+        exporter = TextfileExporter(self.metrics.registry, self.metrics_textfile, self.metrics_interval) \
+            if self.metrics_textfile else None
+
+        results = self._context.Queue()
+        pending = [(index, path) for index, path in enumerate(books)
+                   if state is None or os.path.abspath(path) not in state.books]
+        pending.reverse()
+        outcomes: Dict[int, BookOutcome] = {}
+        workers: Dict[int, Tuple[Any, Any]] = {}
+        assigned: Dict[int, Tuple[int, float]] = {}  # worker_id -> (индекс книги, время начала)
+        next_worker_id = 0
+
+        def assign(worker_id: int):
+            if pending:
+                index, path = pending.pop()
+                completed_stages = state.stages.get(os.path.abspath(path)) if state else None
+                workers[worker_id][1].put((index, path, book_key(index, path), completed_stages))
+                assigned[worker_id] = (index, time.perf_counter())
+
+        def remove_worker(worker_id: int, error: Optional[str] = None):
+            """Убирает процесс; если он не успел закончить книгу, засчитывает ей ошибку"""
+            process, tasks = workers.pop(worker_id)
+            if worker_id in assigned:
+                index, started = assigned.pop(worker_id)
+                record(index, BookOutcome(path=books[index], error=error, elapsed=time.perf_counter() - started))
+            if process.is_alive():
+                process.terminate()
+            process.join(timeout=5)
+            tasks.close()
+
+        def record(index: int, outcome: BookOutcome):
+            if index in outcomes:
+                return
+            outcomes[index] = outcome
+            if outcome.metrics is not None:
+                self.metrics.registry.merge(outcome.metrics)
+                outcome.metrics = None
+            elif not outcome.resumed:
+                # Процесс упал или превысил время - итог книги известен только родителю
+                self.metrics.books.inc(status="failed")
+            if exporter is not None:
+                exporter.maybe_write()
+            if sink is not None and not outcome.resumed:
+                # Отчет книги из прошлого запуска уже есть в файле
+                sink.write({**(outcome.report or {'epub_path': outcome.path}),
+                            'ok': outcome.ok, 'error': outcome.error, 'elapsed': outcome.elapsed})
+                if journal is not None:
+                    # Книга, записанная в журнал, при продолжении пропускается: ее строка отчета
+                    # должна быть на диске раньше записи журнала, а не в буфере сжатия
+                    sink.flush()
+                if not self.options['collect_reports']:
+                    outcome.report = None
+            if journal is not None and not outcome.resumed:
+                try:
+                    journal.record_book(outcome.path, self.options['book_settings'], outcome.ok, outcome.error,
+                                        outcome.elapsed, outcome.report_path)
+                except OSError as e:
+                    events.problem(f"Ошибка при записи в журнал {journal.path}: {str(e)}",
+                                   item=book_key(index, outcome.path), level="error", book=outcome.path)
+            if self.progress:
+                status = "ok" if outcome.ok else f"ошибка: {outcome.error}"
+                if outcome.resumed:
+                    status = "из журнала"
+                print(f"[{len(outcomes)}/{len(books)}] {outcome.path} ({outcome.elapsed:.2f} с, {status})")
+
+        def handle(message):
+            worker_id, index, outcome, exiting = message
+            record(index, outcome)
+            if assigned.get(worker_id, (None,))[0] == index:
+                del assigned[worker_id]
+            if worker_id not in workers:
+                return
+            if exiting:
+                # Процесс завершается сам (лимит книг или MemoryError) - заменим его на следующем шаге
+                remove_worker(worker_id)
+            else:
+                assign(worker_id)
+
+        if state is not None:
+            for index, path in enumerate(books):
+                if os.path.abspath(path) in state.books:
+                    record(index, self._resumed_outcome(path, state.books[os.path.abspath(path)]))
+
+        try:
+            while len(outcomes) < len(books):
+                # Поддерживаем нужное число процессов, пока есть работа
+                while len(workers) < min(self.workers, len(pending) + len(assigned)):
+                    workers[next_worker_id] = self._spawn(next_worker_id, results)
+                    assign(next_worker_id)
+                    next_worker_id += 1
+
+                try:
+                    message = results.get(timeout=0.2)
+                except queue.Empty:
+                    message = None
+                if message is not None:
+                    handle(message)
+                    continue
+
+                now = time.perf_counter()
+                for worker_id in list(workers):
+                    if worker_id not in workers:
+                        continue
+                    process, _ = workers[worker_id]
+                    if worker_id in assigned and self.timeout and now - assigned[worker_id][1] > self.timeout:
+                        remove_worker(worker_id, f"Превышено время обработки ({self.timeout} с)")
+                    elif not process.is_alive():
+                        # Процесс мог успеть отправить результат перед выходом - дочитываем очередь
+                        while True:
+                            try:
+                                handle(results.get_nowait())
+                            except queue.Empty:
+                                break
+                        if worker_id in workers:
+                            remove_worker(worker_id, f"Рабочий процесс завершился с кодом {process.exitcode}")
+        finally:
+            if sink is not None:
+                sink.close()
+            for process, tasks in workers.values():
+                tasks.put(None)
+            for process, tasks in workers.values():
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+
+        summary.outcomes = [outcomes[index] for index in range(len(books))]
+        summary.succeeded = sum(1 for outcome in summary.outcomes if outcome.ok)
+        summary.failed = summary.total - summary.succeeded
+        summary.elapsed = time.perf_counter() - start
+        if exporter is not None:
+            registry = self.metrics.registry
+            registry.gauge("epub_batch_last_run_timestamp_seconds", "Время завершения последнего пакета").set(time.time())
+            registry.gauge("epub_batch_books_per_second", "Пропускная способность последнего пакета").set(
+                summary.books_per_second)
+            exporter.write()
+        return summary
+
+    def _resumed_outcome(self, path: str, entry: Dict[str, Any]) -> BookOutcome:
+        """Итог книги, обработанной в прошлом запуске; отчет читается из ее файла, если он сохранился"""
+        outcome = BookOutcome(path=path, ok=True, elapsed=entry.get('elapsed', 0.0),
+                              report_path=entry.get('report_path'), resumed=True)
+        if self.options['collect_reports'] and outcome.report_path and os.path.exists(outcome.report_path):
+            with open(outcome.report_path, 'r', encoding='utf-8') as f:
+                outcome.report = json.load(f)
+        return outcome
+
+def write_aggregate_report(summary: BatchSummary, output_file: str):
+    """Сохраняет общий отчет по всем книгам пакета"""
+    aggregate = {
+        "summary": {
+            "total": summary.total,
+            "succeeded": summary.succeeded,
+            "failed": summary.failed,
+            "elapsed": summary.elapsed,
+            "books_per_second": summary.books_per_second,
+        },
+        "books": [
+            {
+                "path": outcome.path,
+                "ok": outcome.ok,
+                "error": outcome.error,
+                "elapsed": outcome.elapsed,
+                "report_path": outcome.report_path,
+                "resumed": outcome.resumed,
+                "report": outcome.report,
+            }
+            for outcome in summary.outcomes
+        ],
+    }
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(aggregate, f, ensure_ascii=False, indent=2)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Пакетная обработка EPUB файлов")
+    parser.add_argument("inputs", nargs="+", help="EPUB файлы, директории или glob-шаблоны")
+    parser.add_argument("--search", default=None, help="слово для поиска")
+    parser.add_argument("--workers", type=int, default=None, help="число рабочих процессов (по умолчанию - число ядер)")
+    parser.add_argument("--library", default="./library", help="директория библиотеки")
+    parser.add_argument("--output-root", default="./batch_output", help="директория для изображений и глав по книгам")
+    parser.add_argument("--report-dir", default=None, help="директория для JSON отчетов по каждой книге")
+    parser.add_argument("--aggregate", default=None, help="файл общего отчета по всему пакету")
+    parser.add_argument("--memory-limit-mb", type=int, default=None, help="лимит памяти на рабочий процесс")
+    parser.add_argument("--timeout", type=float, default=None, help="лимит времени на одну книгу, секунд")
+    parser.add_argument("--max-books-per-worker", type=int, default=None, help="перезапускать процесс после N книг")
+    parser.add_argument("--memory-budget-mb", type=int, default=None,
+                        help="бюджет памяти книги: потоковый анализ и ограничение декодируемых изображений")
+    parser.add_argument("--stages", default=None, help="этапы через запятую (по умолчанию - все)")
+    parser.add_argument("--journal", default=None,
+                        help="журнал пакета: при повторном запуске обработанные книги и этапы пропускаются")
+    parser.add_argument("--report-stream", default=None,
+                        help="дописывать отчет каждой книги строкой в NDJSON файл (.gz - со сжатием)")
+    parser.add_argument("--report-fields", default=None,
+                        help="поля отчета через запятую, вложенные через точку (metadata.title,text_analysis.word_count)")
+    parser.add_argument("--io-workers", type=int, default=None, help="потоков ввода-вывода в каждом рабочем процессе")
+    parser.add_argument("--cpu-workers", type=int, default=None,
+                        help="CPU потоков в каждом рабочем процессе (по умолчанию - ядра, деленные между процессами)")
+    parser.add_argument("--metrics-textfile", default=None,
+                        help="файл метрик в формате Prometheus (*.prom) для textfile collector")
+    parser.add_argument("--verbose", action="store_true", help="выводить ошибки и ход обработки внутри книг")
+    parser.add_argument("--quiet", action="store_true", help="не печатать прогресс по книгам")
+    args = parser.parse_args(argv)
+
+    books = collect_books(args.inputs)
+    if not books:
+        print("Не найдено ни одного EPUB файла")
+        sys.exit(1)
+
+    runner = BatchRunner(
+        workers=args.workers, library_dir=args.library, search_pattern=args.search,
+        output_root=args.output_root, report_dir=args.report_dir, collect_reports=bool(args.aggregate),
+        memory_limit_mb=args.memory_limit_mb, timeout=args.timeout,
+        max_books_per_worker=args.max_books_per_worker, progress=not args.quiet,
+        stages=args.stages.split(",") if args.stages else None, memory_budget_mb=args.memory_budget_mb,
+        journal=args.journal, verbose=args.verbose, report_stream=args.report_stream,
+        report_fields=args.report_fields.split(",") if args.report_fields else None,
+        io_workers=args.io_workers, cpu_workers=args.cpu_workers, metrics_textfile=args.metrics_textfile,
+    )
+    summary = runner.run(books)
+    if args.aggregate:
+        write_aggregate_report(summary, args.aggregate)
+
+    print(f"Обработано книг: {summary.total}, успешно: {summary.succeeded}, с ошибками: {summary.failed}")
+    resumed = sum(1 for outcome in summary.outcomes if outcome.resumed)
+    if resumed:
+        print(f"Взято из журнала: {resumed}")
+    print(f"Время: {summary.elapsed:.2f} с, скорость: {summary.books_per_second:.2f} книг/с")
+    for path, error in summary.failures:
+        print(f"  {path}: {error}")
+    sys.exit(1 if summary.failed else 0)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
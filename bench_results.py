@@ -0,0 +1,136 @@
+import gc
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from dataclasses import dataclass, asdict, field, fields, make_dataclass, is_dataclass
+from typing import Callable, Dict, List, Optional
+
+from results import (EpubMetadata, TextAnalysisResult, ImageExtractionResult, KeywordSearchResult, TocEntry,
+                     TocResult, ProcessingResult, Record)
+from library_catalog import CatalogEntry
+
+@dataclass
+class MemoryResult:
+    name: str
+    slotted: float = 0.0  # Байт на экземпляр (вместе с собственными списками и словарями)
+    plain: float = 0.0  # То же для обычного dataclass с теми же полями
+
+    @property
+    def saving(self) -> float:
+        return 1 - self.slotted / self.plain if self.plain else 0.0
+
+@dataclass
+class CodecResult:
+    name: str
+    to_dict: float = 0.0  # Микросекунд на вызов
+    asdict: float = 0.0  # dataclasses.asdict для сравнения
+    from_dict: float = 0.0
+
+@dataclass
+class ResultsReport:
+    count: int = 0
+    memory: List[MemoryResult] = field(default_factory=list)
+    codec: List[CodecResult] = field(default_factory=list)
+
+def plain_variant(cls: type, cache: Dict[type, type]) -> type:
+    """Обычный dataclass (с __dict__) с теми же полями - для сравнения расхода памяти"""
+    if cls not in cache:
+        cache[cls] = make_dataclass(cls.__name__, [
+            (item.name, item.type, field(default=item.default, default_factory=item.default_factory))
+            for item in fields(cls)
+        ])
+    return cache[cls]
+
+# Образцы: значения близки к тому, что каталог держит по книге. Короткие общие строки
+# (язык, издатель) разделяются между экземплярами, как это делает интерпретатор
+def _metadata(types, i):
+    return types(EpubMetadata)(title=f"Книга {i}", author=f"Автор {i % 5000}", language="ru",
+                               publisher="Издательство", publication_date="2020-01-01")
+
+def _text_analysis(types, i):
+    return types(TextAnalysisResult)(word_count=50000 + i, char_count=300000 + i, sentence_count=4000,
+                                     paragraph_count=900)
+
+def _toc(types, i):
+    entries = [types(TocEntry)(title=f"Глава {n}", href=f"ch{n}.xhtml", level=1) for n in range(3)]
+    return types(TocResult)(entries=entries, count=len(entries), total_chapters=len(entries))
+
+SAMPLES: Dict[str, Callable] = {
+    'EpubMetadata': _metadata,
+    'TextAnalysisResult': _text_analysis,
+    'KeywordSearchResult': lambda types, i: types(KeywordSearchResult)(match_count=2, matches=["тест", "тест"]),
+    'ImageExtractionResult': lambda types, i: types(ImageExtractionResult)(count=1, output_dir="out",
+                                                                           extracted_image_paths=[f"out/{i}.png"]),
+    'TocResult': _toc,
+    'ProcessingResult': lambda types, i: types(ProcessingResult)(
+        metadata=_metadata(types, i), text_analysis=_text_analysis(types, i), toc=_toc(types, i),
+        fingerprint=f"{i:064x}", execution_times={'extract_metadata': 0.01}),
+    'CatalogEntry': lambda types, i: types(CatalogEntry)(fingerprint=f"{i:064x}", name=f"{i}.epub", path=f"lib/{i}.epub",
+                                                         size=1000 + i, title=f"Книга {i}", author=f"Автор {i % 5000}",
+                                                         language="ru", word_count=50000 + i, added_at=1.0),
+}
+
+def measure_memory(build: Callable[[int], object], count: int) -> float:
+    """Байт на экземпляр по tracemalloc: создается count объектов, учитывается все, что они удерживают"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        items = [build(i) for i in range(count)]
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del items
+    return used / count
+
+def _per_call(func: Callable, items: list) -> float:
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+def run_results_benchmark(count: int = 100_000, codec_count: int = 20_000,
+                          only: Optional[List[str]] = None) -> ResultsReport:
+    report = ResultsReport(count=count)
+    cache: Dict[type, type] = {}
+    for name, sample in SAMPLES.items():
+        if only and name not in only:
+            continue
+        slotted = measure_memory(lambda i: sample(lambda cls: cls, i), count)
+        plain = measure_memory(lambda i: sample(lambda cls: plain_variant(cls, cache), i), count)
+        report.memory.append(MemoryResult(name, slotted, plain))
+
+        items = [sample(lambda cls: cls, i) for i in range(codec_count)]
+        if isinstance(items[0], Record):
+            cls = type(items[0])
+            dicts = [item.to_dict() for item in items]
+            report.codec.append(CodecResult(name, to_dict=_per_call(cls.to_dict, items), asdict=_per_call(asdict, items),
+                                            from_dict=_per_call(cls.from_dict, dicts)))
+    return report
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Память и сериализация типов результатов (results.py)")
+    parser.add_argument("--count", type=int, default=100_000, help="экземпляров каждого типа для замера памяти")
+    parser.add_argument("--codec-count", type=int, default=20_000, help="экземпляров для замера to_dict/from_dict")
+    parser.add_argument("--only", default=None, help="типы через запятую")
+    parser.add_argument("--json", default=None, help="сохранить отчет в JSON")
+    args = parser.parse_args(argv)
+
+    report = run_results_benchmark(args.count, args.codec_count, args.only.split(",") if args.only else None)
+    print(f"Память на {report.count} результатов:")
+    for result in report.memory:
+        print(f"  {result.name:<22} slots {result.slotted * report.count / 2**20:8.1f} МБ "
+              f"({result.slotted:6.0f} Б)  обычный {result.plain * report.count / 2**20:8.1f} МБ "
+              f"({result.plain:6.0f} Б)  экономия {result.saving:.0%}")
+    print("Сериализация, мкс на вызов:")
+    for result in report.codec:
+        print(f"  {result.name:<22} to_dict {result.to_dict:7.2f}  asdict {result.asdict:7.2f}  "
+              f"from_dict {result.from_dict:7.2f}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(asdict(report), f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
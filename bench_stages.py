@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from epub_synth import SynthSpec, generate_epub
+from text_extractor import TextExtractor
+from text_analyzer import TextAnalyzer
+from keyword_searcher import KeywordSearcher
+from chapter_splitter import ChapterSplitter
+from toc_generator import TocGenerator
+from style_processor import StyleProcessor
+from image_extractor import ImageExtractor
+from image_transformer import TRANSFORMS, transform_image_bytes
+
+@dataclass
+class BenchResult:
+    name: str
+    median: float = 0.0
+    best: float = 0.0
+    rounds: int = 0
+
+@dataclass
+class Regression:
+    name: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline else float('inf')
+
+def build_benchmarks(epub_path: str, workdir: str, search_pattern: str = "книга") -> Dict[str, Callable[[], object]]:
+    """Готовит функции-замеры для каждого этапа на одной синтетической книге.
+
+    Входные данные (текст, изображения) подготавливаются заранее, чтобы каждый
+    замер измерял только свой этап; главы этап читает сам.
+    """
+    text_result = TextExtractor().extract_text(epub_path)
+    text = text_result.text
+    images = list(ImageExtractor(epub_path, os.path.join(workdir, "images")).iter_images())
+    splitter = ChapterSplitter()
+
+    benchmarks = {
+        'text_extractor': lambda: TextExtractor().extract_text(epub_path),
+        'text_analyzer': lambda: TextAnalyzer().analyze_text(text, search_pattern, text_result.document_starts),
+        'keyword_searcher': lambda: KeywordSearcher(search_pattern).search_keywords(text),
+        # Чтение и разбиение глав входят в замер вместе со сборкой архива, как в этапе split_chapters
+        'chapter_splitter': lambda: splitter.build_chapters_archive(splitter.read_chapters(epub_path)),
+        'toc_generator': lambda: TocGenerator(epub_path).generate_toc(),
+        'style_processor': lambda: StyleProcessor(epub_path).process_styles(),
+    }
+    for kind in TRANSFORMS:
+        benchmarks[f'image_{kind}'] = (
+            lambda kind=kind: [transform_image_bytes(data, kind, name) for name, data in images]
+        )
+    return benchmarks
+
+def measure(func: Callable[[], object], rounds: int = 5, warmup: int = 1) -> Tuple[float, float]:
+    """Медиана и лучшее время из rounds запусков после warmup прогревочных"""
+    timings = []
+    for _ in range(warmup):
+        func()
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), min(timings)
+
+def run_benchmarks(spec: SynthSpec, rounds: int = 5, only: Optional[List[str]] = None) -> Dict[str, BenchResult]:
+    """Генерирует книгу по спецификации и измеряет выбранные этапы"""
+    workdir = tempfile.mkdtemp(prefix="bench-stages-")
+    try:
+        epub_path = generate_epub(os.path.join(workdir, "synthetic.epub"), spec)
+        benchmarks = build_benchmarks(epub_path, workdir)
+        unknown = set(only or ()) - set(benchmarks)
+        if unknown:
+            raise ValueError(f"Неизвестные замеры: {', '.join(sorted(unknown))}")
+        results = {}
+        for name, func in benchmarks.items():
+            if only and name not in only:
+                continue
+            median, best = measure(func, rounds)
+            results[name] = BenchResult(name, median, best, rounds)
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def save_baseline(path: str, spec: SynthSpec, results: Dict[str, BenchResult]):
+    """Сохраняет результаты как базовую линию"""
+    data = {
+        'spec': asdict(spec),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': {name: asdict(result) for name, result in results.items()},
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+def load_baseline(path: str) -> Tuple[SynthSpec, Dict[str, BenchResult]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    spec = SynthSpec(**{**data['spec'], 'image_size': tuple(data['spec']['image_size'])})
+    return spec, {name: BenchResult(**result) for name, result in data['results'].items()}
+
+def find_regressions(baseline: Dict[str, BenchResult], current: Dict[str, BenchResult],
+                     threshold: float = 0.2) -> List[Regression]:
+    """Этапы, медиана которых выросла больше чем на threshold (0.2 = на 20%)"""
+    regressions = []
+    for name, result in current.items():
+        base = baseline.get(name)
+        if base is not None and result.median > base.median * (1 + threshold):
+            regressions.append(Regression(name, base.median, result.median))
+    return regressions
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Микробенчмарки этапов обработки на синтетических EPUB")
+    parser.add_argument("--chapters", type=int, default=SynthSpec.chapters)
+    parser.add_argument("--words", type=int, default=SynthSpec.words_per_chapter, help="слов в главе")
+    parser.add_argument("--images", type=int, default=SynthSpec.images)
+    parser.add_argument("--css-rules", type=int, default=SynthSpec.css_rules)
+    parser.add_argument("--toc-depth", type=int, default=SynthSpec.toc_depth)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--only", default=None, help="замеры через запятую")
+    parser.add_argument("--save", default=None, help="сохранить результаты как базовую линию (JSON)")
+    parser.add_argument("--compare", default=None, help="сравнить с базовой линией (JSON); спецификация книги берется из нее")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимое замедление, доля")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        spec, baseline = load_baseline(args.compare)
+    else:
+        spec = SynthSpec(chapters=args.chapters, words_per_chapter=args.words, images=args.images,
+                         css_rules=args.css_rules, toc_depth=args.toc_depth)
+
+    results = run_benchmarks(spec, args.rounds, args.only.split(",") if args.only else None)
+    for result in results.values():
+        line = f"{result.name:<20} медиана {result.median * 1000:9.2f} мс  лучшее {result.best * 1000:9.2f} мс"
+        if baseline and result.name in baseline:
+            line += f"  ({result.median / baseline[result.name].median:.2f}x от базовой)"
+        print(line)
+
+    if args.save:
+        save_baseline(args.save, spec, results)
+    if baseline:
+        regressions = find_regressions(baseline, results, args.threshold)
+        for regression in regressions:
+            print(f"Регрессия {regression.name}: {regression.baseline * 1000:.2f} мс -> "
+                  f"{regression.current * 1000:.2f} мс ({regression.ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
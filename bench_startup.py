@@ -0,0 +1,134 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import statistics
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Тяжелые зависимости, которые не должны загружаться без этапа, которому они нужны
+HEAVY_MODULES = ('PIL', 'bs4', 'lxml', 'numpy', 'asyncio', 'aiofiles', 'multiprocessing', 'sqlite3')
+
+@dataclass
+class ImportRecord:
+    name: str
+    self_us: int = 0
+    cumulative_us: int = 0
+    depth: int = 0  # Уровень вложенности импорта (0 - импортирован напрямую)
+
+@dataclass
+class StartupReport:
+    interpreter: float = 0.0  # python -c pass: запуск интерпретатора без нашего кода
+    import_main: float = 0.0  # python -c "import main"
+    cli_metadata: float = 0.0  # python main.py книга --stages metadata
+    import_time_us: int = 0  # Суммарное время импорта main по -X importtime
+    heavy_loaded: List[str] = field(default_factory=list)  # Тяжелые модули, загруженные при import main
+    top: List[ImportRecord] = field(default_factory=list)
+
+def _environment() -> Dict[str, str]:
+    env = dict(os.environ)
+    # Без .pyc каждый запуск компилирует исходники заново, что искажает замер
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env['PYTHONPATH'] = HERE + os.pathsep + env.get('PYTHONPATH', '')
+    return env
+
+def parse_importtime(stderr: str) -> List[ImportRecord]:
+    """Разбирает вывод python -X importtime (строки 'import time: self | cumulative | name')"""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # Заголовок таблицы
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        records.append(ImportRecord(name=stripped, self_us=int(parts[0]), cumulative_us=int(parts[1]),
+                                    depth=(len(name) - len(stripped) - 1) // 2))
+    return records
+
+def import_breakdown(module: str = "main") -> List[ImportRecord]:
+    """Импортирует module в отдельном процессе и возвращает время импорта по модулям"""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=HERE, env=_environment(), capture_output=True, text=True, check=True)
+    return parse_importtime(completed.stderr)
+
+def loaded_modules(code: str, candidates=HEAVY_MODULES) -> List[str]:
+    """Какие из candidates оказываются в sys.modules после выполнения code в отдельном процессе"""
+    probe = f"{code}\nimport sys\nprint(','.join(m for m in {tuple(candidates)!r} if m in sys.modules))"
+    completed = subprocess.run([sys.executable, "-c", probe], cwd=HERE, env=_environment(),
+                               capture_output=True, text=True, check=True)
+    output = completed.stdout.strip().splitlines()
+    return [name for name in output[-1].split(",") if name] if output else []
+
+def wall_time(args: List[str], rounds: int) -> float:
+    """Медиана времени запуска процесса (с разогретым кэшем .pyc)"""
+    env = _environment()
+    subprocess.run(args, cwd=HERE, env=env, capture_output=True, check=True)
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        subprocess.run(args, cwd=HERE, env=env, capture_output=True, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def run_startup_benchmark(rounds: int = 7, top: int = 15) -> StartupReport:
+    from epub_synth import SynthSpec, generate_epub
+
+    report = StartupReport()
+    records = import_breakdown("main")
+    main_record = next((record for record in records if record.name == "main" and record.depth == 0), None)
+    report.import_time_us = main_record.cumulative_us if main_record else 0
+    # Импорты, сделанные ради main, без модулей запуска интерпретатора (site и т.п.)
+    site_end = max((i for i, record in enumerate(records) if record.name == "site" and record.depth == 0), default=-1)
+    ours = records[site_end + 1:]
+    report.top = sorted(ours, key=lambda record: record.self_us, reverse=True)[:top]
+    report.heavy_loaded = loaded_modules("import main")
+
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    try:
+        book = generate_epub(os.path.join(workdir, "book.epub"), SynthSpec(chapters=2, words_per_chapter=100, images=1))
+        report.interpreter = wall_time([sys.executable, "-c", "pass"], rounds)
+        report.import_main = wall_time([sys.executable, "-c", "import main"], rounds)
+        report.cli_metadata = wall_time([sys.executable, os.path.join(HERE, "main.py"), book, "--stages", "metadata",
+                                         "--library", os.path.join(workdir, "library"),
+                                         "--output", os.path.join(workdir, "report.json")], rounds)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Время запуска CLI и разбивка импорта main по модулям")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--top", type=int, default=15, help="сколько самых долгих модулей показать")
+    parser.add_argument("--max-import-ms", type=float, default=None,
+                        help="завершиться с ошибкой, если импорт main дольше (проверка на регрессию)")
+    parser.add_argument("--json", default=None, help="сохранить отчет в JSON")
+    args = parser.parse_args(argv)
+
+    report = run_startup_benchmark(args.rounds, args.top)
+    print(f"Интерпретатор (-c pass):        {report.interpreter * 1000:7.1f} мс")
+    print(f"import main:                    {report.import_main * 1000:7.1f} мс "
+          f"(+{(report.import_main - report.interpreter) * 1000:.1f} мс)")
+    print(f"main.py --stages metadata:      {report.cli_metadata * 1000:7.1f} мс "
+          f"(+{(report.cli_metadata - report.interpreter) * 1000:.1f} мс)")
+    print(f"Импорт main по -X importtime:   {report.import_time_us / 1000:7.1f} мс")
+    print(f"Тяжелые модули после import main: {', '.join(report.heavy_loaded) or 'нет'}")
+    print(f"{'модуль':<40}{'собственное':>14}{'с вложенными':>15}")
+    for record in report.top:
+        print(f"{'  ' * record.depth + record.name:<40}{record.self_us / 1000:>12.2f}мс{record.cumulative_us / 1000:>13.2f}мс")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(asdict(report), f, ensure_ascii=False, indent=2)
+    if args.max_import_ms is not None and report.import_time_us / 1000 > args.max_import_ms:
+        print(f"Импорт main дольше {args.max_import_ms} мс")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,215 @@
+import io
+import sys
+import random
+import zipfile
+import argparse
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from PIL import Image
+
+CYRILLIC_WORDS = (
+    "книга глава слово время человек жизнь город дорога ночь свет дом окно река лес "
+    "память голос письмо утро вечер сердце история мысль дверь море поле небо земля"
+).split()
+LATIN_WORDS = (
+    "book chapter word time person life city road night light house window river forest "
+    "memory voice letter morning evening heart story thought door sea field sky earth"
+).split()
+
+@dataclass
+class SynthSpec:
+    chapters: int = 10
+    words_per_chapter: int = 2000
+    cyrillic_ratio: float = 0.7  # Доля кириллических слов, остальные - латиница
+    images: int = 4
+    image_size: Tuple[int, int] = (256, 256)
+    css_files: int = 1
+    css_rules: int = 200  # Правил в каждом CSS файле
+    toc_depth: int = 2  # Уровней вложенности оглавления (1 - только главы)
+    sections_per_level: int = 2  # Подразделов на каждом уровне ниже главы
+    seed: int = 0
+    title: str = "Синтетическая книга"
+    author: str = "Генератор Тестов"
+    language: str = "ru"
+    series: str = ""  # calibre:series в OPF (пустая - книга вне серии)
+
+class _TextSource:
+    """Детерминированный генератор предложений и абзацев"""
+
+    def __init__(self, rng: random.Random, cyrillic_ratio: float):
+        self.rng = rng
+        self.cyrillic_ratio = cyrillic_ratio
+
+    def word(self) -> str:
+        words = CYRILLIC_WORDS if self.rng.random() < self.cyrillic_ratio else LATIN_WORDS
+        return self.rng.choice(words)
+
+    def sentence(self, length: int) -> str:
+        text = " ".join(self.word() for _ in range(length))
+        return text[0].upper() + text[1:] + self.rng.choice(".!?")
+
+    def paragraphs(self, words: int) -> List[str]:
+        result = []
+        while words > 0:
+            sentences = []
+            for _ in range(self.rng.randint(3, 6)):
+                if words <= 0:
+                    break
+                length = min(self.rng.randint(5, 15), words)
+                sentences.append(self.sentence(length))
+                words -= length
+            result.append(" ".join(sentences))
+        return result
+
+def _image_bytes(rng: random.Random, size: Tuple[int, int], image_format: str) -> bytes:
+    width, height = size
+    # Шум плохо сжимается, поэтому размер файла близок к реальным иллюстрациям
+    img = Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+def _css(rng: random.Random, rules: int, index: int) -> str:
+    lines = [f"/* Синтетический стиль {index} */"]
+    for i in range(rules):
+        lines.append(
+            f".rule-{index}-{i} {{\n    margin: {rng.randint(0, 20)}px {rng.randint(0, 20)}px;\n"
+            f"    color: #{rng.randrange(0x1000000):06x};\n    font-size: {rng.randint(80, 140)}%;\n}}\n"
+        )
+    return "\n".join(lines)
+
+def _sections(prefix: str, level: int, spec: SynthSpec) -> List[Tuple[int, str, str]]:
+    """Подразделы главы: (уровень, номер, якорь) в порядке обхода"""
+    if level > spec.toc_depth:
+        return []
+    result = []
+    for i in range(1, spec.sections_per_level + 1):
+        number = f"{prefix}.{i}"
+        result.append((level, number, "s" + number.replace(".", "-")))
+        result += _sections(number, level + 1, spec)
+    return result
+
+def _nav_points(entries: List[tuple], counter: List[int]) -> str:
+    """Вложенные NCX navPoint из записей (заголовок, src, вложенные записи)"""
+    parts = []
+    for title, src, children in entries:
+        counter[0] += 1
+        parts.append(
+            f'<navPoint id="nav{counter[0]}" playOrder="{counter[0]}"><navLabel><text>{escape(title)}</text></navLabel>'
+            f'<content src="{src}"/>{_nav_points(children, counter)}</navPoint>'
+        )
+    return "".join(parts)
+
+def generate_epub(path: str, spec: Optional[SynthSpec] = None, **overrides) -> str:
+    """Собирает синтетический EPUB 2 (OPS/content.opf, NCX оглавление) по спецификации.
+
+    Args:
+        path: Куда записать EPUB файл.
+        spec: Параметры книги; отдельные поля можно переопределить через overrides.
+
+    Returns:
+        str: Путь к созданному файлу.
+    """
+    spec = spec or SynthSpec()
+    if overrides:
+        spec = SynthSpec(**{**asdict(spec), **overrides})
+    rng = random.Random(spec.seed)
+    text = _TextSource(rng, spec.cyrillic_ratio)
+
+    manifest = ['<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>']
+    spine = []
+    toc = []
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as epub:
+        epub.writestr(zipfile.ZipInfo('mimetype'), 'application/epub+zip')
+        epub.writestr('META-INF/container.xml',
+                      '<?xml version="1.0"?><container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+                      '<rootfiles><rootfile full-path="OPS/content.opf" media-type="application/oebps-package+xml"/>'
+                      '</rootfiles></container>')
+
+        for i in range(1, spec.css_files + 1):
+            epub.writestr(f'OPS/styles/style{i}.css', _css(rng, spec.css_rules, i))
+            manifest.append(f'<item id="css{i}" href="styles/style{i}.css" media-type="text/css"/>')
+
+        image_names = []
+        for i in range(1, spec.images + 1):
+            image_format, extension, media_type = (('PNG', 'png', 'image/png') if i % 2
+                                                   else ('JPEG', 'jpg', 'image/jpeg'))
+            name = f'image{i}.{extension}'
+            epub.writestr(f'OPS/images/{name}', _image_bytes(rng, spec.image_size, image_format))
+            manifest.append(f'<item id="img{i}" href="images/{name}" media-type="{media_type}"/>')
+            image_names.append(name)
+
+        for chapter in range(1, spec.chapters + 1):
+            chapter_title = f"Глава {chapter}"
+            sections = _sections(str(chapter), 2, spec) if spec.toc_depth > 1 else []
+            # Текст главы делится поровну между ее началом и подразделами
+            words = spec.words_per_chapter // (len(sections) + 1)
+            body = [f'<h1>{chapter_title}</h1>']
+            body += [f'<p>{p}</p>' for p in text.paragraphs(words)]
+            if image_names:
+                body.append(f'<img src="images/{image_names[(chapter - 1) % len(image_names)]}" alt=""/>')
+            for level, number, anchor in sections:
+                heading = min(level, 6)
+                body.append(f'<h{heading} id="{anchor}">Раздел {number}</h{heading}>')
+                body += [f'<p>{p}</p>' for p in text.paragraphs(words)]
+
+            links = "".join(f'<link rel="stylesheet" type="text/css" href="styles/style{i}.css"/>'
+                            for i in range(1, spec.css_files + 1))
+            epub.writestr(f'OPS/chapter{chapter}.xhtml',
+                          '<?xml version="1.0" encoding="utf-8"?>'
+                          f'<html xmlns="http://www.w3.org/1999/xhtml"><head><title>{chapter_title}</title>{links}</head>'
+                          f'<body>{"".join(body)}</body></html>')
+            manifest.append(f'<item id="ch{chapter}" href="chapter{chapter}.xhtml" media-type="application/xhtml+xml"/>')
+            spine.append(f'<itemref idref="ch{chapter}"/>')
+
+            # Оглавление: вложенность подразделов повторяет их уровни
+            chapter_entry = (chapter_title, f'chapter{chapter}.xhtml', [])
+            stack = [(1, chapter_entry)]
+            for level, number, anchor in sections:
+                entry = (f"Раздел {number}", f'chapter{chapter}.xhtml#{anchor}', [])
+                while stack[-1][0] >= level:
+                    stack.pop()
+                stack[-1][1][2].append(entry)
+                stack.append((level, entry))
+            toc.append(chapter_entry)
+
+        series = f'<meta name="calibre:series" content={quoteattr(spec.series)}/>' if spec.series else ''
+        epub.writestr('OPS/content.opf',
+                      '<?xml version="1.0" encoding="utf-8"?>'
+                      '<package xmlns="http://www.idpf.org/2007/opf" version="2.0" unique-identifier="id">'
+                      '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+                      f'<dc:title>{escape(spec.title)}</dc:title><dc:creator>{escape(spec.author)}</dc:creator>'
+                      f'<dc:language>{spec.language}</dc:language><dc:publisher>Синтетика</dc:publisher>'
+                      f'<dc:date>2024-01-01</dc:date><dc:identifier id="id">synth-{spec.seed}</dc:identifier>'
+                      '<dc:description>Сгенерированная книга для тестов производительности</dc:description>'
+                      f'{series}</metadata><manifest>{"".join(manifest)}</manifest>'
+                      f'<spine toc="ncx">{"".join(spine)}</spine></package>')
+        epub.writestr('OPS/toc.ncx',
+                      '<?xml version="1.0" encoding="utf-8"?><ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">'
+                      f'<docTitle><text>{escape(spec.title)}</text></docTitle>'
+                      f'<navMap>{_nav_points(toc, [0])}</navMap></ncx>')
+    return str(path)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Генератор синтетических EPUB файлов")
+    parser.add_argument("output", help="путь к создаваемому EPUB")
+    parser.add_argument("--chapters", type=int, default=SynthSpec.chapters)
+    parser.add_argument("--words", type=int, default=SynthSpec.words_per_chapter, help="слов в главе")
+    parser.add_argument("--cyrillic", type=float, default=SynthSpec.cyrillic_ratio, help="доля кириллицы 0..1")
+    parser.add_argument("--images", type=int, default=SynthSpec.images)
+    parser.add_argument("--image-size", type=int, nargs=2, default=SynthSpec.image_size, metavar=("W", "H"))
+    parser.add_argument("--css-files", type=int, default=SynthSpec.css_files)
+    parser.add_argument("--css-rules", type=int, default=SynthSpec.css_rules)
+    parser.add_argument("--toc-depth", type=int, default=SynthSpec.toc_depth)
+    parser.add_argument("--seed", type=int, default=SynthSpec.seed)
+    args = parser.parse_args(argv)
+
+    spec = SynthSpec(chapters=args.chapters, words_per_chapter=args.words, cyrillic_ratio=args.cyrillic,
+                     images=args.images, image_size=tuple(args.image_size), css_files=args.css_files,
+                     css_rules=args.css_rules, toc_depth=args.toc_depth, seed=args.seed)
+    print(generate_epub(args.output, spec))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
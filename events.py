@@ -0,0 +1,193 @@
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+_local = threading.local()
+_lock = threading.Lock()
+# Кортеж, а не список: emit читает его без блокировки, подписка заменяет его целиком
+_subscribers: Tuple[Callable[['Event'], None], ...] = ()
+
+@dataclass
+class Event:
+    book: str = ""  # Путь к книге; подставляется из context(), если не задан
+    stage: str = ""  # Этап EpubProcessor или другой операции (например, translate)
+    timestamp: float = 0.0  # time.time() в момент события
+
+@dataclass
+class StageStarted(Event):
+    pass
+
+@dataclass
+class StageFinished(Event):
+    status: str = "done"  # done, failed, skipped
+    duration: float = 0.0
+    error: Optional[str] = None
+
+@dataclass
+class ItemProcessed(Event):
+    item: str = ""  # Документ, изображение, глава
+    done: int = 0
+    total: int = 0  # 0 - общее число заранее неизвестно
+    duration: float = 0.0
+    error: Optional[str] = None
+    size: int = 0  # Распакованный из архива объем элемента в байтах (0 - не читался из архива)
+
+@dataclass
+class ImageTransformed(Event):
+    item: str = ""
+    transform: str = ""  # pixelated, contrasted, mirrored, grayscale
+    duration: float = 0.0
+    error: Optional[str] = None
+
+@dataclass
+class CacheLookup(Event):
+    cache: str = ""  # library - книга уже в хранилище, checkpoint - этап восстановлен из журнала
+    hit: bool = False
+
+@dataclass
+class BookFinished(Event):
+    status: str = "done"  # done или failed - упал хотя бы один этап
+    duration: float = 0.0
+    error: Optional[str] = None  # Упавшие этапы через запятую
+
+@dataclass
+class Problem(Event):
+    message: str = ""
+    item: str = ""
+    level: str = "error"  # error или warning; обработка при этом продолжается
+
+@dataclass
+class Status(Event):
+    message: str = ""  # Состояние долгоживущего процесса (демон приема книг): выводится всегда
+
+@dataclass
+class Diagnostic(Event):
+    message: str = ""  # Подробности для отладки, по умолчанию не выводятся
+
+def enabled() -> bool:
+    """Есть ли подписчики; без них события не создаются"""
+    return bool(_subscribers)
+
+def subscribe(callback: Callable[[Event], None]) -> Callable[[], None]:
+    """Подписывает callback на все события процесса; возвращает функцию отписки"""
+    global _subscribers
+    with _lock:
+        _subscribers = _subscribers + (callback,)
+
+    def unsubscribe():
+        global _subscribers
+        with _lock:
+            remaining = list(_subscribers)
+            if callback in remaining:
+                remaining.remove(callback)
+            _subscribers = tuple(remaining)
+    return unsubscribe
+
+@contextmanager
+def subscribed(callback: Callable[[Event], None]):
+    unsubscribe = subscribe(callback)
+    try:
+        yield callback
+    finally:
+        unsubscribe()
+
+@contextmanager
+def recorded():
+    """Собирает события в список (удобно в тестах и для разбора после обработки)"""
+    collected: List[Event] = []
+    with subscribed(collected.append):
+        yield collected
+
+def _current() -> Tuple[str, str]:
+    return getattr(_local, 'context', ("", ""))
+
+@contextmanager
+def context(book: Optional[str] = None, stage: Optional[str] = None):
+    """Книга и этап по умолчанию для событий текущего потока"""
+    previous = _current()
+    _local.context = (previous[0] if book is None else book, previous[1] if stage is None else stage)
+    try:
+        yield
+    finally:
+        _local.context = previous
+
+def bind(func: Callable) -> Callable:
+    """Оборачивает функцию для передачи в пул потоков: ее события получат книгу и этап текущего потока"""
+    book, stage = _current()
+    if not book and not stage:
+        return func
+
+    def run(*args, **kwargs):
+        with context(book, stage):
+            return func(*args, **kwargs)
+    return run
+
+def emit(event_type: type, **fields):
+    """Создает и рассылает событие; без подписчиков сразу возвращается"""
+    subscribers = _subscribers
+    if not subscribers:
+        return
+    book, stage = _current()
+    fields.setdefault('book', book)
+    fields.setdefault('stage', stage)
+    event = event_type(timestamp=time.time(), **fields)
+    for callback in subscribers:
+        try:
+            callback(event)
+        except Exception:
+            # Сбой подписчика (например, закрытый поток вывода) не должен прерывать обработку
+            pass
+
+def problem(message: str, item: str = "", level: str = "error", **fields):
+    emit(Problem, message=message, item=item, level=level, **fields)
+
+def status(message: str, **fields):
+    emit(Status, message=message, **fields)
+
+def diagnostic(message: str, **fields):
+    emit(Diagnostic, message=message, **fields)
+
+class ConsoleRenderer:
+    """Вывод событий в консоль для CLI.
+
+    Ошибки и пропуски этапов выводятся всегда, ход обработки по элементам - при progress,
+    завершение этапов и диагностика - при verbose.
+    """
+
+    def __init__(self, stream=None, verbose: bool = False, progress: bool = False):
+        self.stream = stream  # None - текущий sys.stdout на момент вывода
+        self.verbose = verbose
+        self.progress = progress or verbose
+        self._lock = threading.Lock()
+
+    def render(self, event: Event) -> Optional[str]:
+        if isinstance(event, Problem):
+            return f"Warning: {event.message}" if event.level == "warning" else event.message
+        if isinstance(event, Status):
+            return event.message
+        if isinstance(event, StageFinished):
+            if event.status == "failed":
+                return f"Ошибка при выполнении {event.stage}: {event.error}"
+            if event.status == "skipped":
+                return f"Пропущен этап {event.stage}: {event.error}"
+            if self.verbose:
+                return f"Этап {event.stage} завершен за {event.duration:.2f} с"
+        elif isinstance(event, ItemProcessed) and self.progress:
+            position = f"{event.done}/{event.total}" if event.total else str(event.done)
+            status = "ok" if event.error is None else f"ошибка: {event.error}"
+            return f"[{position}] {event.item} ({event.duration:.2f} с, {status})"
+        elif isinstance(event, BookFinished) and self.verbose:
+            status = "ok" if event.status == "done" else f"ошибки в этапах: {event.error}"
+            return f"Книга {event.book} обработана за {event.duration:.2f} с ({status})"
+        elif isinstance(event, Diagnostic) and self.verbose:
+            return event.message
+        return None
+
+    def __call__(self, event: Event):
+        line = self.render(event)
+        if line is not None:
+            with self._lock:
+                print(line, file=self.stream or sys.stdout)
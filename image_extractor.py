@@ -1,21 +1,14 @@
 import os
 import zipfile
-from PIL import Image
 from io import BytesIO
-from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 import xml.etree.ElementTree as ET
 from pathlib import Path
+import time
 
-@dataclass
-class ImageExtractionResult:
-    count: int = 0
-    output_dir: str = ""
-    extracted_image_paths: List[str] = field(default_factory=list)
-
-    def __post_init__(self):
-        if self.extracted_image_paths is None:
-            self.extracted_image_paths = []
+import events
+from instrumentation import subtask
+from results import ImageExtractionResult
 
 class ImageExtractor:
     def __init__(self, epub_path: str, output_dir: str):
@@ -26,15 +19,9 @@ class ImageExtractor:
         # Создаем директорию для изображений если её нет
         os.makedirs(output_dir, exist_ok=True)
 
-    def extract_images(self) -> ImageExtractionResult:
-        """Извлекает изображения из EPUB файла"""
-        result = ImageExtractionResult()
-        result.output_dir = self.output_dir
-        
+    def iter_images(self) -> Iterator[Tuple[str, bytes]]:
+        """Последовательно читает изображения из EPUB файла: пары (имя файла, содержимое)"""
         try:
-            # Создаем директорию для изображений, если она не существует
-            os.makedirs(self.output_dir, exist_ok=True)
-            
             with zipfile.ZipFile(self.epub_path, 'r') as epub:
                 # Находим файл OPF
                 container = epub.read('META-INF/container.xml')
@@ -66,38 +53,61 @@ class ImageExtractor:
                                     # Получаем полный путь к файлу относительно корня EPUB
                                     full_path_in_epub = os.path.join(os.path.dirname(opf_path), file_path).replace('\\', '/')
                                     
-                                    # Извлекаем изображение
+                                    # Извлекаем изображение, сохраняя исходное имя файла
                                     image_data = epub.read(full_path_in_epub)
-                                    
-                                    # Генерируем имя файла для сохранения, сохраняя расширение
-                                    original_filename = os.path.basename(file_path)
-                                    output_path = os.path.join(self.output_dir, original_filename)
-                                    
-                                    # Сохраняем изображение
-                                    with open(output_path, 'wb') as f:
-                                        f.write(image_data)
-                                    
-                                    result.extracted_image_paths.append(output_path)
-                                    result.count += 1
                                 except KeyError:
-                                     print(f"Warning: Изображение {full_path_in_epub} не найдено в архиве.")
+                                     events.problem(f"Изображение {full_path_in_epub} не найдено в архиве.",
+                                                    item=full_path_in_epub, level="warning", book=self.epub_path)
+                                     continue
                                 except Exception as e:
-                                    print(f"Ошибка при извлечении изображения {file_path}: {str(e)}")
+                                    events.problem(f"Ошибка при извлечении изображения {file_path}: {str(e)}",
+                                                   item=file_path, book=self.epub_path)
+                                    continue
+                                yield os.path.basename(file_path), image_data
         
         except FileNotFoundError:
-            print(f"Ошибка: EPUB файл не найден по пути {self.epub_path}")
+            events.problem(f"Ошибка: EPUB файл не найден по пути {self.epub_path}", book=self.epub_path)
             raise
         except zipfile.BadZipFile:
-             print(f"Ошибка: Файл {self.epub_path} не является корректным ZIP архивом (EPUB).")
+             events.problem(f"Ошибка: Файл {self.epub_path} не является корректным ZIP архивом (EPUB).", book=self.epub_path)
              raise
         except Exception as e:
-            print(f"Ошибка при извлечении изображений: {str(e)}")
+            events.problem(f"Ошибка при извлечении изображений: {str(e)}", book=self.epub_path)
             raise
+
+    def extract_images(self) -> ImageExtractionResult:
+        """Извлекает изображения из EPUB файла"""
+        result = ImageExtractionResult()
+        result.output_dir = self.output_dir
+        
+        # Создаем директорию для изображений, если она не существует
+        os.makedirs(self.output_dir, exist_ok=True)
+        
+        for done, (filename, image_data) in enumerate(self.iter_images(), 1):
+            started = time.perf_counter()
+            error = None
+            with subtask(f"image:{filename}"):
+                try:
+                    output_path = os.path.join(self.output_dir, filename)
+                    
+                    # Сохраняем изображение
+                    with open(output_path, 'wb') as f:
+                        f.write(image_data)
+                    
+                    result.extracted_image_paths.append(output_path)
+                    result.count += 1
+                except Exception as e:
+                    error = str(e)
+                    events.problem(f"Ошибка при сохранении изображения {filename}: {error}", item=filename, book=self.epub_path)
+            events.emit(events.ItemProcessed, item=filename, done=done, duration=time.perf_counter() - started,
+                        error=error, size=len(image_data), book=self.epub_path)
         
         return result
 
     def validate_images(self, result: ImageExtractionResult) -> List[str]:
         """Проверяет извлеченные изображения на валидность"""
+        from PIL import Image
+
         invalid_files = []
         
         for image_path in result.extracted_image_paths:
@@ -106,6 +116,6 @@ class ImageExtractor:
                     img.verify()
             except Exception as e:
                 invalid_files.append(image_path)
-                print(f"Ошибка валидации изображения {image_path}: {str(e)}")
+                events.problem(f"Ошибка валидации изображения {image_path}: {str(e)}", item=image_path, book=self.epub_path)
         
         return invalid_files 
\ No newline at end of file
@@ -1,53 +1,111 @@
 import os
-from PIL import Image, ImageEnhance, ImageOps
+from io import BytesIO
+from typing import TYPE_CHECKING
+
+import events
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# PIL загружается при первом преобразовании, а не при импорте модуля:
+# запуски без этапа изображений не платят за его импорт
+
+def _open_image(path):
+    from PIL import Image
+
+    return Image.open(path)
+
+def pixelate(img: 'Image.Image', pixelate_factor: int = 10) -> 'Image.Image':
+    """Пикселизирует изображение в памяти."""
+    from PIL import Image
+
+    img = img.convert("RGB")
+    new_width = int(img.width / pixelate_factor)
+    new_height = int(img.height / pixelate_factor)
+    # Уменьшаем изображение
+    img = img.resize((new_width, new_height), resample=Image.NEAREST)
+    # Увеличиваем обратно с тем же режимом для эффекта пикселизации
+    return img.resize((img.width * pixelate_factor, img.height * pixelate_factor), Image.NEAREST)
+
+def contrast(img: 'Image.Image', contrast_factor: float = 2.0) -> 'Image.Image':
+    """Повышает контраст изображения в памяти."""
+    from PIL import ImageEnhance
+
+    return ImageEnhance.Contrast(img).enhance(contrast_factor)
+
+def mirror(img: 'Image.Image') -> 'Image.Image':
+    """Зеркально отражает изображение в памяти."""
+    from PIL import ImageOps
+
+    return ImageOps.mirror(img)
+
+def grayscale(img: 'Image.Image') -> 'Image.Image':
+    """Переводит изображение в оттенки серого (L-mode) в памяти."""
+    return img.convert('L')
+
+# Имя преобразования (как в префиксе выходного файла) -> функция
+TRANSFORMS = {
+    'pixelated': pixelate,
+    'contrasted': contrast,
+    'mirrored': mirror,
+    'grayscale': grayscale,
+}
+
+def transform_image_bytes(data: bytes, kind: str, filename: str) -> bytes:
+    """Применяет преобразование к изображению в памяти и возвращает закодированный результат.
+
+    Формат определяется по расширению filename, как при сохранении в файл.
+    """
+    from PIL import Image
+
+    extension = os.path.splitext(filename)[1].lower()
+    image_format = Image.registered_extensions().get(extension)
+    with Image.open(BytesIO(data)) as img:
+        transformed = TRANSFORMS[kind](img)
+        output = BytesIO()
+        transformed.save(output, format=image_format or img.format)
+    return output.getvalue()
 
 def apply_pixelate(image_path: str, output_path: str, pixelate_factor: int = 10):
     """Применяет пикселизацию к изображению."""
     try:
-        img = Image.open(image_path)
-        img = img.convert("RGB")
-        new_width = int(img.width / pixelate_factor)
-        new_height = int(img.height / pixelate_factor)
-        # Уменьшаем изображение
-        img = img.resize((new_width, new_height), resample=Image.NEAREST)
-        # Увеличиваем обратно с тем же режимом для эффекта пикселизации
-        img = img.resize((img.width * pixelate_factor, img.height * pixelate_factor), Image.NEAREST)
+        img = _open_image(image_path)
+        img = pixelate(img, pixelate_factor)
         img.save(output_path)
         return output_path
     except Exception as e:
-        print(f"Ошибка при пикселизации изображения {image_path}: {e}")
+        events.problem(f"Ошибка при пикселизации изображения {image_path}: {e}")
         return None
 
 def apply_contrast(image_path: str, output_path: str, contrast_factor: float = 2.0):
     """Применяет контраст к изображению."""
     try:
-        img = Image.open(image_path)
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(contrast_factor)
+        img = _open_image(image_path)
+        img = contrast(img, contrast_factor)
         img.save(output_path)
         return output_path
     except Exception as e:
-        print(f"Ошибка при применении контраста к изображению {image_path}: {e}")
+        events.problem(f"Ошибка при применении контраста к изображению {image_path}: {e}")
         return None
 
 def apply_mirror(image_path: str, output_path: str):
     """Применяет зеркальное отражение к изображению."""
     try:
-        img = Image.open(image_path)
-        img = ImageOps.mirror(img)
+        img = _open_image(image_path)
+        img = mirror(img)
         img.save(output_path)
         return output_path
     except Exception as e:
-        print(f"Ошибка при применении зеркального отражения к изображению {image_path}: {e}")
+        events.problem(f"Ошибка при применении зеркального отражения к изображению {image_path}: {e}")
         return None
 
 def apply_grayscale(image_path: str, output_path: str):
     """Преобразует изображение в черно-белый формат."""
     try:
-        img = Image.open(image_path)
-        img = img.convert('L') # Преобразование в оттенки серого (L-mode)
+        img = _open_image(image_path)
+        img = grayscale(img)
         img.save(output_path)
         return output_path
     except Exception as e:
-        print(f"Ошибка при преобразовании в черно-белый {image_path}: {e}")
-        return None 
\ No newline at end of file
+        events.problem(f"Ошибка при преобразовании в черно-белый {image_path}: {e}")
+        return None
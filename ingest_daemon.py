@@ -0,0 +1,321 @@
+import os
+import sys
+import json
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Set, List
+
+import events
+
+# Флаги inotify из sys/inotify.h
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+class InotifyWatcher:
+    """Следит за директорией через inotify (только Linux)"""
+
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, directory: str):
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or libc_name is None:
+            raise OSError(errno.ENOSYS, "inotify недоступен на этой платформе")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 завершился с ошибкой")
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch завершился с ошибкой для {directory}")
+        self.directory = directory
+
+    def wait(self, timeout: float) -> Optional[Set[str]]:
+        """Ждет событий; возвращает имена измененных файлов или None, если нужен полный пересмотр"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if name:
+                    names.add(os.path.join(self.directory, os.fsdecode(name)))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Запасной вариант: периодический полный пересмотр директории"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def wait(self, timeout: float) -> Optional[Set[str]]:
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+@dataclass
+class IngestStats:
+    started_at: float = 0.0
+    processed: int = 0
+    failed: int = 0
+    skipped_unchanged: int = 0
+    queue_depth: int = 0  # Файлы, готовые к обработке, но еще не запущенные
+    in_flight: int = 0
+    settling: int = 0  # Файлы, которые еще дописываются
+
+    @property
+    def throughput(self) -> float:
+        """Книг в минуту с момента запуска"""
+        elapsed = time.time() - self.started_at
+        return (self.processed + self.failed) * 60 / elapsed if elapsed > 0 else 0.0
+
+def _process_book(path: str, library_dir: str, search_pattern: Optional[str], report_dir: Optional[str]):
+    """Обрабатывает одну книгу через EpubProcessor"""
+    from main import EpubProcessor
+
+    processor = EpubProcessor(path, search_pattern, library_dir)
+    processor.process_parallel()
+    if report_dir:
+        os.makedirs(report_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        processor.save_results(os.path.join(report_dir, f"{stem}.json"))
+
+class IngestDaemon:
+    """Долгоживущий режим приема книг из входящей директории.
+
+    Новые и измененные файлы определяются по размеру и mtime; файл отдается в обработку
+    только после того, как его размер и mtime не менялись settle_seconds секунд.
+    Уже обработанные неизмененные файлы пропускаются, в том числе после перезапуска.
+    """
+
+    state_filename = ".ingest_state.json"
+
+    def __init__(self, inbox: str, library_dir: str = "./library", search_pattern: Optional[str] = None,
+                 max_workers: int = 2, settle_seconds: float = 2.0, poll_interval: float = 1.0,
+                 report_dir: Optional[str] = None, use_inotify: bool = True, stats_interval: float = 10.0,
+                 process_book: Optional[Callable[[str], None]] = None):
+        self.inbox = inbox
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.stats_interval = stats_interval
+        self.max_workers = max_workers
+        self.state_path = os.path.join(inbox, self.state_filename)
+        self.process_book = process_book or (
+            lambda path: _process_book(path, library_dir, search_pattern, report_dir)
+        )
+
+        self.watcher = None
+        if use_inotify:
+            try:
+                self.watcher = InotifyWatcher(inbox)
+            except OSError as e:
+                events.problem(f"inotify недоступен ({str(e)}), используется периодический опрос", item=inbox,
+                               level="warning")
+        if self.watcher is None:
+            self.watcher = PollingWatcher(inbox)
+
+        self.stats = IngestStats(started_at=time.time())
+        self._lock = threading.Lock()
+        # Запись файла состояния целиком: иначе снимки двух потоков могут записаться в обратном порядке
+        self._save_lock = threading.Lock()
+        self._state: Dict[str, List[int]] = self._load_state()
+        self._pending: Dict[str, tuple] = {}  # путь -> (размер, mtime_ns, время последнего изменения)
+        self._ready: List[str] = []
+        self._in_flight: Set[str] = set()
+        self._seen_unchanged: Set[str] = set()
+        self._requeued: Set[str] = set()  # Файлы, измененные во время обработки: проверяются на следующем шаге
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._stop = threading.Event()
+
+    def _load_state(self) -> Dict[str, List[int]]:
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self):
+        """Атомарно сохраняет сигнатуры обработанных файлов"""
+        with self._save_lock:
+            with self._lock:
+                state = dict(self._state)
+            fd, tmp_path = tempfile.mkstemp(dir=self.inbox, prefix=".ingest-state-")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+
+    def _scan(self) -> Set[str]:
+        return {entry.path for entry in os.scandir(self.inbox)
+                if entry.is_file() and entry.name.lower().endswith('.epub')}
+
+    def _check(self, path: str, now: float):
+        """Обновляет состояние одного файла-кандидата"""
+        if not path.lower().endswith('.epub') or path in self._in_flight or path in self._ready:
+            return
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._pending.pop(path, None)
+            return
+        signature = [stat.st_size, stat.st_mtime_ns]
+        if self._state.get(path) == signature:
+            self._pending.pop(path, None)
+            if path not in self._seen_unchanged:
+                self._seen_unchanged.add(path)
+                self.stats.skipped_unchanged += 1
+            return
+
+        pending = self._pending.get(path)
+        if pending is None or list(pending[:2]) != signature:
+            # Файл новый или все еще дописывается - начинаем отсчет заново
+            self._pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+        elif now - pending[2] >= self.settle_seconds:
+            del self._pending[path]
+            self._ready.append(path)
+
+    def _run_book(self, path: str, signature: List[int]):
+        try:
+            self.process_book(path)
+            with self._lock:
+                self.stats.processed += 1
+        except Exception as e:
+            events.problem(f"Ошибка при обработке {path}: {str(e)}", item=path)
+            with self._lock:
+                self.stats.failed += 1
+        finally:
+            try:
+                stat = os.stat(path)
+                changed = [stat.st_size, stat.st_mtime_ns] != signature
+            except FileNotFoundError:
+                changed = False
+            with self._lock:
+                # Неудачные файлы тоже запоминаем, чтобы не повторять их, пока они не изменятся
+                self._state[path] = signature
+                self._seen_unchanged.add(path)
+                self._in_flight.discard(path)
+                # Файл переписан во время обработки: при inotify нового события о нем может не быть
+                if changed:
+                    self._requeued.add(path)
+            self._save_state()
+
+    def _dispatch(self):
+        """Отправляет готовые файлы в обработку, не превышая число рабочих потоков"""
+        while self._ready and len(self._in_flight) < self.max_workers:
+            path = self._ready.pop(0)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                self._in_flight.add(path)
+            self._executor.submit(self._run_book, path, [stat.st_size, stat.st_mtime_ns])
+
+    def tick(self, changed: Optional[Set[str]] = None):
+        """Один шаг цикла: проверка кандидатов и запуск готовых файлов"""
+        now = time.monotonic()
+        candidates = self._scan() if changed is None else set(changed)
+        with self._lock:
+            candidates |= self._requeued
+            self._requeued.clear()
+        # Дописываемые файлы проверяем на каждом шаге, даже если событий по ним не было
+        candidates |= set(self._pending)
+        for path in sorted(candidates):
+            self._check(path, now)
+        self._dispatch()
+
+        with self._lock:
+            self.stats.in_flight = len(self._in_flight)
+        self.stats.queue_depth = len(self._ready)
+        self.stats.settling = len(self._pending)
+
+    def print_stats(self):
+        """Сообщает текущую статистику событием Status (в CLI ее выводит ConsoleRenderer)"""
+        stats = self.stats
+        events.status(f"[ingest] обработано: {stats.processed}, ошибок: {stats.failed}, "
+                      f"пропущено без изменений: {stats.skipped_unchanged}, в работе: {stats.in_flight}, "
+                      f"в очереди: {stats.queue_depth}, дописываются: {stats.settling}, "
+                      f"скорость: {stats.throughput:.1f} книг/мин")
+
+    def run(self):
+        """Основной цикл; завершается по stop() или Ctrl+C"""
+        events.status(f"Наблюдение за {self.inbox} ({type(self.watcher).__name__})")
+        self.tick()
+        last_stats = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                # Пока есть дописываемые файлы, просыпаемся чаще, чтобы не затягивать debounce
+                timeout = min(self.poll_interval, self.settle_seconds) if self._pending else self.poll_interval
+                self.tick(self.watcher.wait(timeout))
+                if time.monotonic() - last_stats >= self.stats_interval:
+                    self.print_stats()
+                    last_stats = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+        self.watcher.close()
+        self.print_stats()
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Прием EPUB файлов из входящей директории")
+    parser.add_argument("inbox", help="директория, в которую попадают новые книги")
+    parser.add_argument("search_pattern", nargs="?", default=None, help="слово для поиска")
+    parser.add_argument("--library", default="./library", help="директория библиотеки")
+    parser.add_argument("--reports", default=None, help="директория для JSON отчетов по книгам")
+    parser.add_argument("--workers", type=int, default=2, help="сколько книг обрабатывать одновременно")
+    parser.add_argument("--settle", type=float, default=2.0, help="сколько секунд файл должен не меняться")
+    parser.add_argument("--interval", type=float, default=1.0, help="интервал опроса в секундах")
+    parser.add_argument("--stats-interval", type=float, default=10.0, help="как часто печатать статистику")
+    parser.add_argument("--poll", action="store_true", help="не использовать inotify")
+    parser.add_argument("--verbose", action="store_true", help="выводить ход обработки книг по этапам и файлам")
+    args = parser.parse_args(argv)
+    events.subscribe(events.ConsoleRenderer(verbose=args.verbose))
+
+    daemon = IngestDaemon(
+        args.inbox, args.library, args.search_pattern,
+        max_workers=args.workers, settle_seconds=args.settle, poll_interval=args.interval,
+        report_dir=args.reports, use_inotify=not args.poll, stats_interval=args.stats_interval,
+    )
+    daemon.run()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
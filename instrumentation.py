@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_local = threading.local()
+
+def _thread_io() -> Tuple[int, int]:
+    """Байты, прочитанные и записанные текущим потоком (rchar/wchar из /proc, только Linux)"""
+    try:
+        with open('/proc/thread-self/io', 'rb') as f:
+            data = f.read()
+    except OSError:
+        return 0, 0
+    counters = dict(line.split(b': ', 1) for line in data.splitlines() if b': ' in line)
+    return int(counters.get(b'rchar', 0)), int(counters.get(b'wchar', 0))
+
+@dataclass
+class Span:
+    name: str
+    category: str = "stage"  # stage или subtask
+    parent: Optional[str] = None
+    thread: str = ""
+    submitted: float = 0.0
+    started: float = 0.0
+    finished: float = 0.0
+    cpu_time: float = 0.0
+    peak_memory: int = 0  # Пик памяти tracemalloc относительно начала; при перекрытии этапов - оценка сверху
+    bytes_read: int = 0
+    bytes_written: int = 0
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return self.finished - self.started
+
+    @property
+    def queue_wait(self) -> float:
+        return self.started - self.submitted if self.submitted else 0.0
+
+class Instrumentation:
+    """Сбор метрик по этапам и подзадачам обработки.
+
+    Для каждого участка записываются ожидание в очереди, время выполнения, процессорное
+    время потока, пик памяти (если включен trace_memory) и объем ввода-вывода потока.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.spans: List[Span] = []
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._active_memory_spans = 0
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def span(self, name: str, category: str = "stage", parent: Optional[str] = None,
+             submitted: Optional[float] = None):
+        """Измеряет участок кода, выполняемый в текущем потоке"""
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        if parent is None and stack:
+            parent = stack[-1][1].name
+        span = Span(name=name, category=category, parent=parent, thread=threading.current_thread().name)
+
+        memory_start = 0
+        if self.trace_memory:
+            with self._lock:
+                # Пик памяти глобален, поэтому сбрасываем его только если других участков нет
+                if self._active_memory_spans == 0:
+                    tracemalloc.reset_peak()
+                self._active_memory_spans += 1
+            memory_start = tracemalloc.get_traced_memory()[0]
+        read_start, written_start = _thread_io()
+        cpu_start = time.thread_time()
+        span.started = time.perf_counter()
+        span.submitted = submitted if submitted is not None else span.started
+
+        stack.append((self, span))
+        try:
+            yield span
+        except BaseException as e:
+            span.error = str(e)
+            raise
+        finally:
+            stack.pop()
+            span.finished = time.perf_counter()
+            span.cpu_time = time.thread_time() - cpu_start
+            read_end, written_end = _thread_io()
+            span.bytes_read = read_end - read_start
+            span.bytes_written = written_end - written_start
+            if self.trace_memory:
+                span.peak_memory = max(tracemalloc.get_traced_memory()[1] - memory_start, 0)
+                with self._lock:
+                    self._active_memory_spans -= 1
+            with self._lock:
+                self.spans.append(span)
+
+    def stage_spans(self) -> List[Span]:
+        return [span for span in self.spans if span.category == "stage"]
+
+    def execution_times(self) -> Dict[str, float]:
+        """Плоские метрики для ProcessingResult.execution_times.
+
+        Для этапа: "<этап>.queue_wait", ".cpu_time", ".peak_memory", ".bytes_read", ".bytes_written";
+        для подзадачи - длительность под ключом "<этап>/<подзадача>".
+        """
+        times = {}
+        for span in self.spans:
+            if span.category == "stage":
+                times[f"{span.name}.queue_wait"] = span.queue_wait
+                times[f"{span.name}.cpu_time"] = span.cpu_time
+                times[f"{span.name}.peak_memory"] = span.peak_memory
+                times[f"{span.name}.bytes_read"] = span.bytes_read
+                times[f"{span.name}.bytes_written"] = span.bytes_written
+            else:
+                times[f"{span.parent}/{span.name}"] = span.duration
+        return times
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """События в формате Chrome Trace Event (chrome://tracing, Perfetto)"""
+        pid = os.getpid()
+        thread_ids: Dict[str, int] = {}
+        events = []
+        for span in sorted(self.spans, key=lambda s: s.started):
+            tid = thread_ids.setdefault(span.thread, len(thread_ids) + 1)
+            if span.queue_wait > 0:
+                events.append({
+                    'name': f"{span.name} (очередь)", 'cat': 'queue', 'ph': 'X', 'pid': pid, 'tid': tid,
+                    'ts': (span.submitted - self.origin) * 1e6, 'dur': span.queue_wait * 1e6,
+                })
+            events.append({
+                'name': span.name, 'cat': span.category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': (span.started - self.origin) * 1e6, 'dur': span.duration * 1e6,
+                'args': {
+                    'parent': span.parent, 'cpu_time': span.cpu_time, 'queue_wait': span.queue_wait,
+                    'peak_memory': span.peak_memory, 'bytes_read': span.bytes_read,
+                    'bytes_written': span.bytes_written, 'error': span.error,
+                },
+            })
+        for thread, tid in thread_ids.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save_chrome_trace(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+
+def subtask(name: str):
+    """Участок подзадачи внутри текущего этапа; если сбор метрик не включен, ничего не делает"""
+    stack = getattr(_local, 'stack', None)
+    if not stack:
+        return nullcontext()
+    instrumentation, parent = stack[-1]
+    return instrumentation.span(name, "subtask", parent.name)
+
+def bind(func: Callable, name: str) -> Callable:
+    """Оборачивает функцию для передачи в пул потоков: она будет измерена как подзадача
+    текущего этапа, с ожиданием в очереди от момента вызова bind"""
+    stack = getattr(_local, 'stack', None)
+    if not stack:
+        return func
+    instrumentation, parent = stack[-1]
+    submitted = time.perf_counter()
+
+    def run(*args, **kwargs):
+        with instrumentation.span(name, "subtask", parent.name, submitted):
+            return func(*args, **kwargs)
+    return run
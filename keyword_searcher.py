@@ -1,15 +1,8 @@
 import re
-from dataclasses import dataclass
-from typing import List
+from typing import Iterable, List
 
-@dataclass
-class KeywordSearchResult:
-    match_count: int = 0
-    matches: List[str] = None
-
-    def __post_init__(self):
-        if self.matches is None:
-            self.matches = []
+import events
+from results import KeywordSearchResult
 
 class KeywordSearcher:
     def __init__(self, search_pattern: str):
@@ -34,7 +27,23 @@ class KeywordSearcher:
             result.match_count = len(result.matches)
         
         except Exception as e:
-            print(f"Ошибка при поиске ключевых слов: {str(e)}")
+            events.problem(f"Ошибка при поиске ключевых слов: {str(e)}")
             raise
         
-        return result 
\ No newline at end of file
+        return result
+
+    def search_documents(self, documents: Iterable[str]) -> KeywordSearchResult:
+        """Ищет слово по документам книги, не собирая текст целиком.
+
+        Число совпадений такое же, как у search_keywords для '\n'.join(documents);
+        контекст совпадения ограничен своим документом.
+        """
+        result = KeywordSearchResult()
+        pattern = re.compile(r'\b' + re.escape(self.search_pattern.lower()) + r'\b')
+        for text in documents:
+            for match in pattern.finditer(text.lower()):
+                start = max(0, match.start() - 50)
+                end = min(len(text), match.end() + 50)
+                result.matches.append(text[start:end].strip())
+        result.match_count = len(result.matches)
+        return result
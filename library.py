@@ -1,9 +1,231 @@
 import os
+import json
+import errno
 import shutil
-from typing import Optional
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional, Dict
 
-# Предполагается, что ProcessingResult и другие необходимые dataclasses будут импортированы или доступны.
-# В данном случае, функция принимает необходимые аргументы напрямую.
+import events
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка манифеста недоступна
+    fcntl = None
+
+# add_to_my_library принимает ProcessingResult (см. results.py) или любой объект с полем library_save_path
+
+# ioctl FICLONE из linux/fs.h: создает reflink-копию на файловых системах с copy-on-write (btrfs, xfs)
+FICLONE = 0x40049409
+
+@dataclass
+class LibraryEntry:
+    name: str = ""  # Имя книги в манифесте
+    digest: str = ""  # SHA-256 содержимого
+    path: str = ""  # Путь к объекту в хранилище
+    size: int = 0
+    method: str = ""  # existing, reflink, hardlink или copy
+
+@dataclass
+class LibraryFootprint:
+    books: int = 0  # Записей в манифесте
+    unique_objects: int = 0  # Уникальных файлов в хранилище
+    logical_bytes: int = 0  # Сколько занимали бы полные копии всех книг
+    stored_bytes: int = 0  # Сколько занимают уникальные объекты
+    shared_bytes: int = 0  # Байты объектов, разделяемых с исходными файлами через hardlink
+
+class LibraryStore:
+    """Хранилище библиотеки с адресацией по содержимому.
+
+    Каждая книга хранится один раз в objects/<2 символа хеша>/<хеш>.epub,
+    а manifest.json сопоставляет имя книги с хешем ее содержимого.
+
+    Объект создается reflink-копией или обычной копией. Жесткая ссылка (allow_hardlink)
+    делит inode с исходным файлом: перезапись исходника на месте изменила бы объект.
+    Поэтому такой объект (а с ним и исходник) делается только для чтения, а при обращении
+    к нему хеш проверяется заново.
+    """
+
+    manifest_name = "manifest.json"
+    chunk_size = 1024 * 1024
+
+    _thread_lock = threading.Lock()
+
+    def __init__(self, library_dir: str, allow_hardlink: bool = False):
+        self.library_dir = library_dir
+        self.objects_dir = os.path.join(library_dir, "objects")
+        self.manifest_path = os.path.join(library_dir, self.manifest_name)
+        self.allow_hardlink = allow_hardlink
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    @classmethod
+    def hash_file(cls, path: str) -> str:
+        """Считает SHA-256 файла, читая его блоками"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(cls.chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def object_path(self, digest: str) -> str:
+        """Путь к объекту с заданным хешем"""
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.epub")
+
+    @contextmanager
+    def _locked(self):
+        """Блокирует манифест для потоков и, где возможно, для других процессов"""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.library_dir, ".lock"), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load_manifest(self) -> Dict[str, str]:
+        """Читает манифест имя -> хеш"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_manifest(self, manifest: Dict[str, str]):
+        """Атомарно записывает манифест через временный файл"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.library_dir, prefix=".manifest-")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _reflink(self, source: str, target: str):
+        """Создает reflink-копию (copy-on-write) через ioctl FICLONE"""
+        if fcntl is None:
+            raise OSError(errno.EOPNOTSUPP, "reflink не поддерживается")
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+    def _materialize(self, source: str, target: str) -> str:
+        """Помещает файл в хранилище самым дешевым доступным способом"""
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".tmp-")
+        os.close(fd)
+        try:
+            try:
+                self._reflink(source, tmp_path)
+                method = "reflink"
+            except OSError:
+                os.unlink(tmp_path)
+                try:
+                    if not self.allow_hardlink:
+                        raise OSError(errno.EPERM, "hardlink отключен")
+                    os.link(source, tmp_path)
+                    # Запись в общий inode испортила бы объект: запрещаем ее
+                    os.chmod(tmp_path, os.stat(tmp_path).st_mode & ~0o222)
+                    method = "hardlink"
+                except OSError:
+                    shutil.copy2(source, tmp_path)
+                    method = "copy"
+            os.replace(tmp_path, target)
+            return method
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _intact(self, path: str, digest: str) -> bool:
+        """Объект существует и, если это жесткая ссылка на чужой файл, все еще соответствует хешу"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        if stat.st_nlink > 1 and self.hash_file(path) != digest:
+            # Исходный файл перезаписан на месте: убираем из хранилища только нашу ссылку
+            events.problem(f"Объект {path} изменен через жесткую ссылку и удален из хранилища", item=digest,
+                           level="warning")
+            os.unlink(path)
+            return False
+        return True
+
+    def _unique_name(self, name: str, digest: str, manifest: Dict[str, str]) -> str:
+        """Подбирает имя, не затирающее другую книгу с тем же именем файла"""
+        if manifest.get(name, digest) == digest:
+            return name
+        stem, ext = os.path.splitext(name)
+        return f"{stem}-{digest[:12]}{ext}"
+
+    def add(self, epub_path: str, name: Optional[str] = None) -> LibraryEntry:
+        """Добавляет книгу в библиотеку.
+
+        Если книга с таким содержимым уже есть, стоимость добавления - одно вычисление хеша.
+        """
+        return self._register(epub_path, self.hash_file(epub_path), name)
+
+    async def add_async(self, epub_path: str, name: Optional[str] = None, executor=None) -> LibraryEntry:
+        """Асинхронный вариант add: файл хешируется через aiofiles,
+        а создание объекта и запись манифеста выполняются в executor"""
+        import asyncio
+        import aiofiles
+
+        digest = hashlib.sha256()
+        async with aiofiles.open(epub_path, 'rb') as f:
+            while True:
+                chunk = await f.read(self.chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self._register, epub_path, digest.hexdigest(), name)
+
+    def _register(self, epub_path: str, digest: str, name: Optional[str]) -> LibraryEntry:
+        """Помещает в хранилище файл с уже посчитанным хешем и обновляет манифест"""
+        target = self.object_path(digest)
+        entry = LibraryEntry(digest=digest, path=target, size=os.path.getsize(epub_path), method="existing")
+
+        if not self._intact(target, digest):
+            entry.method = self._materialize(epub_path, target)
+
+        with self._locked():
+            manifest = self.load_manifest()
+            entry.name = self._unique_name(name or os.path.basename(epub_path), digest, manifest)
+            if manifest.get(entry.name) != digest:
+                manifest[entry.name] = digest
+                self._save_manifest(manifest)
+        return entry
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Возвращает путь к объекту книги по ее имени в манифесте; None, если объекта нет или он испорчен"""
+        digest = self.load_manifest().get(name)
+        if not digest:
+            return None
+        path = self.object_path(digest)
+        return path if self._intact(path, digest) else None
+
+    def footprint(self) -> LibraryFootprint:
+        """Считает, сколько места занимает библиотека и сколько сэкономлено дедупликацией"""
+        result = LibraryFootprint()
+        manifest = self.load_manifest()
+        sizes = {}
+        for digest in set(manifest.values()):
+            try:
+                stat = os.stat(self.object_path(digest))
+            except FileNotFoundError:
+                continue
+            sizes[digest] = stat.st_size
+            result.unique_objects += 1
+            if stat.st_nlink > 1:
+                result.shared_bytes += stat.st_size
+            else:
+                result.stored_bytes += stat.st_size
+
+        result.books = len(manifest)
+        result.logical_bytes = sum(sizes.get(digest, 0) for digest in manifest.values())
+        return result
 
 def save_to_library(epub_path: str, library_dir: str, result: any) -> Optional[str]:
     """Сохраняет обработанную книгу в директорию библиотеки.
@@ -17,26 +239,38 @@ def save_to_library(epub_path: str, library_dir: str, result: any) -> Optional[s
         Путь, куда была сохранена книга, или None в случае ошибки.
     """
     try:
-        # Генерируем путь для сохранения в библиотеке
-        book_name = os.path.basename(epub_path)
-        library_path = os.path.join(library_dir, book_name)
-
-        # Копируем файл
-        shutil.copy2(epub_path, library_path)
+        # Кладем книгу в хранилище с адресацией по содержимому
+        entry = LibraryStore(library_dir).add(epub_path)
+        library_path = entry.path
 
         # Обновляем результат (предполагается, что result имеет атрибут library_save_path)
         if hasattr(result, 'library_save_path'):
             result.library_save_path = library_path
 
-        print(f"Книга успешно добавлена в библиотеку: {library_path}")
+        if entry.method == "existing":
+            events.diagnostic(f"Книга уже есть в библиотеке: {library_path}")
+        else:
+            events.diagnostic(f"Книга успешно добавлена в библиотеку: {library_path}")
         if hasattr(result, 'thread_statuses'):
              result.thread_statuses['add_to_my_library'] = "Успешно выполнено"
 
         return library_path
     except Exception as e:
-        print(f"Ошибка при добавлении в библиотеку: {str(e)}")
+        events.problem(f"Ошибка при добавлении в библиотеку: {str(e)}")
         if hasattr(result, 'thread_statuses'):
              result.thread_statuses['add_to_my_library'] = f"Ошибка: {str(e)}"
         # Пока не re-raise исключение, чтобы не прерывать process_parallel
         # raise
-        return None 
\ No newline at end of file
+        return None
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Использование: python library.py <директория_библиотеки>")
+        sys.exit(1)
+
+    footprint = LibraryStore(sys.argv[1]).footprint()
+    print(f"Книг: {footprint.books}, уникальных файлов: {footprint.unique_objects}")
+    print(f"Объем без дедупликации: {footprint.logical_bytes} байт")
+    print(f"Занято хранилищем: {footprint.stored_bytes} байт (+{footprint.shared_bytes} байт общих с исходными файлами)")
@@ -0,0 +1,471 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from dataclasses import dataclass, fields
+from typing import TYPE_CHECKING, List, Optional, Dict, Any
+
+if TYPE_CHECKING:
+    import sqlite3
+    from sketches import HyperLogLog, NgramStats
+
+@dataclass(slots=True)
+class CatalogEntry:
+    fingerprint: str = ""  # SHA-256 содержимого книги (см. LibraryStore)
+    name: str = ""
+    path: str = ""
+    size: int = 0
+    title: Optional[str] = None
+    author: Optional[str] = None
+    language: Optional[str] = None
+    publisher: Optional[str] = None
+    publication_date: Optional[str] = None
+    description: Optional[str] = None
+    series: Optional[str] = None
+    word_count: Optional[int] = None
+    char_count: Optional[int] = None
+    sentence_count: Optional[int] = None
+    paragraph_count: Optional[int] = None
+    toc_entries: Optional[int] = None
+    image_count: Optional[int] = None
+    vocabulary: Optional[int] = None  # Оценка числа различных слов (HyperLogLog)
+    added_at: float = 0.0
+
+@dataclass(slots=True)
+class DuplicatePair:
+    first: str  # Отпечатки книг (fingerprint)
+    second: str
+    similarity: float  # Оценка сходства Жаккара по подписям MinHash
+
+@dataclass(slots=True)
+class VocabularyEstimate:
+    books: int  # Книг с оценкой словаря среди подходящих под фильтры
+    distinct_words: int  # Оценка числа различных слов во всех этих книгах вместе
+    relative_error: float  # Относительная стандартная ошибка оценки
+
+CATALOG_COLUMNS = [f.name for f in fields(CatalogEntry)]
+
+# Колонки, добавленные в books после первой версии схемы: в старых каталогах создаются при открытии
+ADDED_COLUMNS = {'series': 'TEXT COLLATE NOCASE', 'vocabulary': 'INTEGER'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    fingerprint TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    title TEXT COLLATE NOCASE,
+    author TEXT COLLATE NOCASE,
+    language TEXT COLLATE NOCASE,
+    publisher TEXT COLLATE NOCASE,
+    publication_date TEXT,
+    description TEXT,
+    series TEXT COLLATE NOCASE,
+    word_count INTEGER,
+    char_count INTEGER,
+    sentence_count INTEGER,
+    paragraph_count INTEGER,
+    toc_entries INTEGER,
+    image_count INTEGER,
+    vocabulary INTEGER,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_books_author ON books(author, publication_date);
+CREATE INDEX IF NOT EXISTS idx_books_language ON books(language, publication_date);
+CREATE INDEX IF NOT EXISTS idx_books_date ON books(publication_date);
+CREATE INDEX IF NOT EXISTS idx_books_title ON books(title);
+CREATE INDEX IF NOT EXISTS idx_books_added_at ON books(added_at);
+CREATE TABLE IF NOT EXISTS minhash (
+    fingerprint TEXT PRIMARY KEY,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS minhash_bands (
+    key INTEGER NOT NULL,
+    band INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (key, band, fingerprint)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_minhash_bands_fingerprint ON minhash_bands(fingerprint);
+CREATE TABLE IF NOT EXISTS ngram_sketches (
+    fingerprint TEXT PRIMARY KEY,
+    summary BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS vocabulary (
+    fingerprint TEXT PRIMARY KEY,
+    registers BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS library_sketch (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    data BLOB NOT NULL
+);
+"""
+
+class LibraryCatalog:
+    """Каталог библиотеки в SQLite.
+
+    Хранит метаданные и статистику книг, чтобы списки и фильтры по автору,
+    языку и дате не требовали повторного разбора EPUB файлов.
+    """
+
+    filename = "catalog.sqlite3"
+    order_columns = {'added_at', 'title', 'author', 'publication_date', 'word_count', 'size', 'vocabulary'}
+    # Полос LSH на подпись MinHash: 128 значений -> 16 полос по 8 (см. minhash.band_keys)
+    lsh_bands = 16
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(books)")}
+            for column, column_type in ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE books ADD COLUMN {column} {column_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_books_series ON books(series, publication_date)")
+
+    @classmethod
+    def for_library(cls, library_dir: str) -> 'LibraryCatalog':
+        """Открывает каталог, лежащий в директории библиотеки"""
+        os.makedirs(library_dir, exist_ok=True)
+        return cls(os.path.join(library_dir, cls.filename))
+
+    def _connection(self) -> 'sqlite3.Connection':
+        """Возвращает соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # sqlite3 нужен только при обращении к каталогу
+            import sqlite3
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Закрывает соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def upsert(self, entry: CatalogEntry):
+        """Добавляет или обновляет книгу.
+
+        Пустые (None) поля не затирают уже сохраненные значения, поэтому книгу
+        можно сначала добавить с частичными данными, а затем дополнить.
+        """
+        if not entry.added_at:
+            entry.added_at = time.time()
+        values = [getattr(entry, column) for column in CATALOG_COLUMNS]
+        updates = ", ".join(
+            f"{column} = COALESCE(excluded.{column}, books.{column})"
+            for column in CATALOG_COLUMNS if column not in ('fingerprint', 'added_at')
+        )
+        with self._connection() as conn:
+            conn.execute(
+                f"INSERT INTO books ({', '.join(CATALOG_COLUMNS)}) VALUES ({', '.join('?' * len(CATALOG_COLUMNS))}) "
+                f"ON CONFLICT(fingerprint) DO UPDATE SET {updates}",
+                values,
+            )
+
+    @staticmethod
+    def entry_from_result(fingerprint: str, name: str, path: str, size: int, result: Any) -> CatalogEntry:
+        """Собирает запись каталога из ProcessingResult"""
+        entry = CatalogEntry(fingerprint=fingerprint, name=name, path=path, size=size)
+        if result.metadata is not None:
+            entry.title = result.metadata.title
+            entry.author = result.metadata.author
+            entry.language = result.metadata.language
+            entry.publisher = result.metadata.publisher
+            entry.publication_date = result.metadata.publication_date
+            entry.description = result.metadata.description
+            entry.series = result.metadata.series or None
+        if result.text_analysis is not None:
+            entry.word_count = result.text_analysis.word_count
+            entry.char_count = result.text_analysis.char_count
+            entry.sentence_count = result.text_analysis.sentence_count
+            entry.paragraph_count = result.text_analysis.paragraph_count
+            entry.vocabulary = result.text_analysis.vocabulary or None
+        if result.toc is not None:
+            entry.toc_entries = result.toc.total_chapters
+        if result.image_extraction is not None:
+            entry.image_count = result.image_extraction.count
+        return entry
+
+    def _where(self, author: Optional[str], language: Optional[str], date_from: Optional[str],
+               date_to: Optional[str], title: Optional[str], series: Optional[str] = None):
+        """Строит условие WHERE для фильтров"""
+        clauses, params = [], []
+        if author is not None:
+            clauses.append("author = ?")
+            params.append(author)
+        if series is not None:
+            clauses.append("series = ?")
+            params.append(series)
+        if language is not None:
+            clauses.append("language = ?")
+            params.append(language)
+        if date_from is not None:
+            clauses.append("publication_date >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            # Даты хранятся как строки ISO 8601, поэтому верхняя граница включает весь указанный префикс
+            clauses.append("publication_date < ?")
+            params.append(date_to + "\uffff")
+        if title is not None:
+            # Поиск по префиксу диапазоном, чтобы работал индекс по title
+            clauses.append("title >= ? AND title < ?")
+            params += [title, title + "\uffff"]
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def query(self, author: Optional[str] = None, language: Optional[str] = None,
+              date_from: Optional[str] = None, date_to: Optional[str] = None,
+              title: Optional[str] = None, order_by: str = 'added_at', descending: bool = False,
+              limit: Optional[int] = 100, offset: int = 0, series: Optional[str] = None) -> List[CatalogEntry]:
+        """Возвращает книги, подходящие под фильтры.
+
+        author, language и series сравниваются без учета регистра ASCII, title - по префиксу,
+        date_from/date_to - по строке даты публикации включительно.
+        """
+        if order_by not in self.order_columns:
+            raise ValueError(f"Нельзя сортировать по полю {order_by}")
+        where, params = self._where(author, language, date_from, date_to, title, series)
+        sql = f"SELECT {', '.join(CATALOG_COLUMNS)} FROM books{where} ORDER BY {order_by} {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        rows = self._connection().execute(sql, params).fetchall()
+        return [CatalogEntry(*row) for row in rows]
+
+    def count(self, author: Optional[str] = None, language: Optional[str] = None,
+              date_from: Optional[str] = None, date_to: Optional[str] = None,
+              title: Optional[str] = None, series: Optional[str] = None) -> int:
+        """Количество книг, подходящих под фильтры"""
+        where, params = self._where(author, language, date_from, date_to, title, series)
+        return self._connection().execute(f"SELECT COUNT(*) FROM books{where}", params).fetchone()[0]
+
+    def get(self, fingerprint: str) -> Optional[CatalogEntry]:
+        """Возвращает книгу по отпечатку содержимого"""
+        row = self._connection().execute(
+            f"SELECT {', '.join(CATALOG_COLUMNS)} FROM books WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        return CatalogEntry(*row) if row else None
+
+    def upsert_signature(self, fingerprint: str, signature: List[int]):
+        """Сохраняет подпись MinHash книги и ее ключи LSH (прежние ключи книги заменяются)"""
+        from minhash import band_keys, pack_signature
+
+        if not signature:
+            return
+        keys = band_keys(signature, self.lsh_bands)
+        with self._connection() as conn:
+            conn.execute("DELETE FROM minhash_bands WHERE fingerprint = ?", (fingerprint,))
+            conn.execute("INSERT OR REPLACE INTO minhash (fingerprint, signature) VALUES (?, ?)",
+                         (fingerprint, pack_signature(signature)))
+            conn.executemany("INSERT OR IGNORE INTO minhash_bands (key, band, fingerprint) VALUES (?, ?, ?)",
+                             [(key, band, fingerprint) for band, key in enumerate(keys)])
+
+    def signature(self, fingerprint: str) -> Optional[List[int]]:
+        from minhash import unpack_signature
+
+        row = self._connection().execute("SELECT signature FROM minhash WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        return unpack_signature(row[0]) if row else None
+
+    def _signatures(self, fingerprints) -> Dict[str, List[int]]:
+        from minhash import unpack_signature
+
+        fingerprints = list(fingerprints)
+        signatures = {}
+        # Ограничение SQLite на число параметров запроса
+        for start in range(0, len(fingerprints), 500):
+            chunk = fingerprints[start:start + 500]
+            rows = self._connection().execute(
+                f"SELECT fingerprint, signature FROM minhash WHERE fingerprint IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            signatures.update((fingerprint, unpack_signature(data)) for fingerprint, data in rows)
+        return signatures
+
+    def similar(self, signature: List[int], threshold: float = 0.8, fingerprint: str = "") -> List[DuplicatePair]:
+        """Книги, похожие на текст с подписью signature, по убыванию сходства.
+
+        Кандидаты берутся из индекса LSH (книги с совпавшей полосой подписи) и
+        проверяются сравнением подписей; fingerprint - сама книга, она пропускается.
+        """
+        from minhash import band_keys, jaccard
+
+        if not signature:
+            return []
+        keys = band_keys(signature, self.lsh_bands)
+        rows = self._connection().execute(
+            f"SELECT key, band, fingerprint FROM minhash_bands WHERE key IN ({', '.join('?' * len(keys))})", keys
+        ).fetchall()
+        candidates = {other for key, band, other in rows if keys[band] == key and other != fingerprint}
+        pairs = [DuplicatePair(fingerprint, other, jaccard(signature, other_signature))
+                 for other, other_signature in self._signatures(candidates).items()]
+        return sorted((pair for pair in pairs if pair.similarity >= threshold), key=lambda pair: -pair.similarity)
+
+    def duplicates(self, threshold: float = 0.8) -> List[DuplicatePair]:
+        """Все пары похожих книг библиотеки: кандидаты - книги из одной корзины LSH"""
+        from minhash import jaccard
+
+        candidates = set()
+        rows = self._connection().execute(
+            "SELECT group_concat(fingerprint, ' ') FROM minhash_bands GROUP BY key, band HAVING COUNT(*) > 1"
+        )
+        for (bucket,) in rows:
+            members = sorted(bucket.split(' '))
+            candidates.update((first, second) for i, first in enumerate(members) for second in members[i + 1:])
+        signatures = self._signatures({fingerprint for pair in candidates for fingerprint in pair})
+        pairs = [DuplicatePair(first, second, jaccard(signatures[first], signatures[second]))
+                 for first, second in candidates if first in signatures and second in signatures]
+        return sorted((pair for pair in pairs if pair.similarity >= threshold),
+                      key=lambda pair: (-pair.similarity, pair.first, pair.second))
+
+    def upsert_vocabulary(self, fingerprint: str, sketch: 'HyperLogLog'):
+        """Сохраняет скетч различных слов книги для запросов vocabulary"""
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO vocabulary (fingerprint, registers) VALUES (?, ?)",
+                         (fingerprint, sketch.to_bytes()))
+
+    def vocabulary(self, author: Optional[str] = None, language: Optional[str] = None,
+                   date_from: Optional[str] = None, date_to: Optional[str] = None,
+                   title: Optional[str] = None, series: Optional[str] = None) -> VocabularyEstimate:
+        """Число различных слов во всех книгах, подходящих под фильтры (автор, серия, язык...).
+
+        Скетчи книг объединяются по одному по мере чтения строк, поэтому память не
+        зависит от числа книг; ошибка оценки не растет при объединении.
+        """
+        from sketches import HyperLogLog
+
+        where, params = self._where(author, language, date_from, date_to, title, series)
+        rows = self._connection().execute(
+            f"SELECT vocabulary.registers FROM books JOIN vocabulary USING (fingerprint){where}", params
+        )
+        union, books = None, 0
+        for (data,) in rows:
+            sketch = HyperLogLog.from_bytes(data)
+            if union is None:
+                union = sketch
+            else:
+                union.merge(sketch)
+            books += 1
+        if union is None:
+            return VocabularyEstimate(0, 0, 0.0)
+        return VocabularyEstimate(books, union.estimate(), union.relative_error)
+
+    def upsert_ngrams(self, fingerprint: str, stats: 'NgramStats'):
+        """Сохраняет сводки top-k n-грамм книги и добавляет ее статистику в статистику библиотеки.
+
+        По книге хранятся только сводки Space-Saving; count-min sketch накапливается
+        один на библиотеку. Отпечаток - хеш содержимого, поэтому книга, уже учтенная
+        в библиотеке, повторно не добавляется.
+        """
+        from sketches import NgramStats
+
+        conn = self._connection()
+        with conn:
+            # Слияние - чтение и запись одной строки: параллельные процессы выполняют его по очереди
+            conn.execute("BEGIN IMMEDIATE")
+            known = conn.execute("SELECT 1 FROM ngram_sketches WHERE fingerprint = ?", (fingerprint,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO ngram_sketches (fingerprint, summary) VALUES (?, ?)",
+                         (fingerprint, stats.to_bytes(with_sketch=False)))
+            if known:
+                return
+            row = conn.execute("SELECT data FROM library_sketch WHERE id = 1").fetchone()
+            if row is None:
+                library = NgramStats(stats.orders, stats.capacity)
+            else:
+                library = NgramStats.from_bytes(row[0])
+            library.merge(stats)
+            conn.execute("INSERT OR REPLACE INTO library_sketch (id, data) VALUES (1, ?)", (library.to_bytes(),))
+
+    def book_ngrams(self, fingerprint: str) -> Optional['NgramStats']:
+        """Сводки n-грамм книги (без count-min sketch)"""
+        from sketches import NgramStats
+
+        row = self._connection().execute("SELECT summary FROM ngram_sketches WHERE fingerprint = ?",
+                                         (fingerprint,)).fetchone()
+        return NgramStats.from_bytes(row[0]) if row else None
+
+    def library_ngrams(self) -> Optional['NgramStats']:
+        """Статистика n-грамм всей библиотеки (None, если ни одна книга не учтена)"""
+        from sketches import NgramStats
+
+        row = self._connection().execute("SELECT data FROM library_sketch WHERE id = 1").fetchone()
+        return NgramStats.from_bytes(row[0]) if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Сводная статистика по каталогу"""
+        row = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(word_count), 0), COUNT(DISTINCT author) FROM books"
+        ).fetchone()
+        return {'books': row[0], 'total_size': row[1], 'total_words': row[2], 'authors': row[3]}
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Запросы к каталогу библиотеки")
+    parser.add_argument("library_dir", help="директория библиотеки")
+    parser.add_argument("--author")
+    parser.add_argument("--language")
+    parser.add_argument("--since", dest="date_from", help="дата публикации от (YYYY[-MM[-DD]])")
+    parser.add_argument("--until", dest="date_to", help="дата публикации до (YYYY[-MM[-DD]])")
+    parser.add_argument("--title", help="префикс названия")
+    parser.add_argument("--series")
+    parser.add_argument("--order-by", default="added_at")
+    parser.add_argument("--desc", action="store_true")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--offset", type=int, default=0)
+    parser.add_argument("--count", action="store_true", help="вывести только количество")
+    parser.add_argument("--duplicates", action="store_true", help="найти похожие книги во всей библиотеке (MinHash)")
+    parser.add_argument("--similar", metavar="FINGERPRINT", help="книги, похожие на книгу с этим отпечатком")
+    parser.add_argument("--threshold", type=float, default=0.8, help="минимальное сходство для --duplicates/--similar")
+    parser.add_argument("--vocabulary", action="store_true",
+                        help="число различных слов во всех книгах, подходящих под фильтры (HyperLogLog)")
+    parser.add_argument("--top-ngrams", type=int, metavar="N",
+                        help="самые частые слова, биграммы и триграммы всей библиотеки")
+    args = parser.parse_args(argv)
+
+    catalog = LibraryCatalog.for_library(args.library_dir)
+    if args.top_ngrams:
+        library = catalog.library_ngrams()
+        if library is None:
+            print("В каталоге нет статистики n-грамм")
+            sys.exit(1)
+        result = library.to_result(args.top_ngrams)
+        print(f"Слов в библиотеке: {result.total_words}, погрешность оценок до {result.error_bound}")
+        for title, hitters in (("Слова", result.words), ("Биграммы", result.bigrams), ("Триграммы", result.trigrams)):
+            print(f"{title}:")
+            for hitter in hitters:
+                print(f"  {hitter.count:>10}  {hitter.item}")
+        return
+    if args.duplicates or args.similar:
+        if args.similar:
+            signature = catalog.signature(args.similar)
+            if signature is None:
+                print(f"В каталоге нет подписи книги {args.similar}")
+                sys.exit(1)
+            pairs = catalog.similar(signature, args.threshold, fingerprint=args.similar)
+        else:
+            pairs = catalog.duplicates(args.threshold)
+        for pair in pairs:
+            print(f"{pair.first[:12]}  {pair.second[:12]}  сходство {pair.similarity:.2f}")
+        return
+    filters = dict(author=args.author, language=args.language, date_from=args.date_from,
+                   date_to=args.date_to, title=args.title, series=args.series)
+    if args.count:
+        print(catalog.count(**filters))
+        return
+    if args.vocabulary:
+        estimate = catalog.vocabulary(**filters)
+        print(f"Книг: {estimate.books}, различных слов: ~{estimate.distinct_words} "
+              f"(ошибка ±{estimate.relative_error:.1%})")
+        return
+
+    for entry in catalog.query(order_by=args.order_by, descending=args.desc,
+                               limit=args.limit, offset=args.offset, **filters):
+        print(f"{entry.fingerprint[:12]}  {entry.author or '-'}  {entry.title or entry.name}  "
+              f"[{entry.language or '-'}, {entry.publication_date or '-'}]  слов: {entry.word_count or 0}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
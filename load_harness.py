@@ -0,0 +1,306 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+from batch_runner import collect_books, book_key
+from epub_synth import SynthSpec, generate_epub
+from instrumentation import Instrumentation
+import runtime
+from runtime import PoolStats, get_runtime
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль методом ближайшего ранга (q от 0 до 100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(-(-q * len(ordered) // 100)), 1)  # ceil(q * n / 100)
+    return ordered[min(rank, len(ordered)) - 1]
+
+def _rss_bytes() -> int:
+    """Текущий RSS процесса (Linux); 0, если /proc недоступен"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+class RssSampler:
+    """Фоновый замер пикового RSS за время прогона"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = _rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+@dataclass
+class BookSample:
+    path: str
+    arrived: float = 0.0  # Плановое время поступления (открытая нагрузка) или время запуска
+    started: float = 0.0
+    finished: float = 0.0
+    ok: bool = True
+    error: Optional[str] = None
+    stages: Dict[str, Dict[str, float]] = field(default_factory=dict)  # этап -> queue_wait, run_time, cpu_time
+
+    @property
+    def latency(self) -> float:
+        """Время от поступления книги до готового результата, включая ожидание свободного слота"""
+        return self.finished - self.arrived
+
+@dataclass
+class StageContention:
+    runs: int = 0
+    queue_wait_mean: float = 0.0
+    queue_wait_p95: float = 0.0
+    run_time_mean: float = 0.0
+    run_time_p95: float = 0.0
+    cpu_share: float = 0.0  # Доля процессорного времени в времени выполнения; низкая - этап ждет GIL или диск
+
+@dataclass
+class LoadReport:
+    mode: str = "closed"
+    concurrency: int = 0
+    arrival_rate: Optional[float] = None
+    books: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    books_per_second: float = 0.0
+    latency_p50: float = 0.0
+    latency_p95: float = 0.0
+    latency_p99: float = 0.0
+    latency_max: float = 0.0
+    peak_rss_mb: float = 0.0
+    stages: Dict[str, StageContention] = field(default_factory=dict)
+    pools: Dict[str, PoolStats] = field(default_factory=dict)  # Общие пулы Runtime за время прогона
+    failures: List[str] = field(default_factory=list)
+
+def process_book(path: str, workdir: str, key: str, stages: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    """Обрабатывает одну книгу и возвращает метрики ее этапов"""
+    from main import EpubProcessor
+
+    instrumentation = Instrumentation()
+    processor = EpubProcessor(path, None, os.path.join(workdir, "library"),
+                              os.path.join(workdir, "output", key), instrumentation=instrumentation)
+    result = processor.process_parallel(stages)
+    failed = [name for name, status in result.thread_statuses.items() if status.startswith("Ошибка")]
+    if failed:
+        raise RuntimeError(f"Ошибки этапов: {', '.join(failed)}")
+    return {
+        span.name: {'queue_wait': span.queue_wait, 'run_time': span.duration, 'cpu_time': span.cpu_time}
+        for span in instrumentation.stage_spans()
+    }
+
+class LoadHarness:
+    """Прогон корпуса книг через EpubProcessor под заданной нагрузкой.
+
+    Закрытая нагрузка: concurrency книг обрабатываются одновременно, следующая
+    начинается, как только освободился слот. Открытая нагрузка: книги поступают
+    с заданной частотой (пуассоновский поток), не более concurrency одновременно;
+    задержка считается от поступления, поэтому очередь перед слотами видна в хвостах.
+    """
+
+    def __init__(self, books: List[str], concurrency: int = 4, arrival_rate: Optional[float] = None,
+                 stages: Optional[List[str]] = None, workdir: Optional[str] = None, seed: int = 0,
+                 handler=process_book):
+        if not books:
+            raise ValueError("Корпус пуст")
+        self.books = books
+        self.concurrency = concurrency
+        self.arrival_rate = arrival_rate
+        self.stages = stages
+        self.workdir = workdir
+        self.seed = seed
+        self.handler = handler
+
+    def _run_one(self, index: int, sample: BookSample, workdir: str):
+        sample.started = time.perf_counter()
+        try:
+            sample.stages = self.handler(sample.path, workdir, book_key(index, sample.path), self.stages)
+        except Exception as e:
+            sample.ok = False
+            sample.error = str(e)
+        finally:
+            sample.finished = time.perf_counter()
+
+    def run(self) -> LoadReport:
+        workdir = self.workdir or tempfile.mkdtemp(prefix="load-harness-")
+        samples = [BookSample(path) for path in self.books]
+        rng = random.Random(self.seed)
+        try:
+            executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="load")
+            with RssSampler() as rss, executor:
+                pools_before = get_runtime().stats()
+                start = time.perf_counter()
+                futures = []
+                next_arrival = start
+                for index, sample in enumerate(samples):
+                    if self.arrival_rate:
+                        next_arrival += rng.expovariate(self.arrival_rate)
+                        delay = next_arrival - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                        sample.arrived = next_arrival
+                    futures.append(executor.submit(self._run_one, index, sample, workdir))
+                for future in futures:
+                    future.result()
+                elapsed = time.perf_counter() - start
+                pools = self.pool_usage(pools_before, get_runtime().stats(), elapsed)
+        finally:
+            if self.workdir is None:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        if not self.arrival_rate:
+            # В закрытой нагрузке книга "поступает", когда для нее освобождается слот
+            for sample in samples:
+                sample.arrived = sample.started
+        report = self.summarize(samples, elapsed, rss.peak)
+        report.pools = pools
+        return report
+
+    @staticmethod
+    def pool_usage(before: Dict[str, PoolStats], after: Dict[str, PoolStats], elapsed: float) -> Dict[str, PoolStats]:
+        """Использование общих пулов за прогон: разность счетчиков и загрузка за elapsed"""
+        usage = {}
+        for name, stats in after.items():
+            previous = before.get(name, PoolStats(name=name, workers=stats.workers))
+            busy_time = stats.busy_time - previous.busy_time
+            usage[name] = PoolStats(
+                name=name,
+                workers=stats.workers,
+                submitted=stats.submitted - previous.submitted,
+                completed=stats.completed - previous.completed,
+                queued=stats.queued,
+                running=stats.running,
+                max_queued=stats.max_queued,  # Пик с момента создания пула
+                caller_runs=stats.caller_runs - previous.caller_runs,
+                busy_time=busy_time,
+                saturation=busy_time / (stats.workers * elapsed) if elapsed > 0 else 0.0,
+            )
+        return usage
+
+    def summarize(self, samples: List[BookSample], elapsed: float, peak_rss: int) -> LoadReport:
+        latencies = [sample.latency for sample in samples if sample.ok]
+        report = LoadReport(
+            mode="open" if self.arrival_rate else "closed",
+            concurrency=self.concurrency,
+            arrival_rate=self.arrival_rate,
+            books=len(samples),
+            failed=sum(1 for sample in samples if not sample.ok),
+            elapsed=elapsed,
+            books_per_second=len(latencies) / elapsed if elapsed > 0 else 0.0,
+            latency_p50=percentile(latencies, 50),
+            latency_p95=percentile(latencies, 95),
+            latency_p99=percentile(latencies, 99),
+            latency_max=max(latencies, default=0.0),
+            peak_rss_mb=peak_rss / (1024 * 1024),
+            failures=[f"{sample.path}: {sample.error}" for sample in samples if not sample.ok],
+        )
+
+        per_stage: Dict[str, List[Dict[str, float]]] = {}
+        for sample in samples:
+            for name, metrics in sample.stages.items():
+                per_stage.setdefault(name, []).append(metrics)
+        for name, runs in sorted(per_stage.items()):
+            waits = [run['queue_wait'] for run in runs]
+            times = [run['run_time'] for run in runs]
+            total_time = sum(times)
+            report.stages[name] = StageContention(
+                runs=len(runs),
+                queue_wait_mean=sum(waits) / len(runs),
+                queue_wait_p95=percentile(waits, 95),
+                run_time_mean=total_time / len(runs),
+                run_time_p95=percentile(times, 95),
+                cpu_share=sum(run['cpu_time'] for run in runs) / total_time if total_time > 0 else 0.0,
+            )
+        return report
+
+def synthetic_corpus(directory: str, count: int, spec: SynthSpec) -> List[str]:
+    """Генерирует count разных синтетических книг"""
+    os.makedirs(directory, exist_ok=True)
+    return [generate_epub(os.path.join(directory, f"synthetic-{i:04d}.epub"), spec, seed=spec.seed + i)
+            for i in range(count)]
+
+def print_report(report: LoadReport):
+    rate = f", поступление {report.arrival_rate:.2f} книг/с" if report.arrival_rate else ""
+    print(f"Нагрузка: {report.mode}, параллельно {report.concurrency}{rate}")
+    print(f"Книг: {report.books}, с ошибками: {report.failed}, время: {report.elapsed:.2f} с, "
+          f"пропускная способность: {report.books_per_second:.2f} книг/с")
+    print(f"Задержка p50 {report.latency_p50 * 1000:.0f} мс, p95 {report.latency_p95 * 1000:.0f} мс, "
+          f"p99 {report.latency_p99 * 1000:.0f} мс, макс {report.latency_max * 1000:.0f} мс")
+    print(f"Пиковый RSS: {report.peak_rss_mb:.1f} МБ")
+    print(f"{'этап':<20}{'очередь ср.':>12}{'очередь p95':>13}{'работа ср.':>12}{'работа p95':>12}{'CPU':>7}")
+    for name, stage in report.stages.items():
+        print(f"{name:<20}{stage.queue_wait_mean * 1000:>10.1f}мс{stage.queue_wait_p95 * 1000:>11.1f}мс"
+              f"{stage.run_time_mean * 1000:>10.1f}мс{stage.run_time_p95 * 1000:>10.1f}мс{stage.cpu_share:>7.0%}")
+    for name, pool in report.pools.items():
+        print(f"Пул {name}: потоков {pool.workers}, задач {pool.submitted}, выполнено вызывающим {pool.caller_runs}, "
+              f"пик очереди {pool.max_queued}, загрузка {pool.saturation:.0%}")
+    for failure in report.failures:
+        print(f"  {failure}")
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон EpubProcessor: пропускная способность и хвосты задержек")
+    parser.add_argument("inputs", nargs="*", help="EPUB файлы, директории или glob-шаблоны корпуса")
+    parser.add_argument("--synthetic", type=int, default=0, help="сгенерировать столько синтетических книг")
+    parser.add_argument("--chapters", type=int, default=SynthSpec.chapters)
+    parser.add_argument("--words", type=int, default=SynthSpec.words_per_chapter)
+    parser.add_argument("--images", type=int, default=SynthSpec.images)
+    parser.add_argument("--books", type=int, default=None, help="сколько книг прогнать (корпус повторяется по кругу)")
+    parser.add_argument("--concurrency", type=int, default=4, help="книг в обработке одновременно")
+    parser.add_argument("--rate", type=float, default=None, help="частота поступления книг в секунду (открытая нагрузка)")
+    parser.add_argument("--stages", default=None, help="этапы через запятую (по умолчанию - все)")
+    parser.add_argument("--io-workers", type=int, default=None, help="потоков в общем пуле ввода-вывода")
+    parser.add_argument("--cpu-workers", type=int, default=None, help="потоков в общем CPU пуле")
+    parser.add_argument("--json", default=None, help="сохранить отчет в JSON")
+    args = parser.parse_args(argv)
+    if args.io_workers or args.cpu_workers:
+        runtime.configure(args.io_workers, args.cpu_workers)
+
+    corpus_dir = None
+    books = collect_books(args.inputs) if args.inputs else []
+    if args.synthetic:
+        corpus_dir = tempfile.mkdtemp(prefix="load-corpus-")
+        spec = SynthSpec(chapters=args.chapters, words_per_chapter=args.words, images=args.images)
+        books += synthetic_corpus(corpus_dir, args.synthetic, spec)
+    if not books:
+        parser.error("нужен корпус: пути к книгам или --synthetic N")
+    if args.books:
+        books = [books[i % len(books)] for i in range(args.books)]
+
+    try:
+        harness = LoadHarness(books, args.concurrency, args.rate, args.stages.split(",") if args.stages else None)
+        report = harness.run()
+    finally:
+        if corpus_dir:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(asdict(report), f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
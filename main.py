@@ -6,139 +6,182 @@
 import os
 import sys
 import json
+import argparse
 import threading
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
-from dataclasses import dataclass, field, asdict
+from functools import cached_property, partial
+from dataclasses import replace
 from typing import List, Dict, Optional
-import zipfile
-from pathlib import Path
-import xml.etree.ElementTree as ET
-import re
 import shutil
 import time
-import asyncio
-import aiofiles
 import io
-import multiprocessing
-from multiprocessing import Manager
+# asyncio и aiofiles импортируются внутри асинхронных методов, PIL и bs4 - внутри этапов,
+# которым они нужны: синхронный запуск отдельных этапов их не загружает
 
 from metadata_extractor import MetadataExtractor, EpubMetadata
 from text_extractor import TextExtractor, TextExtractionResult
-from text_analyzer import TextAnalyzer, TextAnalysisResult
+from text_analyzer import TextAnalyzer, TextAnalysisResult, split_documents
 from image_extractor import ImageExtractor, ImageExtractionResult
 from keyword_searcher import KeywordSearcher, KeywordSearchResult
 from toc_generator import TocGenerator, TocResult
 from text_formatter import TextFormatter, FormattingResult
 from chapter_splitter import ChapterSplitter, ChapterSplitResult
 from style_processor import StyleProcessor, StyleProcessingResult
-from image_transformer import apply_pixelate, apply_contrast, apply_mirror, apply_grayscale
-
-@dataclass
-class ProcessingResult:
-    metadata: EpubMetadata = None
-    text_analysis: TextAnalysisResult = None
-    image_extraction: ImageExtractionResult = None
-    keyword_search: KeywordSearchResult = None
-    text_formatting: FormattingResult = None
-    toc: TocResult = None
-    chapters: ChapterSplitResult = None
-    style_processing: StyleProcessingResult = None
-    library_save_path: Optional[str] = None
-    execution_times: Dict[str, float] = None
-    thread_statuses: Dict[str, str] = None
-
-    def __post_init__(self):
-        if self.execution_times is None:
-            self.execution_times = {}
-        if self.thread_statuses is None:
-            self.thread_statuses = {}
-
-@dataclass
-class TextExtractionResult:
-    text: str = ""
-    html_content: Dict[str, str] = field(default_factory=dict)
-
-@dataclass
-class TextAnalysisResult:
-    word_count: int = 0
-    char_count: int = 0
-    sentence_count: int = 0
-    paragraph_count: int = 0
-    search_word_frequency: int = 0
-
-@dataclass
-class ImageExtractionResult:
-    count: int = 0
-    output_dir: str = ""
-    extracted_image_paths: List[str] = field(default_factory=list)
-    pixelated_image_paths: Dict[str, str] = field(default_factory=dict)
-    contrasted_image_paths: Dict[str, str] = field(default_factory=dict)
-    mirrored_image_paths: Dict[str, str] = field(default_factory=dict)
-    grayscale_image_paths: Dict[str, str] = field(default_factory=dict)
-
-    def __post_init__(self):
-        if self.extracted_image_paths is None:
-            self.extracted_image_paths = []
-        if self.pixelated_image_paths is None:
-            self.pixelated_image_paths = {}
-        if self.contrasted_image_paths is None:
-            self.contrasted_image_paths = {}
-        if self.mirrored_image_paths is None:
-            self.mirrored_image_paths = {}
-        if self.grayscale_image_paths is None:
-            self.grayscale_image_paths = {}
-
-@dataclass
-class KeywordSearchResult:
-    match_count: int = 0
-    matches: List[str] = field(default_factory=list)
-
-@dataclass
-class TocResult:
-    toc_text: str = ""
-    toc_html: str = ""
-
-@dataclass
-class FormattingResult:
-    formatted_text: str = ""
-    formatted_headers_count: int = 0
-    bold_headers: Dict[str, str] = field(default_factory=dict)
-    uppercase_headers: Dict[str, str] = field(default_factory=dict)
-
-@dataclass
-class ChapterSplitResult:
-    total_chapters: int = 0
-    output_zip: str = ""
-    chapter_files: List[str] = field(default_factory=list)
-
-@dataclass
-class StyleProcessingResult:
-    processed_styles: Dict[str, str] = None
-    total_styles: int = 0
-    optimized_size: int = 0
-    original_size: int = 0
-
-    def __post_init__(self):
-        if self.processed_styles is None:
-            self.processed_styles = {}
+from results import ProcessingResult, NgramResult
+from image_transformer import apply_pixelate, apply_contrast, apply_mirror, apply_grayscale, TRANSFORMS, transform_image_bytes
+from library import LibraryStore
+from library_catalog import LibraryCatalog
+from stage_scheduler import Stage, StageScheduler, Resource
+from instrumentation import Instrumentation, bind
+from profiling import StageProfiler
+from memory_budget import MemoryBudget, image_pixels
+from batch_journal import BookCheckpoint
+import runtime
+from runtime import Runtime, get_runtime
+import events
+
+# Поле ProcessingResult -> этап, который его заполняет
+RESULT_FIELD_STAGES = {
+    'metadata': 'extract_metadata',
+    'text_analysis': 'analyze_text',
+    'ngrams': 'analyze_ngrams',
+    'image_extraction': 'extract_images',
+    'keyword_search': 'search_keywords',
+    'text_formatting': 'format_text',
+    'toc': 'generate_toc',
+    'chapters': 'split_chapters',
+    'style_processing': 'process_styles',
+    'library_save_path': 'add_to_my_library',
+    'fingerprint': 'add_to_my_library',
+}
+
+# Этапы, результаты которых записываются в журнал пакета и восстанавливаются при возобновлении.
+# Библиотека не входит: повторное добавление стоит одного хеширования, а каталогу нужна ее запись
+CHECKPOINT_STAGES = sorted(set(RESULT_FIELD_STAGES.values()) - {'add_to_my_library'})
+
+# Имена, которые можно передать в --stages: поля результата, короткие псевдонимы и имена этапов
+STAGE_ALIASES = {
+    **RESULT_FIELD_STAGES,
+    'text': 'extract_text',
+    'images': 'extract_images',
+    'keywords': 'search_keywords',
+    'ngram_stats': 'analyze_ngrams',
+    'formatting': 'format_text',
+    'styles': 'process_styles',
+    'library': 'add_to_my_library',
+}
+
+def resolve_stage_names(names) -> List[str]:
+    """Переводит имена полей и псевдонимы в имена этапов EpubProcessor"""
+    known = set(STAGE_ALIASES.values())
+    resolved = []
+    for name in names:
+        name = name.strip()
+        if not name:
+            continue
+        stage = STAGE_ALIASES.get(name, name)
+        if stage not in known:
+            raise ValueError(f"Неизвестный этап {name}; доступны: {', '.join(sorted(STAGE_ALIASES))}")
+        if stage not in resolved:
+            resolved.append(stage)
+    return resolved
+
+class LazyProcessingResult:
+    """Представление ProcessingResult для использования как библиотеки.
+
+    Поле вычисляется при первом обращении: выполняется только заполняющий его этап
+    и его зависимости, повторное обращение возвращает уже полученное значение.
+    """
+
+    def __init__(self, processor: 'EpubProcessor'):
+        self._processor = processor
+
+    def __getattr__(self, name: str):
+        result = self._processor.result
+        value = getattr(result, name)
+        if value is None and name in RESULT_FIELD_STAGES:
+            with self._processor._stage_lock:
+                value = getattr(result, name)
+                if value is None:
+                    self._processor.run_stage(RESULT_FIELD_STAGES[name])
+                    value = getattr(result, name)
+        return value
 
 class EpubProcessor:
-    def __init__(self, epub_path: str, search_pattern: str = None, library_dir: str = "./library"):
+    def __init__(self, epub_path: str, search_pattern: str = None, library_dir: str = "./library",
+                 output_dir: Optional[str] = None, instrumentation: Optional[Instrumentation] = None,
+                 profiler: Optional[StageProfiler] = None, memory_budget: Optional[MemoryBudget] = None,
+                 checkpoint: Optional[BookCheckpoint] = None, runtime: Optional[Runtime] = None):
         self.epub_path = epub_path
         self.search_pattern = search_pattern
         self.library_dir = library_dir
+        # Директория для изображений и архива глав; по умолчанию - как раньше (рядом с книгой и в ./extracted_images)
+        self.output_dir = output_dir
         self.result = ProcessingResult()
-        self.metadata_extractor = MetadataExtractor(epub_path)
-        self.text_extractor = TextExtractor()
-        self.text_analyzer = TextAnalyzer()
-        self.image_extractor = ImageExtractor(epub_path, "extracted_images")
-        self.keyword_searcher = KeywordSearcher(search_pattern)
-        self.text_formatter = TextFormatter()
-        self.toc_generator = TocGenerator(epub_path)
-        self.chapter_splitter = ChapterSplitter()
-        self.style_processor = StyleProcessor(epub_path)
-        
-        os.makedirs(self.library_dir, exist_ok=True)
+        self.library_entry = None
+        # Сводки n-грамм книги (sketches.NgramStats) для статистики библиотеки в каталоге
+        self.ngram_stats = None
+        # Сбор подробных метрик по этапам и подзадачам (None - выключен)
+        self.instrumentation = instrumentation
+        # Профилировщик этапов (None - этапы вызываются напрямую, без накладных расходов)
+        self.profiler = profiler
+        # Бюджет памяти: потоковый анализ текста и ограничение декодируемых изображений (None - выключен)
+        self.memory_budget = memory_budget
+        # Журнал завершенных этапов книги: выполненные в прошлом запуске этапы не повторяются (None - выключен)
+        self.checkpoint = checkpoint
+        self._restored: set = set()
+        self._checkpoint_loaded = False
+        # Пулы потоков для этапов и их подзадач (None - общий Runtime процесса)
+        self._runtime = runtime
+        # Промежуточные значения уже выполненных этапов (например, извлеченный текст)
+        self._stage_values: Dict[str, any] = {}
+        self._stage_lock = threading.RLock()
+
+    @property
+    def runtime(self) -> Runtime:
+        return self._runtime or get_runtime()
+
+    # Компоненты создаются при первом обращении: этапы, которые не запрашивались,
+    # не открывают архив и не создают выходных директорий
+    @cached_property
+    def metadata_extractor(self) -> MetadataExtractor:
+        return MetadataExtractor(self.epub_path)
+
+    @cached_property
+    def text_extractor(self) -> TextExtractor:
+        return TextExtractor()
+
+    @cached_property
+    def text_analyzer(self) -> TextAnalyzer:
+        from minhash import MinHasher
+
+        return TextAnalyzer(minhasher=MinHasher(), vocabulary_precision=14)
+
+    @cached_property
+    def image_extractor(self) -> ImageExtractor:
+        return ImageExtractor(
+            self.epub_path,
+            os.path.join(self.output_dir, "extracted_images") if self.output_dir else "extracted_images"
+        )
+
+    @cached_property
+    def keyword_searcher(self) -> KeywordSearcher:
+        return KeywordSearcher(self.search_pattern)
+
+    @cached_property
+    def text_formatter(self) -> TextFormatter:
+        return TextFormatter()
+
+    @cached_property
+    def toc_generator(self) -> TocGenerator:
+        return TocGenerator(self.epub_path)
+
+    @cached_property
+    def chapter_splitter(self) -> ChapterSplitter:
+        return ChapterSplitter()
+
+    @cached_property
+    def style_processor(self) -> StyleProcessor:
+        return StyleProcessor(self.epub_path)
 
     def extract_metadata(self) -> EpubMetadata:
         """Извлекает метаданные из EPUB файла"""
@@ -164,7 +207,8 @@ class EpubProcessor:
     def analyze_text(self, text_result: TextExtractionResult) -> TextAnalysisResult:
         """Анализирует извлеченный текст"""
         try:
-            result = self.text_analyzer.analyze_text(text_result.text, self.search_pattern)
+            result = self.text_analyzer.analyze_text(text_result.text, self.search_pattern,
+                                                     text_result.document_starts)
             self.result.text_analysis = result
             self.result.thread_statuses['analyze_text'] = "Успешно выполнено"
             return result
@@ -172,6 +216,32 @@ class EpubProcessor:
             self.result.thread_statuses['analyze_analysis'] = f"Ошибка: {str(e)}"
             raise
 
+    def analyze_ngrams(self, text_result: TextExtractionResult) -> NgramResult:
+        """Считает самые частые слова, биграммы и триграммы в фиксированной памяти"""
+        try:
+            # По главам, как в потоковом режиме: n-граммы не переходят через границу главы
+            documents = split_documents(text_result.text, text_result.document_starts)
+            return self._ngram_result(self.text_analyzer.ngram_stats(documents), "Успешно выполнено")
+        except Exception as e:
+            self.result.thread_statuses['analyze_ngrams'] = f"Ошибка: {str(e)}"
+            raise
+
+    def analyze_ngrams_streaming(self) -> NgramResult:
+        """Считает n-граммы по документам, не собирая текст целиком (режим бюджета памяти)"""
+        try:
+            stats = self.text_analyzer.ngram_stats(self.text_extractor.iter_documents(self.epub_path))
+            return self._ngram_result(stats, "Успешно выполнено (потоково)")
+        except Exception as e:
+            self.result.thread_statuses['analyze_ngrams'] = f"Ошибка: {str(e)}"
+            raise
+
+    def _ngram_result(self, stats, status: str) -> NgramResult:
+        self.ngram_stats = stats
+        result = stats.to_result()
+        self.result.ngrams = result
+        self.result.thread_statuses['analyze_ngrams'] = status
+        return result
+
     def extract_images(self) -> ImageExtractionResult:
         """Извлекает изображения из EPUB файла и применяет преобразования."""
         try:
@@ -185,34 +255,39 @@ class EpubProcessor:
             }
             
             if extraction_result.extracted_image_paths:
-                with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as executor:
-                    futures = []
-                    for original_path in extraction_result.extracted_image_paths:
-                        # Генерируем пути для сохранения трансформированных изображений
-                        base_name = os.path.basename(original_path)
-                        pixelated_path = os.path.join(self.image_extractor.output_dir, f"pixelated_{base_name}")
-                        contrasted_path = os.path.join(self.image_extractor.output_dir, f"contrasted_{base_name}")
-                        mirrored_path = os.path.join(self.image_extractor.output_dir, f"mirrored_{base_name}")
-                        grayscale_path = os.path.join(self.image_extractor.output_dir, f"grayscale_{base_name}")
-                        
-                        # Добавляем задачи в пул потоков
-                        futures.append(executor.submit(apply_pixelate, original_path, pixelated_path))
-                        futures.append(executor.submit(apply_contrast, original_path, contrasted_path))
-                        futures.append(executor.submit(apply_mirror, original_path, mirrored_path))
-                        futures.append(executor.submit(apply_grayscale, original_path, grayscale_path))
-                        
-                        # Сохраняем связь между оригиналом и результатом в словарях
-                        transformed_image_paths['pixelated'][original_path] = pixelated_path
-                        transformed_image_paths['contrasted'][original_path] = contrasted_path
-                        transformed_image_paths['mirrored'][original_path] = mirrored_path
-                        transformed_image_paths['grayscale'][original_path] = grayscale_path
-                        
-                    # Ожидаем завершения всех задач (опционально, можно обрабатывать результаты по мере готовности)
-                    for future in as_completed(futures):
-                        try:
-                            future.result()
-                        except Exception as e:
-                            print(f"Ошибка при параллельном преобразовании изображения: {str(e)}")
+                calls = []
+                for original_path in extraction_result.extracted_image_paths:
+                    # Генерируем пути для сохранения трансформированных изображений
+                    base_name = os.path.basename(original_path)
+                    pixelated_path = os.path.join(self.image_extractor.output_dir, f"pixelated_{base_name}")
+                    contrasted_path = os.path.join(self.image_extractor.output_dir, f"contrasted_{base_name}")
+                    mirrored_path = os.path.join(self.image_extractor.output_dir, f"mirrored_{base_name}")
+                    grayscale_path = os.path.join(self.image_extractor.output_dir, f"grayscale_{base_name}")
+                    
+                    # Собираем задачи для общего CPU пула
+                    transforms = [
+                        ('pixelated', apply_pixelate, pixelated_path),
+                        ('contrasted', apply_contrast, contrasted_path),
+                        ('mirrored', apply_mirror, mirrored_path),
+                        ('grayscale', apply_grayscale, grayscale_path),
+                    ]
+                    for kind, apply, output_path in transforms:
+                        task = bind(self._with_image_budget(apply, original_path), f"{kind}:{base_name}")
+                        calls.append(events.bind(partial(self._transform_image, task, kind, base_name,
+                                                         original_path, output_path)))
+                    
+                    # Сохраняем связь между оригиналом и результатом в словарях
+                    transformed_image_paths['pixelated'][original_path] = pixelated_path
+                    transformed_image_paths['contrasted'][original_path] = contrasted_path
+                    transformed_image_paths['mirrored'][original_path] = mirrored_path
+                    transformed_image_paths['grayscale'][original_path] = grayscale_path
+                    
+                # Преобразования выполняются в общем CPU пуле; поток этапа тоже берет задачи, а не простаивает
+                for future in self.runtime.cpu.run_all(calls):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        events.problem(f"Ошибка при параллельном преобразовании изображения: {str(e)}")
 
             # Обновляем результат извлечения с путями к трансформированным изображениям
             extraction_result.pixelated_image_paths = transformed_image_paths['pixelated']
@@ -238,6 +313,82 @@ class EpubProcessor:
             self.result.thread_statuses['search_keywords'] = f"Ошибка: {str(e)}"
             raise
 
+    def analyze_text_streaming(self) -> TextAnalysisResult:
+        """Анализирует текст по документам, не собирая его целиком (режим бюджета памяти)"""
+        try:
+            documents = self.text_extractor.iter_documents(self.epub_path)
+            result = self.text_analyzer.analyze_stream(self._joined(documents), self.search_pattern)
+            self.result.text_analysis = result
+            self.result.thread_statuses['analyze_text'] = "Успешно выполнено (потоково)"
+            return result
+        except Exception as e:
+            self.result.thread_statuses['analyze_text'] = f"Ошибка: {str(e)}"
+            raise
+
+    def search_keywords_streaming(self) -> KeywordSearchResult:
+        """Ищет ключевые слова по документам, не собирая текст целиком (режим бюджета памяти)"""
+        try:
+            # Текст не хранится между этапами, поэтому поиск читает документы из архива заново
+            self.memory_budget.note('search_keywords', "текст повторно читается из архива вместо общего извлечения")
+            result = self.keyword_searcher.search_documents(self.text_extractor.iter_documents(self.epub_path))
+            self.result.keyword_search = result
+            self.result.thread_statuses['search_keywords'] = "Успешно выполнено (потоково)"
+            return result
+        except Exception as e:
+            self.result.thread_statuses['search_keywords'] = f"Ошибка: {str(e)}"
+            raise
+
+    @staticmethod
+    def _joined(documents):
+        """Фрагменты потока, эквивалентного '\n'.join(documents)"""
+        for index, document in enumerate(documents):
+            if index:
+                yield '\n'
+            yield document
+
+    @staticmethod
+    def _transform_image(func, kind: str, item: str, *args):
+        """Выполняет одно преобразование изображения и сообщает о нем событием"""
+        started = time.perf_counter()
+        try:
+            value = func(*args)
+        except Exception as e:
+            events.emit(events.ImageTransformed, item=item, transform=kind, duration=time.perf_counter() - started,
+                        error=str(e))
+            raise
+        events.emit(events.ImageTransformed, item=item, transform=kind, duration=time.perf_counter() - started)
+        return value
+
+    def _with_image_budget(self, func, image, label: str = ""):
+        """Оборачивает преобразование изображения ожиданием места в бюджете памяти.
+
+        Размер читается из заголовка при первом запуске преобразования, а не при создании
+        задачи: испорченное изображение не должно останавливать весь этап.
+        """
+        if self.memory_budget is None:
+            return func
+        label = label or (os.path.basename(image) if isinstance(image, str) else "")
+        size = []
+        size_lock = threading.Lock()
+
+        def probe():
+            # Преобразования одного изображения разделяют image (в том числе BytesIO): размер читается один раз
+            with size_lock:
+                if not size:
+                    try:
+                        size.append(image_pixels(image))
+                    except Exception as e:
+                        events.problem(f"Не удалось определить размер изображения {label}: {str(e)}", item=label,
+                                       level="warning", book=self.epub_path, stage='extract_images')
+                        size.append((None, None))
+                return size[0]
+
+        def run(*args):
+            width, height = probe()
+            with self.memory_budget.image_slot(width, height, label):
+                return func(*args)
+        return run
+
     def format_text(self) -> FormattingResult:
         """Форматирует текст"""
         try:
@@ -263,7 +414,7 @@ class EpubProcessor:
     def split_chapters(self) -> ChapterSplitResult:
         """Разделяет книгу на главы"""
         try:
-            result = self.chapter_splitter.split_chapters(self.epub_path)
+            result = self.chapter_splitter.split_chapters(self.epub_path, self.output_dir)
             self.result.chapters = result
             self.result.thread_statuses['split_chapters'] = "Успешно выполнено"
             return result
@@ -289,29 +440,22 @@ class EpubProcessor:
             chapters = self.chapter_splitter.split_text_into_chapters(text_result.text)
             
             if not chapters:
-                print("Не удалось разбить текст на главы")
+                events.problem("Не удалось разбить текст на главы", level="warning", book=self.epub_path)
                 return {}
             
-            # Используем минимум между количеством глав и доступными ядрами
-            max_workers = min(len(chapters), os.cpu_count() or 4)
-            
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {
-                    executor.submit(self._process_single_chapter, chapter_text, chapter_num): chapter_num
-                    for chapter_num, chapter_text in chapters.items()
-                }
-                
-                results = {}
-                for future in as_completed(futures):
-                    chapter_num = futures[future]
-                    try:
-                        results[chapter_num] = future.result()
-                    except Exception as e:
-                        print(f"Ошибка при обработке главы {chapter_num}: {str(e)}")
-                
-                return results
+            calls = [partial(self._process_single_chapter, chapter_text, chapter_num)
+                     for chapter_num, chapter_text in chapters.items()]
+            results = {}
+            for chapter_num, future in zip(chapters, self.runtime.cpu.run_all(calls)):
+                try:
+                    results[chapter_num] = future.result()
+                except Exception as e:
+                    events.problem(f"Ошибка при обработке главы {chapter_num}: {str(e)}", item=str(chapter_num),
+                                   book=self.epub_path)
+
+            return results
         except Exception as e:
-            print(f"Ошибка при параллельной обработке глав: {str(e)}")
+            events.problem(f"Ошибка при параллельной обработке глав: {str(e)}", book=self.epub_path)
             return {}
 
     def _process_single_chapter(self, chapter_text: str, chapter_num: int) -> str:
@@ -321,7 +465,7 @@ class EpubProcessor:
             # Например, форматирование, анализ и т.д.
             return chapter_text
         except Exception as e:
-            print(f"Ошибка при обработке главы {chapter_num}: {str(e)}")
+            events.problem(f"Ошибка при обработке главы {chapter_num}: {str(e)}", item=str(chapter_num), book=self.epub_path)
             return ""
 
     def process_metadata_parallel(self) -> Dict[str, any]:
@@ -333,112 +477,510 @@ class EpubProcessor:
                 ('publisher', self.metadata_extractor.extract_publisher),
                 ('date', self.metadata_extractor.extract_date),
                 ('language', self.metadata_extractor.extract_language),
-                ('description', self.metadata_extractor.extract_description)
+                ('description', self.metadata_extractor.extract_description),
+                ('series', self.metadata_extractor.extract_series)
             ]
             
-            with ThreadPoolExecutor(max_workers=len(metadata_tasks)) as executor:
-                futures = {
-                    executor.submit(task[1]): task[0]
-                    for task in metadata_tasks
-                }
-                
-                results = {}
-                for future in as_completed(futures):
-                    field = futures[future]
-                    try:
-                        results[field] = future.result()
-                    except Exception as e:
-                        print(f"Ошибка при извлечении {field}: {str(e)}")
-                
-                return results
+            # Поля читаются из архива книги: задачи ввода-вывода
+            futures = self.runtime.io.run_all([task[1] for task in metadata_tasks])
+
+            results = {}
+            for (field, _), future in zip(metadata_tasks, futures):
+                try:
+                    results[field] = future.result()
+                except Exception as e:
+                    events.problem(f"Ошибка при извлечении {field}: {str(e)}", item=field, book=self.epub_path)
+
+            return results
         except Exception as e:
-            print(f"Ошибка при параллельной обработке метаданных: {str(e)}")
+            events.problem(f"Ошибка при параллельной обработке метаданных: {str(e)}", book=self.epub_path)
             return {}
 
     def add_to_my_library(self) -> str:
         """Сохраняет обработанную книгу в директорию библиотеки."""
         try:
-            # Генерируем путь для сохранения в библиотеке
-            book_name = os.path.basename(self.epub_path)
-            library_path = os.path.join(self.library_dir, book_name)
-            
-            # Копируем файл
-            shutil.copy2(self.epub_path, library_path)
+            # Кладем книгу в хранилище с адресацией по содержимому: повторное добавление стоит одного хеширования
+            entry = LibraryStore(self.library_dir).add(self.epub_path)
+            library_path = entry.path
             
+            self.library_entry = entry
             self.result.library_save_path = library_path
-            self.result.thread_statuses['add_to_my_library'] = "Книга успешно добавлена в библиотеку"
+            self.result.fingerprint = entry.digest
+            self.update_catalog()
+            events.emit(events.CacheLookup, cache="library", hit=entry.method == "existing")
+            if entry.method == "existing":
+                self.result.thread_statuses['add_to_my_library'] = "Книга уже есть в библиотеке"
+            else:
+                self.result.thread_statuses['add_to_my_library'] = "Книга успешно добавлена в библиотеку"
             return library_path
         except Exception as e:
             self.result.thread_statuses['add_to_my_library'] = f"Ошибка при добавлении в библиотеку: {str(e)}"
             raise
 
-    def process_parallel(self) -> ProcessingResult:
-        """Параллельная обработка EPUB файла"""
-        start_time = time.time()
-        operation_times = {}
-        
-        # Извлекаем текст и сразу анализируем его
-        text_start = time.time()
-        text_result = self.extract_text()
-        self.analyze_text(text_result)
-        operation_times['extract_text'] = time.time() - text_start
-        
-        # Запускаем все операции параллельно
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            futures = {}
-            
-            # Базовые операции
-            base_operations = [
-                (self.extract_metadata, 'extract_metadata'),
-                (self.extract_images, 'extract_images'),
-                (lambda: self.search_keywords(text_result), 'search_keywords'),
-                (self.format_text, 'format_text'),
-                (self.generate_toc, 'generate_toc'),
-                (self.split_chapters, 'split_chapters'),
-                (self.process_styles, 'process_styles'),
-                (self.add_to_my_library, 'add_to_my_library')
+    def update_catalog(self):
+        """Записывает книгу и уже полученные результаты обработки в каталог библиотеки"""
+        if self.library_entry is None:
+            return
+        entry = self.library_entry
+        catalog = LibraryCatalog.for_library(self.library_dir)
+        catalog.upsert(LibraryCatalog.entry_from_result(entry.digest, entry.name, entry.path, entry.size, self.result))
+        if self.result.text_analysis is not None and self.result.text_analysis.minhash:
+            catalog.upsert_signature(entry.digest, self.result.text_analysis.minhash)
+        if self.ngram_stats is not None:
+            catalog.upsert_ngrams(entry.digest, self.ngram_stats)
+        if self.result.text_analysis is not None:
+            vocabulary = TextAnalyzer.vocabulary_sketch(self.result.text_analysis)
+            if vocabulary is not None:
+                catalog.upsert_vocabulary(entry.digest, vocabulary)
+
+    def build_stages(self) -> List[Stage]:
+        """Описывает этапы обработки: входы, выходы и класс ресурсов"""
+        if self.memory_budget is not None:
+            # Текст целиком не собирается: этапы, которым он нужен, читают документы потоково
+            text_stages = [Stage('analyze_text', self.analyze_text_streaming, resource=Resource.CPU),
+                           Stage('analyze_ngrams', self.analyze_ngrams_streaming, resource=Resource.CPU)]
+            keyword_stage = Stage('search_keywords', self.search_keywords_streaming, resource=Resource.CPU)
+        else:
+            text_stages = [
+                Stage('extract_text', self.extract_text, outputs=('text_result',), resource=Resource.IO),
+                Stage('analyze_text', self.analyze_text, inputs=('text_result',), resource=Resource.CPU),
+                Stage('analyze_ngrams', self.analyze_ngrams, inputs=('text_result',), resource=Resource.CPU),
             ]
-            
-            # Запускаем все операции
-            for operation, name in base_operations:
-                op_start = time.time()
-                future = executor.submit(operation)
-                futures[future] = (name, op_start)
-            
-            for future in as_completed(futures):
-                operation_name, op_start = futures[future]
+            keyword_stage = Stage('search_keywords', self.search_keywords, inputs=('text_result',), resource=Resource.CPU)
+        stages = text_stages + [
+            Stage('extract_metadata', self.extract_metadata, resource=Resource.IO),
+            Stage('extract_images', self.extract_images, resource=Resource.CPU_HEAVY),
+            Stage('format_text', self.format_text, resource=Resource.CPU),
+            Stage('generate_toc', self.generate_toc, resource=Resource.IO),
+            Stage('split_chapters', self.split_chapters, resource=Resource.IO),
+            Stage('process_styles', self.process_styles, resource=Resource.CPU),
+            Stage('add_to_my_library', self.add_to_my_library, resource=Resource.IO),
+        ]
+        # Поиск ключевых слов имеет смысл только при заданном слове для поиска
+        if self.search_pattern:
+            stages.append(keyword_stage)
+        return stages
+
+    @staticmethod
+    def _stage_outputs(values: Dict[str, any]) -> List[str]:
+        """Файлы, которые этап оставил на диске: без них сохраненный результат бесполезен"""
+        paths = []
+        images = values.get('image_extraction')
+        if images is not None:
+            paths += images.extracted_image_paths
+            for mapping in (images.pixelated_image_paths, images.contrasted_image_paths,
+                            images.mirrored_image_paths, images.grayscale_image_paths):
+                paths += mapping.values()
+        chapters = values.get('chapters')
+        if chapters is not None and chapters.output_zip:
+            paths.append(chapters.output_zip)
+        return paths
+
+    def _restore_checkpoint(self):
+        """Подставляет в результат этапы, завершенные в прошлом запуске, если их файлы на месте"""
+        if self.checkpoint is None or self._checkpoint_loaded:
+            return
+        self._checkpoint_loaded = True
+        for name, values in self.checkpoint.completed().items():
+            if name not in CHECKPOINT_STAGES:
+                continue
+            restored = all(os.path.exists(path) for path in self._stage_outputs(values))
+            events.emit(events.CacheLookup, book=self.epub_path, stage=name, cache="checkpoint", hit=restored)
+            if not restored:
+                continue
+            for field_name, value in values.items():
+                setattr(self.result, field_name, value)
+            self._restored.add(name)
+            self.result.thread_statuses[name] = "Восстановлено из журнала"
+
+    def _checkpointed(self, name: str, func):
+        """Оборачивает этап так, чтобы после успешного выполнения его результат попал в журнал"""
+        fields = [field_name for field_name, stage in RESULT_FIELD_STAGES.items() if stage == name]
+
+        def run(**kwargs):
+            value = func(**kwargs)
+            values = {field_name: getattr(self.result, field_name) for field_name in fields}
+            # Этап, оставивший не все файлы (например, упало одно преобразование), при возобновлении повторится
+            if all(item is not None for item in values.values()) and \
+                    all(os.path.exists(path) for path in self._stage_outputs(values)):
                 try:
-                    future.result()
-                    # Правильно измеряем время выполнения каждой операции после её завершения
-                    operation_times[operation_name] = time.time() - op_start
+                    self.checkpoint.record(name, values)
+                except (OSError, TypeError) as e:
+                    events.problem(f"Ошибка при записи этапа {name} в журнал: {str(e)}")
+            return value
+        run.__name__ = getattr(func, '__name__', name)
+        return run
+
+    def _evented(self, name: str, func):
+        """Оборачивает этап так, чтобы его начало, завершение и события внутри него относились к книге и этапу"""
+        def run(**kwargs):
+            with events.context(book=self.epub_path, stage=name):
+                events.emit(events.StageStarted)
+                started = time.perf_counter()
+                try:
+                    value = func(**kwargs)
                 except Exception as e:
-                    print(f"Ошибка при выполнении {operation_name}: {str(e)}")
-                    # Если произошла ошибка, можно установить время выполнения в 0 или другое значение
-                    operation_times[operation_name] = 0.0 # Или другое значение по умолчанию при ошибке
+                    events.emit(events.StageFinished, status="failed", duration=time.perf_counter() - started, error=str(e))
+                    raise
+                events.emit(events.StageFinished, duration=time.perf_counter() - started)
+                return value
+        run.__name__ = getattr(func, '__name__', name)
+        return run
+
+    def _scheduler(self, stages=None) -> StageScheduler:
+        """Планировщик для выбранных этапов (None - все этапы) с учетом их зависимостей"""
+        self._restore_checkpoint()
+        all_stages = self.build_stages()
+        if self.checkpoint is not None:
+            all_stages = [replace(stage, func=self._checkpointed(stage.name, stage.func))
+                          if stage.name in CHECKPOINT_STAGES else stage for stage in all_stages]
+        all_stages = [replace(stage, func=self._evented(stage.name, stage.func)) for stage in all_stages]
+        if self.profiler is not None:
+            all_stages = [replace(stage, func=self.profiler.wrap(stage.name, stage.func)) for stage in all_stages]
+        scheduler = StageScheduler(all_stages, instrumentation=self.instrumentation, executors=self.runtime.executors())
+        if stages is None:
+            if not self._restored:
+                return scheduler
+            names = list(scheduler.stages)
+        else:
+            names = resolve_stage_names(stages)
+            if 'search_keywords' in names and not self.search_pattern:
+                raise ValueError("Для этапа search_keywords нужно задать слово для поиска")
+        # Восстановленные из журнала этапы не выполняются; их зависимости - только если нужны другим этапам
+        return scheduler.select([name for name in names if name not in self._restored], self._stage_values)
+
+    def run_stage(self, name: str):
+        """Выполняет один этап (и недостающие зависимости) в текущем потоке и возвращает его результат"""
+        scheduler = self._scheduler([name])
+        with self._stage_lock:
+            value = None  # Этап мог быть восстановлен из журнала - тогда выполнять нечего
+            # build_stages объявляет этапы после их зависимостей, поэтому порядок объявления подходит
+            for stage in scheduler.stages.values():
+                value = stage.func(**{input_name: self._stage_values[input_name] for input_name in stage.inputs})
+                # Промежуточные выходы запоминаем, чтобы следующие этапы не извлекали текст заново
+                if len(stage.outputs) == 1:
+                    self._stage_values[stage.outputs[0]] = value
+                elif stage.outputs:
+                    self._stage_values.update(zip(stage.outputs, value))
+            return value
+
+    def lazy_result(self) -> 'LazyProcessingResult':
+        """Результат, поля которого вычисляются при первом обращении"""
+        return LazyProcessingResult(self)
+
+    def process_parallel(self, stages=None) -> ProcessingResult:
+        """Параллельная обработка EPUB файла.
+
+        Каждый этап запускается, как только готовы его входы: метаданные, изображения,
+        стили и оглавление не ждут извлечения текста.
+
+        Args:
+            stages: Имена нужных этапов или полей результата (например, ['metadata', 'text_analysis']).
+                Зависимости добавляются автоматически, остальные этапы не запускаются. None - все этапы.
+        """
+        start_time = time.time()
+        operation_times = {}
+        
+        schedule = self._scheduler(stages).run(self._stage_values)
+        self._stage_values.update(schedule.values)
+        for name, run in schedule.runs.items():
+            # Об упавших этапах сообщает сам этап, о пропущенных - только планировщик
+            if run.status == "skipped":
+                events.emit(events.StageFinished, book=self.epub_path, stage=name, status="skipped", error=run.error)
+            # Время считается от фактического начала выполнения этапа, а не от постановки в очередь
+            operation_times[name] = run.duration
+
+        # Дополняем запись каталога результатами, завершившимися после добавления в библиотеку
+        try:
+            self.update_catalog()
+        except Exception as e:
+            events.problem(f"Ошибка при обновлении каталога библиотеки: {str(e)}", book=self.epub_path)
 
         # Сохраняем времена выполнения отдельных операций
         self.result.execution_times = operation_times
         
-        # Общее время - сумма времен выполнения всех операций
-        self.result.execution_times['total_time'] = sum(operation_times.values())
+        # Этапы выполняются параллельно, поэтому сумма их времен больше реального времени обработки:
+        # общее время - время работы планировщика, сумма сохраняется отдельно
+        self.result.execution_times['total_time'] = schedule.wall_time
+        self.result.execution_times['stage_time_sum'] = sum(operation_times.values())
+        if self.instrumentation is not None:
+            self.result.execution_times.update(self.instrumentation.execution_times())
+        self._record_memory_budget()
+        
+        # Критический путь - цепочка этапов, определившая общее время обработки
+        self.result.critical_path = schedule.critical_path
+        self.result.execution_times['critical_path_time'] = schedule.critical_path_time
+        self.result.execution_times['critical_path_wait'] = schedule.critical_path_wait
         
         # Также сохраним общее время выполнения самого метода process_parallel (Wall time)
         self.result.execution_times['process_parallel_wall_time'] = time.time() - start_time
+        self._book_finished(self.result.execution_times['process_parallel_wall_time'])
+
+        return self.result
+
+    async def _offload(self, executor, func, *args):
+        """Выполняет блокирующую или CPU-функцию в executor (None - общий CPU пул), не блокируя цикл событий"""
+        import asyncio
+
+        return await asyncio.get_running_loop().run_in_executor(executor or self.runtime.cpu, func, *args)
+
+    @staticmethod
+    async def _write_file_async(path: str, data: bytes):
+        """Асинхронно записывает байты в файл"""
+        import aiofiles
+
+        async with aiofiles.open(path, 'wb') as f:
+            await f.write(data)
+
+    async def extract_images_async(self, executor=None, max_concurrent_images: int = 8) -> ImageExtractionResult:
+        """Асинхронно извлекает изображения и применяет преобразования.
+
+        Чтение архива и преобразования выполняются в executor, запись файлов - через aiofiles.
+        """
+        import asyncio
+        import aiofiles.os
+
+        try:
+            output_dir = self.image_extractor.output_dir
+            await aiofiles.os.makedirs(output_dir, exist_ok=True)
+            result = ImageExtractionResult(output_dir=output_dir)
+            semaphore = asyncio.Semaphore(max_concurrent_images)
+
+            async def handle_image(filename: str, image_data: bytes):
+                try:
+                    original_path = os.path.join(output_dir, filename)
+                    await self._write_file_async(original_path, image_data)
+                    result.extracted_image_paths.append(original_path)
+                    result.count += 1
+
+                    transform = self._with_image_budget(transform_image_bytes, io.BytesIO(image_data), filename)
+                    transformed = await asyncio.gather(*(
+                        self._offload(executor, transform, image_data, kind, filename)
+                        for kind in TRANSFORMS
+                    ), return_exceptions=True)
+                    for kind, data in zip(TRANSFORMS, transformed):
+                        events.emit(events.ImageTransformed, book=self.epub_path, stage='extract_images', item=filename,
+                                    transform=kind, error=str(data) if isinstance(data, Exception) else None)
+                        if isinstance(data, Exception):
+                            events.problem(f"Ошибка при параллельном преобразовании изображения: {str(data)}",
+                                           item=filename, book=self.epub_path, stage='extract_images')
+                            continue
+                        transformed_path = os.path.join(output_dir, f"{kind}_{filename}")
+                        await self._write_file_async(transformed_path, data)
+                        getattr(result, f"{kind}_image_paths")[original_path] = transformed_path
+                finally:
+                    semaphore.release()
+
+            # Изображения читаются из архива по одному, а в обработке одновременно не больше max_concurrent_images
+            images = iter(self.image_extractor.iter_images())
+            tasks = []
+            while True:
+                await semaphore.acquire()
+                item = await self._offload(executor, next, images, None)
+                if item is None:
+                    semaphore.release()
+                    break
+                tasks.append(asyncio.create_task(handle_image(*item)))
+            await asyncio.gather(*tasks)
+
+            self.result.image_extraction = result
+            self.result.thread_statuses['extract_images'] = "Изображения успешно извлечены и преобразованы"
+            return result
+        except Exception as e:
+            self.result.thread_statuses['extract_images'] = f"Ошибка: {str(e)}"
+            raise
+
+    async def split_chapters_async(self, executor=None) -> ChapterSplitResult:
+        """Асинхронно разделяет книгу на главы: архив собирается в памяти и записывается через aiofiles"""
+        try:
+            chapters = await self._offload(executor, self.chapter_splitter.read_chapters, self.epub_path)
+            archive = await self._offload(executor, self.chapter_splitter.build_chapters_archive, chapters)
+            output_zip = os.path.join(self.output_dir or os.path.dirname(self.epub_path), 'chapters.zip')
+            await self._write_file_async(output_zip, archive)
+
+            result = ChapterSplitResult(output_zip=output_zip)
+            # Вместо временных файлов главы указывают на имена внутри архива
+            result.chapters = {title: f"{title}.txt" for title, _ in chapters}
+            result.total_chapters = len(result.chapters)
+            self.result.chapters = result
+            self.result.thread_statuses['split_chapters'] = "Успешно выполнено"
+            return result
+        except Exception as e:
+            self.result.thread_statuses['split_chapters'] = f"Ошибка: {str(e)}"
+            raise
 
+    async def add_to_my_library_async(self, executor=None) -> str:
+        """Асинхронно сохраняет книгу в библиотеку (хеширование через aiofiles)"""
+        try:
+            entry = await LibraryStore(self.library_dir).add_async(self.epub_path, executor=executor)
+            self.library_entry = entry
+            self.result.library_save_path = entry.path
+            self.result.fingerprint = entry.digest
+            await self._offload(executor, self.update_catalog)
+            events.emit(events.CacheLookup, book=self.epub_path, stage='add_to_my_library', cache="library",
+                        hit=entry.method == "existing")
+            if entry.method == "existing":
+                self.result.thread_statuses['add_to_my_library'] = "Книга уже есть в библиотеке"
+            else:
+                self.result.thread_statuses['add_to_my_library'] = "Книга успешно добавлена в библиотеку"
+            return entry.path
+        except Exception as e:
+            self.result.thread_statuses['add_to_my_library'] = f"Ошибка при добавлении в библиотеку: {str(e)}"
+            raise
+
+    async def process_async(self, executor=None, output_file: Optional[str] = None, stages=None) -> ProcessingResult:
+        """Асинхронная обработка EPUB файла.
+
+        CPU-этапы выполняются в executor (по умолчанию - общий CPU пул Runtime),
+        выходные файлы пишутся асинхронно, поэтому под одним циклом событий может
+        обрабатываться много книг одновременно. stages - как в process_parallel.
+        """
+        import asyncio
+
+        start_time = time.perf_counter()
+        operation_times = {}
+        selected = set(self._scheduler(stages).stages)
+
+        async def timed(name: str, coroutine_factory):
+            # Под одним циклом событий идут этапы многих книг, поэтому книга и этап указываются явно
+            events.emit(events.StageStarted, book=self.epub_path, stage=name)
+            stage_start = time.perf_counter()
+            try:
+                value = await coroutine_factory()
+            except Exception as e:
+                events.emit(events.StageFinished, book=self.epub_path, stage=name, status="failed",
+                            duration=time.perf_counter() - stage_start, error=str(e))
+                raise
+            finally:
+                operation_times[name] = time.perf_counter() - stage_start
+            events.emit(events.StageFinished, book=self.epub_path, stage=name, duration=operation_times[name])
+            return value
+
+        async def get_text():
+            if 'text_result' in self._stage_values:
+                return self._stage_values['text_result']
+            text_result = await timed('extract_text', lambda: self._offload(executor, self.extract_text))
+            self._stage_values['text_result'] = text_result
+            return text_result
+
+        needs_text = self.memory_budget is None and selected & {'extract_text', 'analyze_text', 'analyze_ngrams',
+                                                             'search_keywords'}
+        text_task = asyncio.ensure_future(get_text()) if needs_text else None
+
+        async def after_text(name: str, func):
+            try:
+                text_result = await text_task
+            except Exception:
+                events.emit(events.StageFinished, book=self.epub_path, stage=name, status="skipped",
+                            error="Не выполнены зависимости: extract_text")
+                raise
+            return await timed(name, lambda: self._offload(executor, func, text_result))
+
+        stage_coroutines = {
+            'extract_text': lambda: text_task,
+            'analyze_text': lambda: after_text('analyze_text', self.analyze_text),
+            'analyze_ngrams': lambda: after_text('analyze_ngrams', self.analyze_ngrams),
+            'extract_metadata': lambda: timed('extract_metadata', lambda: self._offload(executor, self.extract_metadata)),
+            'extract_images': lambda: timed('extract_images', lambda: self.extract_images_async(executor)),
+            'format_text': lambda: timed('format_text', lambda: self._offload(executor, self.format_text)),
+            'generate_toc': lambda: timed('generate_toc', lambda: self._offload(executor, self.generate_toc)),
+            'split_chapters': lambda: timed('split_chapters', lambda: self.split_chapters_async(executor)),
+            'process_styles': lambda: timed('process_styles', lambda: self._offload(executor, self.process_styles)),
+            'add_to_my_library': lambda: timed('add_to_my_library', lambda: self.add_to_my_library_async(executor)),
+            'search_keywords': lambda: after_text('search_keywords', self.search_keywords),
+        }
+        if self.memory_budget is not None:
+            stage_coroutines['analyze_text'] = lambda: timed(
+                'analyze_text', lambda: self._offload(executor, self.analyze_text_streaming))
+            stage_coroutines['analyze_ngrams'] = lambda: timed(
+                'analyze_ngrams', lambda: self._offload(executor, self.analyze_ngrams_streaming))
+            stage_coroutines['search_keywords'] = lambda: timed(
+                'search_keywords', lambda: self._offload(executor, self.search_keywords_streaming))
+        await asyncio.gather(*(stage_coroutines[name]() for name in stage_coroutines if name in selected),
+                             return_exceptions=True)
+
+        # Дополняем запись каталога результатами, завершившимися после добавления в библиотеку
+        try:
+            await self._offload(executor, self.update_catalog)
+        except Exception as e:
+            events.problem(f"Ошибка при обновлении каталога библиотеки: {str(e)}", book=self.epub_path)
+
+        self.result.execution_times = operation_times
+        self.result.execution_times['total_time'] = time.perf_counter() - start_time
+        self.result.execution_times['stage_time_sum'] = sum(operation_times.values())
+        self.result.execution_times['process_async_wall_time'] = time.perf_counter() - start_time
+        self._record_memory_budget()
+        self._book_finished(self.result.execution_times['process_async_wall_time'])
+
+        if output_file:
+            await self.save_results_async(output_file)
         return self.result
 
-    def save_results(self, output_file: str = "output_report.json"):
-        """Сохраняет результаты обработки в JSON файл"""
-        result_dict = {
+    def _book_finished(self, duration: float):
+        failed = sorted(name for name, status in self.result.thread_statuses.items() if status.startswith("Ошибка"))
+        events.emit(events.BookFinished, book=self.epub_path, stage="", status="failed" if failed else "done",
+                    duration=duration, error=", ".join(failed) or None)
+
+    def _record_memory_budget(self):
+        """Переносит в результат отметки о вынужденно медленных путях и пиковый RSS"""
+        if self.memory_budget is None:
+            return
+        self.memory_budget.check_rss('process')
+        self.result.degraded = list(self.memory_budget.degraded)
+        self.result.execution_times['peak_rss_mb'] = self.memory_budget.peak_rss / (1024 * 1024)
+
+    @staticmethod
+    def _statistics_report(stats, histograms: bool = True) -> Optional[Dict[str, any]]:
+        """Распределения и удобочитаемость для отчета; гистограммы - только для книги целиком"""
+        if stats is None:
+            return None
+        report = {
+            "words": stats.words,
+            "sentences": stats.sentences,
+            "mean_word_length": round(stats.mean_word_length, 2),
+            "mean_sentence_length": round(stats.mean_sentence_length, 2),
+            "word_length_percentiles": stats.word_length_percentiles.tolist(),
+            "sentence_length_percentiles": stats.sentence_length_percentiles.tolist(),
+            "language": stats.language,
+            "flesch_reading_ease": round(stats.flesch_reading_ease, 1),
+            "flesch_kincaid_grade": round(stats.flesch_kincaid_grade, 1),
+            "automated_readability_index": round(stats.automated_readability_index, 1),
+        }
+        if histograms:
+            # Хвост из нулей не нужен: длина гистограммы - наибольшая встреченная длина + 1
+            for name in ("word_lengths", "sentence_lengths"):
+                values = getattr(stats, name).tolist()
+                while values and not values[-1]:
+                    values.pop()
+                report[name] = values
+        return report
+
+    def build_report(self) -> Dict[str, any]:
+        """Собирает отчет о результатах обработки в виде словаря"""
+        return {
+            "epub_path": self.epub_path,
             "execution_times": self.result.execution_times,
-            "metadata": asdict(self.result.metadata) if self.result.metadata else None,
+            "critical_path": self.result.critical_path,
+            "metadata": self.result.metadata.to_dict() if self.result.metadata else None,
             "text_analysis": {
                 "word_count": self.result.text_analysis.word_count,
                 "char_count": self.result.text_analysis.char_count,
                 "sentence_count": self.result.text_analysis.sentence_count,
                 "paragraph_count": self.result.text_analysis.paragraph_count,
+                "vocabulary": self.result.text_analysis.vocabulary,
+                "statistics": self._statistics_report(self.result.text_analysis.statistics),
+                "chapters": [self._statistics_report(stats, histograms=False)
+                             for stats in self.result.text_analysis.chapter_statistics],
                 "search_word_frequency": {self.search_pattern: self.result.text_analysis.search_word_frequency}
             } if self.result.text_analysis else None,
+            "ngrams": {
+                "total_words": self.result.ngrams.total_words,
+                "words": [[hitter.item, hitter.count] for hitter in self.result.ngrams.words],
+                "bigrams": [[hitter.item, hitter.count] for hitter in self.result.ngrams.bigrams],
+                "trigrams": [[hitter.item, hitter.count] for hitter in self.result.ngrams.trigrams],
+                "error_bound": self.result.ngrams.error_bound,
+                "memory_bytes": self.result.ngrams.memory_bytes
+            } if self.result.ngrams else None,
             "image_extraction": {
                 "count": self.result.image_extraction.count,
                 "output_dir": self.result.image_extraction.output_dir,
@@ -469,31 +1011,162 @@ class EpubProcessor:
                 "processed_files": list(self.result.style_processing.processed_styles.keys())
             } if self.result.style_processing else None,
             "library_save_path": self.result.library_save_path,
+            "fingerprint": self.result.fingerprint,
+            "degraded": self.result.degraded,
             "thread_statuses": self.result.thread_statuses
         }
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result_dict, f, ensure_ascii=False, indent=2)
 
-def main():
-    if len(sys.argv) < 2:
-        print("Использование: python main.py <путь_к_epub> [слово_для_поиска]")
-        sys.exit(1)
-        
-    # Путь к EPUB файлу
-    epub_path = sys.argv[1]
-    
-    # Слово для поиска (если указано)
-    search_pattern = sys.argv[2] if len(sys.argv) > 2 else None
+    def default_report_path(self) -> str:
+        """Отчет рядом с книгой: у разных книг, обрабатываемых параллельно, разные файлы"""
+        return os.path.splitext(self.epub_path)[0] + ".report.json"
+
+    def _report_json(self, compact: bool) -> str:
+        if compact:
+            return json.dumps(self.build_report(), ensure_ascii=False, separators=(',', ':'))
+        return json.dumps(self.build_report(), ensure_ascii=False, indent=2)
+
+    def save_results(self, output_file: Optional[str] = None, compact: bool = False):
+        """Сохраняет результаты обработки в JSON файл (по умолчанию - <книга>.report.json).
+
+        Файл пишется во временный и переименовывается, поэтому при одновременной записи
+        одного отчета читатель видит целый файл одного из запусков.
+        """
+        output_file = output_file or self.default_report_path()
+        data = self._report_json(compact)
+        temp_file = f"{output_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(temp_file, output_file)
+
+    async def save_results_async(self, output_file: Optional[str] = None, compact: bool = False):
+        """Асинхронно сохраняет результаты обработки в JSON файл"""
+        import aiofiles
+        import aiofiles.os
+
+        output_file = output_file or self.default_report_path()
+        data = self._report_json(compact)
+        temp_file = f"{output_file}.{os.getpid()}.{id(self)}.tmp"
+        async with aiofiles.open(temp_file, 'w', encoding='utf-8') as f:
+            await f.write(data)
+        await aiofiles.os.replace(temp_file, output_file)
+
+async def process_books_async(books, max_in_flight: int = 8, search_pattern: Optional[str] = None,
+                              library_dir: str = "./library", output_root: Optional[str] = None,
+                              report_dir: Optional[str] = None, executor=None,
+                              on_result=None) -> Dict[str, ProcessingResult]:
+    """Обрабатывает много книг под одним циклом событий.
+
+    books - обычный или асинхронный итератор путей. Очередь ограничена max_in_flight,
+    поэтому источник книг приостанавливается (backpressure), пока обрабатываемые книги не завершатся.
+    """
+    import asyncio
+    import aiofiles.os
+    # Те же уникальные имена выходных директорий и отчетов, что у пакетного режима
+    from batch_runner import book_key
+
+    loop = asyncio.get_running_loop()
+    books_queue = asyncio.Queue(maxsize=max_in_flight)
+    results = {}
+
+    async def producer():
+        index = 0
+        if hasattr(books, '__aiter__'):
+            async for path in books:
+                await books_queue.put((index, path))
+                index += 1
+        else:
+            for index, path in enumerate(books):
+                await books_queue.put((index, path))
+        for _ in range(max_in_flight):
+            await books_queue.put(None)
+
+    async def worker():
+        while True:
+            item = await books_queue.get()
+            if item is None:
+                return
+            index, path = item
+            # Книги с одинаковым именем из разных директорий не должны писать в одно место
+            key = book_key(index, path)
+            output_dir = os.path.join(output_root, key) if output_root else None
+            output_file = os.path.join(report_dir, f"{key}.json") if report_dir else None
+            try:
+                # Конструктор открывает архив, поэтому тоже выполняется вне цикла событий
+                processor = await loop.run_in_executor(
+                    executor, EpubProcessor, path, search_pattern, library_dir, output_dir
+                )
+                results[path] = await processor.process_async(executor, output_file)
+            except Exception as e:
+                events.problem(f"Ошибка при обработке {path}: {str(e)}", book=path)
+                results[path] = None
+            if on_result:
+                on_result(path, results[path])
+
+    if report_dir:
+        await aiofiles.os.makedirs(report_dir, exist_ok=True)
+    await asyncio.gather(producer(), *(worker() for _ in range(max_in_flight)))
+    return results
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Обработка EPUB файла")
+    parser.add_argument("epub_path", help="путь к EPUB файлу")
+    parser.add_argument("search_pattern", nargs="?", default=None, help="слово для поиска")
+    parser.add_argument("--stages", default=None,
+                        help="этапы через запятую, например metadata,text_analysis (по умолчанию - все)")
+    parser.add_argument("--library", default="./library", help="директория библиотеки")
+    parser.add_argument("--output", default=None, help="файл отчета (по умолчанию - <книга>.report.json)")
+    parser.add_argument("--trace", default=None, help="сохранить трассировку этапов в формате Chrome Trace Event")
+    parser.add_argument("--trace-memory", action="store_true", help="измерять пик памяти этапов (tracemalloc)")
+    parser.add_argument("--profile", choices=StageProfiler.modes, default=None,
+                        help="профилировать каждый этап: cprofile (детерминированно) или sampling (выборочно)")
+    parser.add_argument("--profile-dir", default="profiles", help="директория для .pstats и .collapsed файлов")
+    parser.add_argument("--memory-budget-mb", type=int, default=None,
+                        help="бюджет памяти: потоковый анализ текста и ограничение декодируемых изображений")
+    parser.add_argument("--io-workers", type=int, default=None, help="потоков в общем пуле ввода-вывода")
+    parser.add_argument("--cpu-workers", type=int, default=None, help="потоков в общем CPU пуле")
+    parser.add_argument("--metrics-textfile", default=None,
+                        help="файл метрик в формате Prometheus (*.prom) для textfile collector")
+    parser.add_argument("--verbose", action="store_true", help="выводить ход обработки по этапам и файлам")
+    args = parser.parse_args(argv)
+    events.subscribe(events.ConsoleRenderer(verbose=args.verbose))
+    collected = None
+    if args.metrics_textfile:
+        from metrics import ProcessingMetrics
+        collected = ProcessingMetrics().subscribe()
+    if args.io_workers or args.cpu_workers:
+        runtime.configure(args.io_workers, args.cpu_workers)
+
+    stages = args.stages.split(",") if args.stages else None
+    instrumentation = Instrumentation(args.trace_memory) if args.trace or args.trace_memory else None
+    profiler = None
+    if args.profile:
+        book_name = os.path.splitext(os.path.basename(args.epub_path))[0]
+        profiler = StageProfiler(args.profile, args.profile_dir, book_name)
     
     # Создаем процессор и запускаем обработку
-    processor = EpubProcessor(epub_path, search_pattern)
-    result = processor.process_parallel()
+    memory_budget = MemoryBudget(args.memory_budget_mb) if args.memory_budget_mb else None
+    processor = EpubProcessor(args.epub_path, args.search_pattern, args.library,
+                              instrumentation=instrumentation, profiler=profiler, memory_budget=memory_budget)
+    try:
+        processor.process_parallel(stages)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        if profiler is not None:
+            for path in profiler.close():
+                print(f"Профиль сохранен: {path}")
+    
+    for note in processor.result.degraded:
+        print(f"Бюджет памяти: {note}")
     
     # Сохраняем результаты
-    processor.save_results()
+    processor.save_results(args.output)
+    if args.trace:
+        instrumentation.save_chrome_trace(args.trace)
+    if collected is not None:
+        collected.registry.write_textfile(args.metrics_textfile)
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
 
 # See PyCharm help at https://www.jetbrains.com/help/pycharm/
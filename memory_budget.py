@@ -0,0 +1,86 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+# Байт на пиксель декодированного изображения (RGBA) - оценка сверху для всех режимов PIL
+BYTES_PER_PIXEL = 4
+
+def current_rss() -> int:
+    """Текущий RSS процесса в байтах (Linux); 0, если /proc недоступен"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def image_pixels(path: str) -> Tuple[int, int]:
+    """Размер изображения по заголовку файла, без декодирования пикселей"""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        return img.size
+
+class MemoryBudget:
+    """Бюджет памяти на обработку книги.
+
+    В этом режиме EpubProcessor анализирует текст потоково, не собирая его целиком,
+    а одновременно декодируемые изображения ограничены по суммарному числу пикселей.
+    Все случаи, когда бюджет заставил выбрать более медленный путь, записываются в degraded.
+    """
+
+    def __init__(self, limit_mb: int, image_share: float = 0.5):
+        self.limit_bytes = limit_mb * 1024 * 1024
+        # Часть бюджета под декодированные изображения; остальное - интерпретатор, текст, архивы
+        self.image_bytes = int(self.limit_bytes * image_share)
+        self.degraded: List[str] = []
+        self.peak_rss = 0
+        self._available = self.image_bytes
+        self._condition = threading.Condition()
+        self._lock = threading.Lock()
+
+    def note(self, stage: str, message: str):
+        """Записывает, что бюджет заставил этап выбрать более медленный путь"""
+        with self._lock:
+            entry = f"{stage}: {message}"
+            if entry not in self.degraded:
+                self.degraded.append(entry)
+
+    def image_cost(self, width: int, height: int) -> int:
+        # Исходное и преобразованное изображение живут одновременно
+        return width * height * BYTES_PER_PIXEL * 2
+
+    @contextmanager
+    def image_slot(self, width: Optional[int], height: Optional[int], label: str = "", stage: str = "extract_images"):
+        """Ждет, пока в бюджете изображений хватит места для декодирования width x height.
+
+        Изображение неизвестного размера (None) занимает весь бюджет изображений.
+        """
+        if width is None or height is None:
+            cost = self.image_bytes
+        else:
+            cost = self.image_cost(width, height)
+        if cost > self.image_bytes:
+            # Изображение больше всего бюджета: обрабатываем его в одиночку
+            self.note(stage, f"изображение {label} ({width}x{height}) больше бюджета, обработано без параллелизма")
+            cost = self.image_bytes
+        with self._condition:
+            if self._available < cost:
+                self.note(stage, "декодирование изображений ограничено бюджетом памяти")
+            self._condition.wait_for(lambda: self._available >= cost)
+            self._available -= cost
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._available += cost
+                self._condition.notify_all()
+            self.check_rss(stage)
+
+    def check_rss(self, stage: str):
+        """Запоминает пиковый RSS и отмечает превышение потолка"""
+        rss = current_rss()
+        with self._lock:
+            self.peak_rss = max(self.peak_rss, rss)
+        if rss > self.limit_bytes:
+            self.note(stage, f"RSS {rss // (1024 * 1024)} МБ превысил бюджет {self.limit_bytes // (1024 * 1024)} МБ")
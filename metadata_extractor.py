@@ -1,16 +1,9 @@
 import zipfile
 import xml.etree.ElementTree as ET
 from typing import Optional
-from dataclasses import dataclass
 
-@dataclass
-class EpubMetadata:
-    title: str = ""
-    author: str = ""
-    language: str = ""
-    publisher: str = ""
-    publication_date: str = ""
-    description: str = ""
+import events
+from results import EpubMetadata
 
 class MetadataExtractor:
     def __init__(self, epub_path: str):
@@ -31,7 +24,7 @@ class MetadataExtractor:
                 opf_path = root.find('.//container:rootfile', self.ns).get('full-path')
                 return opf_path
         except Exception as e:
-            print(f"Ошибка при получении пути к OPF файлу: {str(e)}")
+            events.problem(f"Ошибка при получении пути к OPF файлу: {str(e)}")
             return 'OEBPS/content.opf'  # Возвращаем путь по умолчанию
 
     def _get_metadata_root(self):
@@ -41,7 +34,7 @@ class MetadataExtractor:
                 content = epub.read(self.opf_path)
                 return ET.fromstring(content)
         except Exception as e:
-            print(f"Ошибка при чтении OPF файла: {str(e)}")
+            events.problem(f"Ошибка при чтении OPF файла: {str(e)}")
             return None
 
     def extract_title(self) -> str:
@@ -53,7 +46,7 @@ class MetadataExtractor:
             title = root.find('.//dc:title', self.ns)
             return title.text if title is not None else ""
         except Exception as e:
-            print(f"Ошибка при извлечении названия: {str(e)}")
+            events.problem(f"Ошибка при извлечении названия: {str(e)}")
             return ""
 
     def extract_author(self) -> str:
@@ -65,7 +58,7 @@ class MetadataExtractor:
             author = root.find('.//dc:creator', self.ns)
             return author.text if author is not None else ""
         except Exception as e:
-            print(f"Ошибка при извлечении автора: {str(e)}")
+            events.problem(f"Ошибка при извлечении автора: {str(e)}")
             return ""
 
     def extract_publisher(self) -> str:
@@ -77,7 +70,7 @@ class MetadataExtractor:
             publisher = root.find('.//dc:publisher', self.ns)
             return publisher.text if publisher is not None else ""
         except Exception as e:
-            print(f"Ошибка при извлечении издателя: {str(e)}")
+            events.problem(f"Ошибка при извлечении издателя: {str(e)}")
             return ""
 
     def extract_date(self) -> str:
@@ -89,7 +82,7 @@ class MetadataExtractor:
             date = root.find('.//dc:date', self.ns)
             return date.text if date is not None else ""
         except Exception as e:
-            print(f"Ошибка при извлечении даты: {str(e)}")
+            events.problem(f"Ошибка при извлечении даты: {str(e)}")
             return ""
 
     def extract_language(self) -> str:
@@ -101,7 +94,7 @@ class MetadataExtractor:
             language = root.find('.//dc:language', self.ns)
             return language.text if language is not None else ""
         except Exception as e:
-            print(f"Ошибка при извлечении языка: {str(e)}")
+            events.problem(f"Ошибка при извлечении языка: {str(e)}")
             return ""
 
     def extract_description(self) -> str:
@@ -113,7 +106,28 @@ class MetadataExtractor:
             description = root.find('.//dc:description', self.ns)
             return description.text if description is not None else ""
         except Exception as e:
-            print(f"Ошибка при извлечении описания: {str(e)}")
+            events.problem(f"Ошибка при извлечении описания: {str(e)}")
+            return ""
+
+    def _find_series(self, root) -> str:
+        # EPUB 2 (calibre): <meta name="calibre:series" content="...">,
+        # EPUB 3: <meta property="belongs-to-collection">...</meta>
+        for meta in root.iter(f"{{{self.ns['opf']}}}meta"):
+            if meta.get('name') == 'calibre:series' and meta.get('content'):
+                return meta.get('content')
+            if meta.get('property') == 'belongs-to-collection' and meta.text:
+                return meta.text.strip()
+        return ""
+
+    def extract_series(self) -> str:
+        """Извлекает серию, к которой относится книга"""
+        try:
+            root = self._get_metadata_root()
+            if root is None:
+                return ""
+            return self._find_series(root)
+        except Exception as e:
+            events.problem(f"Ошибка при извлечении серии: {str(e)}")
             return ""
 
     def extract_metadata(self) -> EpubMetadata:
@@ -138,8 +152,9 @@ class MetadataExtractor:
                 element = root.find(f'.//dc:{dc_field}', self.ns)
                 if element is not None:
                     metadata[our_field] = element.text
+            metadata['series'] = self._find_series(root)
             
             return EpubMetadata(**metadata)
         except Exception as e:
-            print(f"Ошибка при извлечении метаданных: {str(e)}")
+            events.problem(f"Ошибка при извлечении метаданных: {str(e)}")
             return EpubMetadata() 
\ No newline at end of file
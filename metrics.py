@@ -0,0 +1,296 @@
+import os
+import math
+import time
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import events
+
+# Границы корзин гистограмм длительности, секунды: от миллисекунд до минут
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelValues = Tuple[str, ...]
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Счетчик не может уменьшаться")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+    def snapshot(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, values: Dict[LabelValues, float]):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0.0) + value
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def merge(self, values: Dict[LabelValues, float]):
+        # Мгновенное значение: последнее полученное заменяет прежнее
+        with self._lock:
+            self._values.update(values)
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DURATION_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Число наблюдений по корзинам (последняя - больше всех границ), сумма
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return sum(state[0]) if state else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(state[0]), state[1])) for key, state in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                labels = _labels((*self.labelnames, 'le'), (*key, _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+    def snapshot(self) -> Dict[LabelValues, Tuple[List[int], float]]:
+        with self._lock:
+            return {key: (list(state[0]), state[1]) for key, state in self._values.items()}
+
+    def merge(self, values: Dict[LabelValues, Tuple[List[int], float]]):
+        with self._lock:
+            for key, (counts, total) in values.items():
+                state = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += total
+
+class MetricsRegistry:
+    """Набор метрик процесса с выводом в текстовом формате Prometheus.
+
+    snapshot() и merge() переносят значения между процессами: рабочие процессы
+    BatchRunner отдают накопленное родителю вместе с результатом книги.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Метрика {metric.name} уже зарегистрирована с другим типом или метками")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DURATION_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def on_collect(self, callback: Callable[[], None]):
+        """callback обновляет мгновенные значения (gauge) перед каждым выводом"""
+        self._collectors.append(callback)
+
+    def render(self) -> str:
+        for callback in self._collectors:
+            callback()
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            samples = metric.render()
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def write_textfile(self, path: str):
+        """Атомарно записывает метрики для textfile collector node_exporter (файл *.prom)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_file = f"{path}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(temp_file, path)
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            metrics = list(self._metrics.items())
+        return {name: metric.snapshot() for name, metric in metrics}
+
+    def merge(self, snapshot: Dict[str, object]):
+        """Добавляет значения snapshot() другого реестра с теми же метриками"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        for name, values in snapshot.items():
+            if name in metrics:
+                metrics[name].merge(values)
+
+    def reset(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+class ProcessingMetrics:
+    """Метрики обработки книг, собираемые из потока событий (events).
+
+    Подписывается на события процесса и считает книги, длительности и ошибки этапов,
+    распакованные байты, преобразованные изображения и попадания в кэши.
+    """
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or MetricsRegistry()
+        registry = self.registry
+        self.books = registry.counter("epub_books_processed_total", "Обработанные книги", ("status",))
+        self.book_duration = registry.histogram("epub_book_duration_seconds", "Время обработки книги")
+        self.stage_duration = registry.histogram("epub_stage_duration_seconds", "Время выполнения этапа", ("stage",))
+        self.stage_errors = registry.counter("epub_stage_errors_total", "Упавшие этапы", ("stage",))
+        self.items = registry.counter("epub_items_processed_total", "Обработанные документы и изображения", ("stage",))
+        self.bytes = registry.counter("epub_bytes_decompressed_total", "Распакованные из архива байты", ("stage",))
+        self.images = registry.counter("epub_images_transformed_total", "Преобразованные изображения",
+                                       ("transform", "status"))
+        self.cache = registry.counter("epub_cache_lookups_total", "Обращения к кэшам", ("cache", "result"))
+        self._unsubscribe: Optional[Callable[[], None]] = None
+
+    def __call__(self, event: events.Event):
+        if isinstance(event, events.StageFinished):
+            if event.status != "skipped":
+                self.stage_duration.observe(event.duration, stage=event.stage)
+            if event.status == "failed":
+                self.stage_errors.inc(stage=event.stage)
+        elif isinstance(event, events.ItemProcessed):
+            self.items.inc(stage=event.stage)
+            if event.size:
+                self.bytes.inc(event.size, stage=event.stage)
+        elif isinstance(event, events.ImageTransformed):
+            self.images.inc(transform=event.transform, status="ok" if event.error is None else "failed")
+        elif isinstance(event, events.CacheLookup):
+            self.cache.inc(cache=event.cache, result="hit" if event.hit else "miss")
+        elif isinstance(event, events.BookFinished):
+            self.books.inc(status=event.status)
+            self.book_duration.observe(event.duration)
+
+    def subscribe(self) -> 'ProcessingMetrics':
+        if self._unsubscribe is None:
+            self._unsubscribe = events.subscribe(self)
+        return self
+
+    def close(self):
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+    def __enter__(self):
+        return self.subscribe()
+
+    def __exit__(self, *exc):
+        self.close()
+
+class TextfileExporter:
+    """Периодически переписывает textfile с метриками реестра (не чаще interval секунд)"""
+
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float = 15.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def maybe_write(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last < self.interval:
+                return
+            self._last = now
+        self.write()
+
+    def write(self):
+        try:
+            self.registry.write_textfile(self.path)
+        except OSError as e:
+            events.problem(f"Ошибка при записи метрик в {self.path}: {str(e)}", level="warning")
@@ -0,0 +1,152 @@
+import struct
+import random
+import hashlib
+from zlib import crc32
+from typing import Dict, Iterable, List, Sequence
+
+# Хеши перестановок - multiply-shift: старшие 32 бита (a * x + b) mod 2^64, где x - 32-битный
+# хеш шингла. Переполнение uint64 в numpy дает тот же остаток, что маска в Python, а деления нет
+MASK32 = 0xFFFFFFFF
+MASK64 = (1 << 64) - 1
+# Множители для свертки хешей соседних слов в хеш шингла (по модулю 2^32)
+SHINGLE_MULTIPLIERS = (0x01000193, 0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F, 0x165667B1, 0xD3A2646C, 0xFD7046C5)
+# Сколько шинглов хешируется за раз: матрица блока занимает block * num_perm * 8 байт
+BLOCK_SIZE = 1024
+
+class MinHasher:
+    """Параметры MinHash: число перестановок, длина шингла в словах и seed.
+
+    Подписи сравнимы, только если посчитаны с одинаковыми параметрами; каталог
+    хранит подписи MinHasher по умолчанию.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        if not 1 <= shingle_size <= len(SHINGLE_MULTIPLIERS):
+            raise ValueError(f"Длина шингла должна быть от 1 до {len(SHINGLE_MULTIPLIERS)}")
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self.a = [rng.getrandbits(64) | 1 for _ in range(num_perm)]
+        self.b = [rng.getrandbits(64) for _ in range(num_perm)]
+        # numpy загружается при создании MinHasher, а не при импорте модуля: каталогу для
+        # поиска по готовым подписям он не нужен
+        try:
+            import numpy as np
+        except ImportError:  # Без numpy подпись считается в чистом Python: те же значения, но медленнее
+            np = None
+        self.np = np
+        if np is not None:
+            self._a = np.array(self.a, dtype=np.uint64)
+            self._b = np.array(self.b, dtype=np.uint64)
+
+    def new(self) -> 'MinHash':
+        return MinHash(self)
+
+    def signature(self, words: Iterable[str]) -> List[int]:
+        """Подпись текста, заданного последовательностью слов (пустой список для пустого текста)"""
+        minhash = self.new()
+        minhash.update(words)
+        return minhash.digest()
+
+class MinHash:
+    """Накапливает подпись по фрагментам текста (update можно вызывать по документам книги)"""
+
+    def __init__(self, hasher: MinHasher):
+        self.hasher = hasher
+        self._word_hashes: Dict[str, int] = {}
+        self._carry: List[int] = []  # Хеши последних shingle_size - 1 слов: шингл может начаться в прошлом фрагменте
+        self._shingles = 0
+        self._mins = None
+
+    def _hash_words(self, words: Iterable[str]) -> List[int]:
+        # Слова книги сильно повторяются: crc32 считается один раз на уникальное слово
+        words = words if isinstance(words, list) else list(words)
+        cache = self._word_hashes
+        cache.update({word: crc32(word.encode('utf-8')) for word in set(words).difference(cache)})
+        return list(map(cache.__getitem__, words))
+
+    def update(self, words: Iterable[str]):
+        hashes = self._carry + self._hash_words(words)
+        k = self.hasher.shingle_size
+        count = len(hashes) - k + 1
+        if count <= 0:
+            self._carry = hashes
+            return
+        self._carry = hashes[count:]
+        self._shingles += count
+        self._add_shingles(hashes, k, count)
+
+    def _add_shingles(self, hashes: List[int], k: int, count: int):
+        """Учитывает count шинглов из k слов, начинающихся с hashes[0], hashes[1], ..."""
+        np = self.hasher.np
+        if np is not None:
+            self._add_shingles_numpy(np.array(hashes, dtype=np.uint64), k, count)
+        else:
+            self._add_shingles_python(hashes, k, count)
+
+    def _add_shingles_numpy(self, hashes, k: int, count: int):
+        np = self.hasher.np
+        shingles = np.zeros(count, dtype=np.uint64)
+        for offset in range(k):
+            shingles += hashes[offset:offset + count] * np.uint64(SHINGLE_MULTIPLIERS[offset])
+        # Повторы шинглов не меняют минимумы; убирать их дороже, чем хешировать
+        shingles &= np.uint64(MASK32)
+        a, b = self.hasher._a, self.hasher._b
+        mins = self._mins if self._mins is not None else np.full(self.hasher.num_perm, MASK32, dtype=np.uint64)
+        values = np.empty((min(BLOCK_SIZE, count), len(a)), dtype=np.uint64)
+        for start in range(0, count, BLOCK_SIZE):
+            block = shingles[start:start + BLOCK_SIZE, None]
+            out = values[:len(block)]
+            np.multiply(block, a, out=out)
+            out += b
+            out >>= np.uint64(32)
+            np.minimum(mins, out.min(axis=0), out=mins)
+        self._mins = mins
+
+    def _add_shingles_python(self, hashes: List[int], k: int, count: int):
+        multipliers = SHINGLE_MULTIPLIERS[:k]
+        shingles = {sum(hashes[i + offset] * multipliers[offset] for offset in range(k)) & MASK32
+                    for i in range(count)}
+        mins = self._mins if self._mins is not None else [MASK32] * self.hasher.num_perm
+        for index, (a, b) in enumerate(zip(self.hasher.a, self.hasher.b)):
+            value = min([((a * x + b) & MASK64) >> 32 for x in shingles])
+            if value < mins[index]:
+                mins[index] = value
+        self._mins = mins
+
+    def digest(self) -> List[int]:
+        if not self._shingles and self._carry:
+            # Текст короче шингла считается одним шинглом из всех его слов
+            self._add_shingles(self._carry, len(self._carry), 1)
+            self._carry, self._shingles = [], 1
+        if self._mins is None:
+            return []
+        return [int(value) for value in self._mins]
+
+def jaccard(first: Sequence[int], second: Sequence[int]) -> float:
+    """Оценка сходства Жаккара по двум подписям (доля совпавших минимумов)"""
+    if not first or len(first) != len(second):
+        return 0.0
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+def pack_signature(signature: Sequence[int]) -> bytes:
+    """Подпись для хранения в каталоге: 32-битные little-endian числа"""
+    return struct.pack(f"<{len(signature)}I", *signature)
+
+def unpack_signature(data: bytes) -> List[int]:
+    return list(struct.unpack(f"<{len(data) // 4}I", data))
+
+def band_keys(signature: Sequence[int], bands: int) -> List[int]:
+    """Ключи LSH: подпись делится на bands полос, каждая сворачивается в 63-битное число.
+
+    Книги с совпавшей хотя бы одной полосой - кандидаты в дубликаты. При 16 полосах
+    по 8 строк вероятность стать кандидатами для сходства s равна 1 - (1 - s^8)^16:
+    около 0.95 для s = 0.8 и 0.06 для s = 0.5.
+    """
+    rows = len(signature) // bands
+    keys = []
+    for band in range(bands):
+        digest = hashlib.blake2b(pack_signature(signature[band * rows:(band + 1) * rows]), digest_size=8,
+                                 person=band.to_bytes(2, 'little')).digest()
+        keys.append(int.from_bytes(digest, 'little') >> 1)
+    return keys
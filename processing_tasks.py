@@ -1,10 +1,13 @@
 import os
 import zipfile
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from typing import Dict, Any
 import multiprocessing
 from dataclasses import dataclass, field
 
+import events
+from runtime import get_runtime
+
 # Импортируем необходимые классы и dataclasses
 # from main import TextExtractionResult, ChapterSplitResult, MetadataExtractor # Пример
 # from chapter_splitter import ChapterSplitter
@@ -19,29 +22,21 @@ def process_chapters_parallel(text_result: Any, chapter_splitter: Any) -> Dict[s
         chapters = chapter_splitter.split_text_into_chapters(text_result.text)
 
         if not chapters:
-            print("Не удалось разбить текст на главы")
+            events.problem("Не удалось разбить текст на главы", level="warning")
             return {}
 
-        # Используем минимум между количеством глав и доступными ядрами
-        max_workers = min(len(chapters), os.cpu_count() or 4)
-
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {
-                executor.submit(_process_single_chapter, chapter_text, chapter_num): chapter_num
-                for chapter_num, chapter_text in chapters.items()
-            }
+        calls = [partial(_process_single_chapter, chapter_text, chapter_num)
+                 for chapter_num, chapter_text in chapters.items()]
+        results = {}
+        for chapter_num, future in zip(chapters, get_runtime().cpu.run_all(calls)):
+            try:
+                results[chapter_num] = future.result()
+            except Exception as e:
+                events.problem(f"Ошибка при обработке главы {chapter_num}: {str(e)}")
 
-            results = {}
-            for future in as_completed(futures):
-                chapter_num = futures[future]
-                try:
-                    results[chapter_num] = future.result()
-                except Exception as e:
-                    print(f"Ошибка при обработке главы {chapter_num}: {str(e)}")
-
-            return results
+        return results
     except Exception as e:
-        print(f"Ошибка при параллельной обработке глав: {str(e)}")
+        events.problem(f"Ошибка при параллельной обработке глав: {str(e)}")
         return {}
 
 def _process_single_chapter(chapter_text: str, chapter_num: int) -> str:
@@ -51,7 +46,7 @@ def _process_single_chapter(chapter_text: str, chapter_num: int) -> str:
         # Например, форматирование, анализ и т.д.
         return chapter_text
     except Exception as e:
-        print(f"Ошибка при обработке главы {chapter_num}: {str(e)}")
+        events.problem(f"Ошибка при обработке главы {chapter_num}: {str(e)}")
         return ""
 
 def process_metadata_parallel(metadata_extractor: Any) -> Dict[str, Any]:
@@ -63,24 +58,20 @@ def process_metadata_parallel(metadata_extractor: Any) -> Dict[str, Any]:
             ('publisher', metadata_extractor.extract_publisher),
             ('date', metadata_extractor.extract_date),
             ('language', metadata_extractor.extract_language),
-            ('description', metadata_extractor.extract_description)
+            ('description', metadata_extractor.extract_description),
+            ('series', metadata_extractor.extract_series)
         ]
 
-        with ThreadPoolExecutor(max_workers=len(metadata_tasks)) as executor:
-            futures = {
-                executor.submit(task[1]): task[0]
-                for task in metadata_tasks
-            }
+        futures = get_runtime().io.run_all([task[1] for task in metadata_tasks])
 
-            results = {}
-            for future in as_completed(futures):
-                field = futures[future]
-                try:
-                    results[field] = future.result()
-                except Exception as e:
-                    print(f"Ошибка при извлечении {field}: {str(e)}")
+        results = {}
+        for (field, _), future in zip(metadata_tasks, futures):
+            try:
+                results[field] = future.result()
+            except Exception as e:
+                events.problem(f"Ошибка при извлечении {field}: {str(e)}")
 
-            return results
+        return results
     except Exception as e:
-        print(f"Ошибка при параллельной обработке метаданных: {str(e)}")
-        return {} 
\ No newline at end of file
+        events.problem(f"Ошибка при параллельной обработке метаданных: {str(e)}")
+        return {}
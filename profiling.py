@@ -0,0 +1,166 @@
+import os
+import sys
+import cProfile
+import pstats
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _pstats_label(func) -> str:
+    filename, line, name = func
+    return f"{name} ({os.path.basename(filename)}:{line})" if line else name
+
+def collapse_pstats(stats: pstats.Stats, max_depth: int = 64) -> Dict[str, int]:
+    """Восстанавливает свернутые стеки (микросекунды) по графу вызовов cProfile.
+
+    cProfile не хранит полные стеки, поэтому время функции делится между путями
+    пропорционально времени, проведенному в ней при вызове из каждого вызывающего.
+    """
+    raw = stats.stats
+    callees: Dict[tuple, Dict[tuple, float]] = {}
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, (_, _, _, caller_ct) in callers.items():
+            callees.setdefault(caller, {})[func] = caller_ct
+    roots = [func for func, entry in raw.items() if not entry[4]]
+    stacks: Counter = Counter()
+
+    def walk(func, path: List[str], time_on_path: float, on_path: set):
+        _, _, tt, ct, _ = raw[func]
+        share = time_on_path / ct if ct else 0.0
+        path = path + [_pstats_label(func)]
+        self_time = int(tt * share * 1e6)
+        if self_time:
+            stacks[';'.join(path)] += self_time
+        if len(path) >= max_depth:
+            return
+        for callee, edge_time in callees.get(func, {}).items():
+            if callee in on_path or callee not in raw:
+                continue
+            walk(callee, path, edge_time * share, on_path | {callee})
+
+    for root in roots:
+        walk(root, [], raw[root][3], {root})
+    return dict(stacks)
+
+def write_collapsed(stacks: Dict[str, int], path: str):
+    """Записывает свернутые стеки в формате flamegraph.pl / speedscope / inferno"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in sorted(stacks.items()):
+            f.write(f"{stack} {count}\n")
+
+def _call_profiled(profiler: 'StageProfiler', stage: str, func: Callable, args, kwargs):
+    # Граница стека для режима sampling: кадры выше этой функции не записываются
+    with profiler.profile(stage):
+        return func(*args, **kwargs)
+
+class StageProfiler:
+    """Профилирование каждого этапа EpubProcessor отдельно.
+
+    Режим cprofile - детерминированный профиль (.pstats и .collapsed на этап);
+    этапы при этом выполняются по одному, чтобы профили потоков не смешивались.
+    Режим sampling - фоновый поток раз в interval секунд снимает стеки потоков,
+    выполняющих этапы, и пишет .collapsed при close(). Файлы называются
+    <книга>.<этап>.<расширение>.
+    """
+
+    modes = ('cprofile', 'sampling')
+
+    def __init__(self, mode: str, output_dir: str = "profiles", book_name: str = "book", interval: float = 0.005):
+        if mode not in self.modes:
+            raise ValueError(f"Неизвестный режим профилирования {mode}; доступны: {', '.join(self.modes)}")
+        self.mode = mode
+        self.output_dir = output_dir
+        self.book_name = book_name
+        self.interval = interval
+        self.files: List[str] = []
+        self._lock = threading.Lock()
+        self._cprofile_lock = threading.Lock()
+        self._active: Dict[int, str] = {}  # id потока -> этап, который он выполняет
+        self._samples: Dict[str, Counter] = {}
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _path(self, stage: str, extension: str) -> str:
+        return os.path.join(self.output_dir, f"{self.book_name}.{stage}.{extension}")
+
+    def wrap(self, stage: str, func: Callable) -> Callable:
+        """Возвращает функцию этапа, выполняемую под профилировщиком"""
+        def run(*args, **kwargs):
+            return _call_profiled(self, stage, func, args, kwargs)
+        run.__name__ = getattr(func, '__name__', stage)
+        return run
+
+    @contextmanager
+    def profile(self, stage: str):
+        if self.mode == 'cprofile':
+            with self._cprofile_lock:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    yield
+                finally:
+                    profiler.disable()
+                    self._write_cprofile(stage, profiler)
+            return
+
+        self._start_sampler()
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._active[thread_id] = stage
+            self._samples.setdefault(stage, Counter())
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active.pop(thread_id, None)
+
+    def _write_cprofile(self, stage: str, profiler: cProfile.Profile):
+        stats_path = self._path(stage, "pstats")
+        profiler.dump_stats(stats_path)
+        collapsed_path = self._path(stage, "collapsed")
+        write_collapsed(collapse_pstats(pstats.Stats(profiler)), collapsed_path)
+        with self._lock:
+            self.files += [stats_path, collapsed_path]
+
+    def _start_sampler(self):
+        with self._lock:
+            if self._sampler is not None:
+                return
+            self._sampler = threading.Thread(target=self._sample_loop, name="stage-sampler", daemon=True)
+            self._sampler.start()
+
+    def _sample_loop(self):
+        # Кадры выше обертки этапа (пул потоков, планировщик) в стек не попадают
+        boundary = _call_profiled.__code__
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                active = dict(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, stage in active.items():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None and frame.f_code is not boundary:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    with self._lock:
+                        self._samples[stage][';'.join(reversed(stack))] += 1
+
+    def close(self) -> List[str]:
+        """Останавливает сбор и записывает оставшиеся файлы; возвращает список всех файлов"""
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+            for stage, samples in self._samples.items():
+                path = self._path(stage, "collapsed")
+                write_collapsed(dict(samples), path)
+                self.files.append(path)
+        return self.files
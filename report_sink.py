@@ -0,0 +1,247 @@
+import os
+import sys
+import gzip
+import json
+import math
+import zlib
+import argparse
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+def select_fields(report: Dict[str, Any], fields: Optional[Iterable[str]]) -> Dict[str, Any]:
+    """Оставляет в отчете только перечисленные поля; вложенные задаются через точку (metadata.title).
+
+    Путь к книге сохраняется всегда, иначе строку отчета нельзя сопоставить с книгой.
+    """
+    if not fields:
+        return report
+    selected: Dict[str, Any] = {}
+    for path in ['epub_path', *fields]:
+        source, target = report, selected
+        parts = path.split('.')
+        for part in parts[:-1]:
+            source = source.get(part) if isinstance(source, dict) else None
+            if not isinstance(source, dict):
+                break
+            target = target.setdefault(part, {})
+        else:
+            if isinstance(source, dict) and parts[-1] in source:
+                target[parts[-1]] = source[parts[-1]]
+    return selected
+
+def _open_text(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+class ReportSink:
+    """Потоковая запись отчетов: одна компактная JSON строка на книгу (NDJSON).
+
+    Файл открывается на дозапись, поэтому повторный запуск продолжает его; для .gz
+    каждая сессия записи добавляет новый gzip-член, что читается как один поток.
+    Запись потокобезопасна; в памяти не остается ничего, кроме текущей строки.
+    """
+
+    def __init__(self, path: str, fields: Optional[List[str]] = None, flush_every: Optional[int] = None):
+        self.path = path
+        self.fields = fields
+        # Сброс после каждой строки ухудшает сжатие, поэтому gzip сбрасывается реже
+        self.flush_every = flush_every or (64 if path.endswith('.gz') else 1)
+        self.written = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = _open_text(path, 'a')
+
+    def write(self, report: Dict[str, Any]):
+        line = json.dumps(select_fields(report, self.fields), ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + "\n")
+            self.written += 1
+            if self.written % self.flush_every == 0:
+                self._file.flush()
+
+    def flush(self):
+        """Сбрасывает записанные строки на диск (для .gz - до границы строки, читаемой после сбоя)"""
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _gzip_lines(path: str, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+    """Строки .gz файла из нескольких gzip-членов; чтение останавливается на месте повреждения.
+
+    gzip.open теряет весь прочитанный блок, если в нем встретился мусор (например, хвост
+    записи, оборванной сбоем), поэтому блок с ошибкой повторно распаковывается по байту
+    из копии состояния - так сохраняются все строки до повреждения.
+    """
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    pending = b""
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            output, broken = [], False
+            while data:
+                backup = decompressor.copy()
+                try:
+                    output.append(decompressor.decompress(data))
+                except zlib.error:
+                    for index in range(len(data)):
+                        try:
+                            output.append(backup.decompress(data[index:index + 1]))
+                        except zlib.error:
+                            break
+                    broken = True
+                    break
+                if not decompressor.eof:
+                    break
+                # Член закончился: следующий член этого же файла (новая сессия записи)
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            lines = (pending + b"".join(output)).split(b"\n")
+            pending = lines.pop()
+            yield from lines
+            if broken:
+                return
+    yield pending
+
+def iter_reports(path: str) -> Iterator[Dict[str, Any]]:
+    """Читает отчеты из NDJSON (в том числе .gz) по одному; оборванная последняя строка пропускается"""
+    if path.endswith('.gz'):
+        lines: Iterable[Any] = _gzip_lines(path)
+    else:
+        lines = open(path, 'r', encoding='utf-8')
+    try:
+        for line in lines:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    finally:
+        lines.close()
+
+@dataclass
+class FieldStats:
+    count: int = 0
+    total: float = 0.0
+    mean: float = 0.0
+    min: Optional[float] = None
+    max: Optional[float] = None
+    _m2: float = 0.0  # Сумма квадратов отклонений (алгоритм Уэлфорда)
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+@dataclass
+class CorpusSummary:
+    books: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    numeric: Dict[str, FieldStats] = field(default_factory=dict)  # поле через точку -> статистика
+    categories: Dict[str, Dict[str, int]] = field(default_factory=dict)  # поле -> значение -> число книг
+
+class ReportAggregator:
+    """Статистика по корпусу, накапливаемая по одному отчету.
+
+    Для каждого числового поля (через точку: text_analysis.word_count) хранится только
+    количество, сумма, среднее, дисперсия, минимум и максимум, поэтому память не растет
+    с числом книг. Значения categories (например, язык) подсчитываются по частоте.
+    """
+
+    def __init__(self, categories: Iterable[str] = ('metadata.language',)):
+        self.categories = set(categories)
+        self.summary = CorpusSummary()
+
+    def add(self, report: Dict[str, Any]):
+        summary = self.summary
+        summary.books += 1
+        if report.get('ok', True):
+            summary.succeeded += 1
+        else:
+            summary.failed += 1
+        self._walk(report, "")
+
+    def _walk(self, value: Any, path: str):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                self._walk(item, f"{path}.{key}" if path else key)
+        elif path in self.categories:
+            if value is not None:
+                counts = self.summary.categories.setdefault(path, {})
+                counts[str(value)] = counts.get(str(value), 0) + 1
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.summary.numeric.setdefault(path, FieldStats()).add(value)
+
+    def add_all(self, reports: Iterable[Dict[str, Any]]) -> CorpusSummary:
+        for report in reports:
+            self.add(report)
+        return self.summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        summary = self.summary
+        return {
+            'books': summary.books,
+            'succeeded': summary.succeeded,
+            'failed': summary.failed,
+            'numeric': {
+                name: {'count': stats.count, 'total': stats.total, 'mean': stats.mean, 'stddev': stats.stddev,
+                       'min': stats.min, 'max': stats.max}
+                for name, stats in sorted(summary.numeric.items())
+            },
+            'categories': {name: dict(Counter(counts).most_common()) for name, counts in summary.categories.items()},
+        }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Сводная статистика по NDJSON отчетам пакетной обработки")
+    parser.add_argument("reports", nargs="+", help="файлы NDJSON (.ndjson или .ndjson.gz)")
+    parser.add_argument("--fields", default=None, help="выводить только эти числовые поля (через запятую)")
+    parser.add_argument("--categories", default="metadata.language", help="поля для подсчета значений (через запятую)")
+    parser.add_argument("--json", default=None, help="сохранить сводку в JSON")
+    args = parser.parse_args(argv)
+
+    aggregator = ReportAggregator(args.categories.split(",") if args.categories else ())
+    for path in args.reports:
+        aggregator.add_all(iter_reports(path))
+    data = aggregator.to_dict()
+
+    wanted = set(args.fields.split(",")) if args.fields else None
+    print(f"Книг: {data['books']}, успешно: {data['succeeded']}, с ошибками: {data['failed']}")
+    for name, stats in data['numeric'].items():
+        if wanted is None or name in wanted:
+            print(f"{name:<45} n={stats['count']:<7} сумма={stats['total']:<14.6g} среднее={stats['mean']:<12.6g} "
+                  f"мин={stats['min']:<10.6g} макс={stats['max']:.6g}")
+    for name, counts in data['categories'].items():
+        top = ", ".join(f"{value}: {count}" for value, count in list(counts.items())[:10])
+        print(f"{name}: {top}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
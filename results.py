@@ -0,0 +1,215 @@
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, get_type_hints
+
+# Единственное определение результатов этапов. Модули этапов и main импортируют типы отсюда,
+# поэтому TextAnalysisResult из text_analyzer и из main - один и тот же класс.
+#
+# Все типы - dataclass(slots=True): у экземпляров нет __dict__, что заметно уменьшает память
+# при хранении результатов сотен тысяч книг (см. bench_results.py). Обратная сторона - в
+# экземпляр нельзя дописать атрибут, которого нет среди полей: новое значение добавляется полем.
+
+# Тип -> {поле: вложенный тип Record} для from_dict; заполняется при первом обращении
+_NESTED: Dict[type, Dict[str, type]] = {}
+
+class Record:
+    """Основа результатов: быстрые to_dict/from_dict без рекурсивного копирования asdict"""
+    __slots__ = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: _plain(getattr(self, name)) for name in self.__dataclass_fields__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
+        """Создает результат из to_dict(); неизвестные ключи пропускаются"""
+        nested = _nested_types(cls)
+        values = {}
+        for name in cls.__dataclass_fields__:
+            if name not in data:
+                continue
+            value = data[name]
+            record_type = nested.get(name)
+            if record_type is array:
+                if not isinstance(value, array):
+                    value = array(cls.__dataclass_fields__[name].default_factory().typecode, value)
+            elif record_type is not None and value is not None:
+                if isinstance(value, list):
+                    value = [item if isinstance(item, record_type) else record_type.from_dict(item) for item in value]
+                elif not isinstance(value, record_type):
+                    value = record_type.from_dict(value)
+            values[name] = value
+        return cls(**values)
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, array):
+        return value.tolist()
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    return value
+
+def _nested_types(cls: type) -> Dict[str, type]:
+    nested = _NESTED.get(cls)
+    if nested is None:
+        nested = {}
+        for name, hint in get_type_hints(cls).items():
+            # Массив array восстанавливается из списка с typecode значения по умолчанию
+            if hint is array:
+                nested[name] = array
+                continue
+            # Поле вида X, Optional[X] или List[X], где X - Record
+            for candidate in (hint, *getattr(hint, '__args__', ())):
+                if isinstance(candidate, type) and issubclass(candidate, Record):
+                    nested[name] = candidate
+        _NESTED[cls] = nested
+    return nested
+
+@dataclass(slots=True)
+class EpubMetadata(Record):
+    title: str = ""
+    author: str = ""
+    language: str = ""
+    publisher: str = ""
+    publication_date: str = ""
+    description: str = ""
+    series: str = ""
+
+@dataclass(slots=True)
+class TextExtractionResult(Record):
+    text: str = ""
+    encoding: str = "utf-8"
+    document_starts: List[int] = field(default_factory=list)  # Смещения документов (глав) в text
+
+def counts() -> array:
+    """Пустой массив 32-битных счетчиков: гистограммы хранятся компактно, а не списками int"""
+    return array('I')
+
+@dataclass(slots=True)
+class TextStatistics(Record):
+    """Распределения длин и индексы удобочитаемости главы или всей книги (см. text_statistics.py)"""
+    words: int = 0
+    sentences: int = 0  # Предложения, в которых есть хотя бы одно слово
+    letters: int = 0  # Символов в словах
+    syllables: int = 0
+    cyrillic_syllables: int = 0  # Слоги в кириллических словах: по их доле выбираются коэффициенты индексов
+    word_lengths: array = field(default_factory=counts)  # [i] - слов из i символов; последний бин - длиннее
+    sentence_lengths: array = field(default_factory=counts)  # [i] - предложений из i слов; последний - длиннее
+    word_length_percentiles: array = field(default_factory=counts)  # Процентили PERCENTILES длины слова
+    sentence_length_percentiles: array = field(default_factory=counts)
+    mean_word_length: float = 0.0
+    mean_sentence_length: float = 0.0
+    language: str = ""  # Коэффициенты индексов: "ru" или "en"
+    flesch_reading_ease: float = 0.0
+    flesch_kincaid_grade: float = 0.0
+    automated_readability_index: float = 0.0
+
+@dataclass(slots=True)
+class TextAnalysisResult(Record):
+    word_count: int = 0
+    char_count: int = 0
+    sentence_count: int = 0
+    paragraph_count: int = 0
+    word_frequency: Dict[str, int] = field(default_factory=dict)
+    search_word_frequency: int = 0
+    minhash: List[int] = field(default_factory=list)  # Подпись MinHash по шинглам из слов (см. minhash.py)
+    vocabulary: int = 0  # Оценка числа различных слов (HyperLogLog)
+    vocabulary_sketch: str = ""  # base64 от HyperLogLog.to_bytes(compress=True) - для объединения словарей в каталоге
+    statistics: Optional[TextStatistics] = None  # Вся книга
+    chapter_statistics: List[TextStatistics] = field(default_factory=list)  # По документам книги
+
+@dataclass(slots=True)
+class HeavyHitter(Record):
+    item: str = ""  # Слово или n-грамма (слова через пробел)
+    count: int = 0  # Оценка числа вхождений сверху
+    lower: int = 0  # Гарантированная оценка снизу
+
+@dataclass(slots=True)
+class NgramResult(Record):
+    total_words: int = 0
+    words: List[HeavyHitter] = field(default_factory=list)
+    bigrams: List[HeavyHitter] = field(default_factory=list)
+    trigrams: List[HeavyHitter] = field(default_factory=list)
+    error_bound: int = 0  # Максимальное превышение оценки count-min sketch (с вероятностью 1 - e^-depth)
+    memory_bytes: int = 0  # Объем структур, в которых считалась статистика
+
+@dataclass(slots=True)
+class ImageExtractionResult(Record):
+    count: int = 0
+    output_dir: str = ""
+    extracted_image_paths: List[str] = field(default_factory=list)
+    # Путь к оригиналу -> путь к преобразованному изображению
+    pixelated_image_paths: Dict[str, str] = field(default_factory=dict)
+    contrasted_image_paths: Dict[str, str] = field(default_factory=dict)
+    mirrored_image_paths: Dict[str, str] = field(default_factory=dict)
+    grayscale_image_paths: Dict[str, str] = field(default_factory=dict)
+
+@dataclass(slots=True)
+class KeywordSearchResult(Record):
+    match_count: int = 0
+    matches: List[str] = field(default_factory=list)
+
+@dataclass(slots=True)
+class TocEntry(Record):
+    title: str = ""
+    href: str = ""
+    level: int = 1
+    children: List['TocEntry'] = field(default_factory=list)
+    num_children: int = 0
+
+@dataclass(slots=True)
+class TocResult(Record):
+    chapters: List[Dict[str, str]] = field(default_factory=list)  # Главы из NCX: заголовок и путь
+    total_chapters: int = 0
+    entries: List[TocEntry] = field(default_factory=list)  # Дерево оглавления (TocGenerator.generate)
+    count: int = 0  # Число записей в дереве вместе с вложенными
+
+@dataclass(slots=True)
+class FormattingResult(Record):
+    bold_headers: Dict[str, str] = field(default_factory=dict)  # Словарь: оригинальный текст -> текст с жирным шрифтом
+    uppercase_headers: Dict[str, str] = field(default_factory=dict)  # Словарь: оригинальный текст -> текст в верхнем регистре
+    formatted_text: str = ""  # Итоговый отформатированный текст
+    formatted_headers_count: int = 0  # Количество отформатированных заголовков
+    _all_headers: Dict[str, str] = field(default_factory=dict)  # Хранит все найденные заголовки
+
+    def add_header(self, text: str):
+        """Добавляет заголовок в словари, ограничивая их размер до 10 элементов"""
+        if text not in self._all_headers:
+            self._all_headers[text] = text
+            if len(self.bold_headers) < 10:
+                self.bold_headers[text] = f'<span style="font-weight: bold;">{text}</span>'
+                self.uppercase_headers[text] = text.upper()
+
+@dataclass(slots=True)
+class ChapterSplitResult(Record):
+    chapters: Dict[str, str] = field(default_factory=dict)  # Словарь: название главы -> путь к файлу
+    total_chapters: int = 0  # Общее количество глав
+    output_zip: str = ""  # Путь к итоговому ZIP архиву
+
+@dataclass(slots=True)
+class StyleProcessingResult(Record):
+    processed_styles: Dict[str, str] = field(default_factory=dict)  # путь к файлу -> обработанный CSS
+    total_styles: int = 0
+    optimized_size: int = 0  # размер после оптимизации в байтах
+    original_size: int = 0   # исходный размер в байтах
+
+@dataclass(slots=True)
+class ProcessingResult(Record):
+    metadata: Optional[EpubMetadata] = None
+    text_analysis: Optional[TextAnalysisResult] = None
+    image_extraction: Optional[ImageExtractionResult] = None
+    keyword_search: Optional[KeywordSearchResult] = None
+    text_formatting: Optional[FormattingResult] = None
+    toc: Optional[TocResult] = None
+    chapters: Optional[ChapterSplitResult] = None
+    style_processing: Optional[StyleProcessingResult] = None
+    ngrams: Optional[NgramResult] = None
+    library_save_path: Optional[str] = None
+    fingerprint: Optional[str] = None  # SHA-256 содержимого книги в библиотеке
+    execution_times: Dict[str, float] = field(default_factory=dict)
+    thread_statuses: Dict[str, str] = field(default_factory=dict)
+    critical_path: List[str] = field(default_factory=list)  # Этапы, определившие общее время обработки
+    degraded: List[str] = field(default_factory=list)  # Где бюджет памяти заставил выбрать более медленный путь
+    translated_first_chapter: Optional[str] = None  # Заполняется translation.translate_first_chapter
@@ -0,0 +1,168 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from stage_scheduler import Resource
+
+@dataclass
+class PoolStats:
+    name: str
+    workers: int
+    submitted: int = 0
+    completed: int = 0
+    queued: int = 0  # Задачи, ожидающие свободного потока
+    running: int = 0
+    max_queued: int = 0
+    caller_runs: int = 0  # Задачи run_all, выполненные вызывающим потоком
+    busy_time: float = 0.0  # Суммарное время выполнения задач
+    saturation: float = 0.0  # busy_time / (workers * время жизни пула): 1.0 - все потоки заняты всегда
+
+class BudgetedExecutor(Executor):
+    """Пул потоков с фиксированным бюджетом, общий для всех этапов и книг процесса.
+
+    Считает глубину очереди, число выполняющихся задач и загрузку потоков.
+    """
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"runtime-{name}")
+        self._lock = threading.Lock()
+        self._stats = PoolStats(name=name, workers=workers)
+        self._created = time.perf_counter()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            stats = self._stats
+            stats.submitted += 1
+            stats.queued += 1
+            stats.max_queued = max(stats.max_queued, stats.queued)
+        return self._pool.submit(self._run, fn, args, kwargs)
+
+    def _run(self, fn: Callable, args, kwargs):
+        with self._lock:
+            self._stats.queued -= 1
+            self._stats.running += 1
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._stats.running -= 1
+                self._stats.completed += 1
+                self._stats.busy_time += time.perf_counter() - started
+
+    def run_all(self, calls: List[Callable[[], Any]]) -> List[Future]:
+        """Выполняет вызовы в пуле и ждет их завершения; возвращает завершенные Future в порядке calls.
+
+        Вызывающий поток не простаивает, а сам забирает еще не начатые вызовы. Поэтому
+        вложенный run_all из задачи этого же пула не может зависнуть, даже если все
+        потоки пула заняты такими же ожидающими задачами.
+        """
+        futures = [Future() for _ in calls]
+        pending = deque(zip(calls, futures))
+        # В статистике считаются сами вызовы, а не вспомогательные задачи _drain
+        with self._lock:
+            stats = self._stats
+            stats.submitted += len(calls)
+            stats.queued += len(calls)
+            stats.max_queued = max(stats.max_queued, stats.queued)
+
+        def run_next(caller: bool = False) -> bool:
+            try:
+                call, future = pending.popleft()
+            except IndexError:
+                return False
+            if not future.set_running_or_notify_cancel():
+                with self._lock:
+                    self._stats.queued -= 1
+                return True
+            if caller:
+                with self._lock:
+                    self._stats.caller_runs += 1
+            try:
+                future.set_result(self._run(call, (), {}))
+            except BaseException as e:
+                future.set_exception(e)
+            return True
+
+        helpers = [self._pool.submit(self._drain, run_next) for _ in range(min(len(calls), self.workers))]
+        while run_next(caller=True):
+            pass
+        for future in futures:
+            future.exception()  # Ждем вызовы, которые еще выполняются в пуле
+        for helper in helpers:
+            helper.cancel()  # Не начавшимся помощникам уже нечего забирать
+        return futures
+
+    @staticmethod
+    def _drain(run_next: Callable[[], bool]):
+        while run_next():
+            pass
+
+    def stats(self) -> PoolStats:
+        with self._lock:
+            snapshot = PoolStats(**vars(self._stats))
+        elapsed = time.perf_counter() - self._created
+        snapshot.saturation = snapshot.busy_time / (snapshot.workers * elapsed) if elapsed > 0 else 0.0
+        return snapshot
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+class Runtime:
+    """Общие пулы процесса: ввод-вывод и процессорная работа с раздельными бюджетами.
+
+    Этапы всех книг, их вложенные подзадачи (преобразования изображений, главы,
+    поля метаданных) и асинхронный режим используют эти пулы вместо собственных,
+    поэтому число потоков не растет с числом одновременно обрабатываемых книг.
+    """
+
+    def __init__(self, io_workers: Optional[int] = None, cpu_workers: Optional[int] = None):
+        cpu_count = os.cpu_count() or 4
+        self.io = BudgetedExecutor("io", io_workers or max(8, 2 * cpu_count))
+        self.cpu = BudgetedExecutor("cpu", cpu_workers or cpu_count)
+
+    def executors(self) -> Dict[str, Executor]:
+        """Пулы для StageScheduler по классам ресурсов"""
+        return {Resource.IO: self.io, Resource.CPU: self.cpu, Resource.CPU_HEAVY: self.cpu}
+
+    def stats(self) -> Dict[str, PoolStats]:
+        return {pool.name: pool.stats() for pool in (self.io, self.cpu)}
+
+    def shutdown(self, wait: bool = True):
+        self.io.shutdown(wait)
+        self.cpu.shutdown(wait)
+
+_runtime: Optional[Runtime] = None
+_runtime_lock = threading.Lock()
+
+def get_runtime() -> Runtime:
+    """Общий Runtime процесса; создается при первом обращении"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = Runtime()
+        return _runtime
+
+def _forget_runtime():
+    # Потоки пулов не переживают fork: дочерний процесс (BatchRunner) создаст свой Runtime
+    global _runtime, _runtime_lock
+    _runtime = None
+    _runtime_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_runtime)
+
+def configure(io_workers: Optional[int] = None, cpu_workers: Optional[int] = None) -> Runtime:
+    """Задает бюджеты общего Runtime; прежние пулы завершаются после выполнения своих задач"""
+    global _runtime
+    with _runtime_lock:
+        previous, _runtime = _runtime, Runtime(io_workers, cpu_workers)
+    if previous is not None:
+        previous.shutdown(wait=False)
+    return _runtime
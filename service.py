@@ -0,0 +1,382 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+import threading
+import socketserver
+from dataclasses import dataclass, asdict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import events
+from metrics import ProcessingMetrics
+from runtime import get_runtime
+
+class ServiceOverloaded(Exception):
+    """Все слоты и места в очереди заняты: задание не принято"""
+
+class JobError(Exception):
+    """Задание некорректно (нет книги, неизвестный этап); status - HTTP код ответа"""
+
+    def __init__(self, message: str, status: int = HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+@dataclass
+class ServiceStats:
+    started_at: float = 0.0
+    accepted: int = 0
+    completed: int = 0
+    failed: int = 0  # Задания, в которых упал хотя бы один этап или вся обработка
+    rejected: int = 0  # Отказы из-за перегрузки (503)
+    active: int = 0
+    waiting: int = 0  # Принятые задания, ожидающие свободного слота
+    busy_time: float = 0.0  # Суммарное время обработки заданий
+
+    @property
+    def uptime(self) -> float:
+        return time.time() - self.started_at
+
+def warm_up(sample: bool = False):
+    """Загружает тяжелые модули и создает общие пулы до первого задания.
+
+    При sample через все этапы прогоняется маленькая синтетическая книга, чтобы
+    первое настоящее задание не платило за ленивую инициализацию внутри этапов.
+    """
+    # main импортирует тяжелые зависимости лениво, поэтому загружаем их здесь явно
+    import main  # noqa: F401
+    import PIL.Image  # noqa: F401
+    import bs4  # noqa: F401
+    try:
+        import lxml.etree  # noqa: F401
+    except ImportError:
+        pass
+    get_runtime()
+    if sample:
+        from epub_synth import SynthSpec, generate_epub
+        from main import EpubProcessor
+
+        workdir = tempfile.mkdtemp(prefix="service-warmup-")
+        try:
+            book = generate_epub(os.path.join(workdir, "warmup.epub"), SynthSpec(chapters=2, words_per_chapter=50, images=1))
+            EpubProcessor(book, None, os.path.join(workdir, "library"), os.path.join(workdir, "output")).process_parallel()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def upload_name(name: Optional[str]) -> str:
+    """Имя присланной книги без пути и непечатаемых символов: под ним книга попадает в библиотеку и каталог"""
+    name = os.path.basename((name or "").replace("\\", "/")).strip().lstrip(".")
+    return "".join(char for char in name if char.isprintable()) or "upload.epub"
+
+def process_job(path: str, stages: Optional[List[str]], search_pattern: Optional[str], library_dir: str,
+                output_dir: Optional[str]) -> Dict[str, Any]:
+    """Обрабатывает книгу через EpubProcessor и возвращает отчет с ошибками этапов"""
+    from main import EpubProcessor
+
+    processor = EpubProcessor(path, search_pattern, library_dir, output_dir)
+    try:
+        result = processor.process_parallel(stages)
+    except ValueError as e:
+        # Неизвестный этап в списке
+        raise JobError(str(e))
+    errors = {name: status for name, status in result.thread_statuses.items() if status.startswith("Ошибка")}
+    return {'ok': not errors, 'errors': errors, 'report': processor.build_report()}
+
+class JobService:
+    """Прием заданий на обработку книг в одном долгоживущем процессе.
+
+    Модули, общие пулы потоков и библиотека загружаются один раз, а не для каждой
+    книги. Одновременно выполняется не более max_concurrent заданий, еще max_queued
+    ждут свободного слота; остальные сразу отклоняются (ServiceOverloaded), чтобы
+    вызывающая сторона повторила запрос позже, а не копила соединения.
+
+    Метрики заданий, общих пулов и (если metrics подписан на события) обработки
+    книг доступны в формате Prometheus через metrics.registry.
+    """
+
+    def __init__(self, library_dir: str = "./library", output_root: Optional[str] = "./service_output",
+                 max_concurrent: int = 2, max_queued: int = 8, queue_timeout: Optional[float] = None,
+                 upload_dir: Optional[str] = None, metrics: Optional[ProcessingMetrics] = None,
+                 handler: Callable[..., Dict[str, Any]] = process_job):
+        self.library_dir = library_dir
+        self.output_root = output_root
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.upload_dir = upload_dir or tempfile.gettempdir()
+        self.handler = handler
+        self.stats = ServiceStats(started_at=time.time())
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(max_concurrent)
+        self.metrics = metrics or ProcessingMetrics()
+        registry = self.metrics.registry
+        self._jobs = registry.counter("epub_service_jobs_total", "Задания сервиса", ("result",))
+        self._job_duration = registry.histogram("epub_service_job_duration_seconds", "Время выполнения задания")
+        self._gauges = {
+            name: registry.gauge(f"epub_service_{name}_jobs", description)
+            for name, description in (('active', "Задания в обработке"), ('waiting', "Задания в ожидании слота"))
+        }
+        self._pool_gauges = {
+            name: registry.gauge(f"epub_pool_{name}", description, ("pool",))
+            for name, description in (('workers', "Потоков в общем пуле"), ('queued', "Задач в очереди пула"),
+                                      ('running', "Выполняющихся задач пула"),
+                                      ('saturation', "Доля времени, когда потоки пула заняты"))
+        }
+        registry.on_collect(self._collect)
+
+    def _collect(self):
+        with self._lock:
+            self._gauges['active'].set(self.stats.active)
+            self._gauges['waiting'].set(self.stats.waiting)
+        for name, pool in get_runtime().stats().items():
+            for field_name, gauge in self._pool_gauges.items():
+                gauge.set(getattr(pool, field_name), pool=name)
+
+    def admit(self) -> str:
+        """Резервирует место для задания (или бросает ServiceOverloaded) еще до чтения тела запроса"""
+        with self._lock:
+            if self.stats.active + self.stats.waiting >= self.max_concurrent + self.max_queued:
+                self.stats.rejected += 1
+                self._jobs.inc(result="rejected")
+                raise ServiceOverloaded(f"Заданий в работе: {self.stats.active}, в очереди: {self.stats.waiting}")
+            self.stats.accepted += 1
+            self.stats.waiting += 1
+        # Номер из счетчика повторяется после перезапуска сервиса и перезаписал бы каталог прежнего задания
+        return uuid.uuid4().hex
+
+    def release(self, job_id: str):
+        """Освобождает место задания, которое так и не было запущено"""
+        with self._lock:
+            self.stats.waiting -= 1
+
+    def run(self, path: str, stages: Optional[List[str]] = None, search_pattern: Optional[str] = None,
+            keep_output: bool = False, job_id: Optional[str] = None) -> Dict[str, Any]:
+        """Выполняет задание в вызывающем потоке; бросает ServiceOverloaded или JobError.
+
+        Изображения и главы задания пишутся в output_root/job-<id> и удаляются после
+        построения ответа, если не задан keep_output (тогда каталог есть в ответе).
+        job_id - место, заранее зарезервированное admit; run освобождает его в любом случае.
+        """
+        if not os.path.isfile(path):
+            if job_id is not None:
+                self.release(job_id)
+            raise JobError(f"Файл не найден: {path}", HTTPStatus.NOT_FOUND)
+        job_id = job_id or self.admit()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.stats.waiting -= 1
+                self.stats.rejected += 1
+            self._jobs.inc(result="rejected")
+            raise ServiceOverloaded("Истекло время ожидания свободного слота")
+        with self._lock:
+            self.stats.waiting -= 1
+            self.stats.active += 1
+        start = time.perf_counter()
+        ok = False
+        output_dir = os.path.join(self.output_root, f"job-{job_id}") if self.output_root else None
+        try:
+            result = self.handler(path, stages, search_pattern, self.library_dir, output_dir)
+            ok = result.get('ok', True)
+            response = {'job': job_id, 'elapsed': time.perf_counter() - start, **result}
+            if keep_output and output_dir:
+                response['output_dir'] = output_dir
+            return response
+        finally:
+            if output_dir and not keep_output:
+                shutil.rmtree(output_dir, ignore_errors=True)
+            self._slots.release()
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stats.active -= 1
+                self.stats.busy_time += elapsed
+                if ok:
+                    self.stats.completed += 1
+                else:
+                    self.stats.failed += 1
+            self._jobs.inc(result="completed" if ok else "failed")
+            self._job_duration.observe(elapsed)
+
+    def run_upload(self, data: bytes, name: str = "upload.epub", stages: Optional[List[str]] = None,
+                   search_pattern: Optional[str] = None, keep_output: bool = False,
+                   job_id: Optional[str] = None) -> Dict[str, Any]:
+        """Выполняет задание для присланных байтов книги; временный файл удаляется после обработки.
+
+        Книга сохраняется во временный каталог под именем клиента (upload_name), поэтому
+        библиотека и каталог видят это имя, а не случайное имя временного файла.
+        """
+        directory = tempfile.mkdtemp(dir=self.upload_dir, prefix="upload-")
+        try:
+            path = os.path.join(directory, upload_name(name))
+            try:
+                with open(path, 'wb') as f:
+                    f.write(data)
+            except BaseException:
+                if job_id is not None:
+                    self.release(job_id)
+                raise
+            return self.run(path, stages, search_pattern, keep_output, job_id)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = asdict(self.stats)
+        return {'status': "ok", 'uptime': self.stats.uptime, **stats,
+                'max_concurrent': self.max_concurrent, 'max_queued': self.max_queued,
+                'pools': {name: asdict(pool) for name, pool in get_runtime().stats().items()}}
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """HTTP API: POST /jobs, GET /health (JSON), GET /metrics (формат Prometheus).
+
+    Тело POST /jobs - либо JSON {"path": ..., "stages": [...], "search_pattern": ..., "keep_output": false},
+    либо сами байты книги (application/epub+zip или application/octet-stream)
+    с параметрами ?stages=a,b&search=...&name=book.epub&keep=1.
+    """
+
+    server_version = "EpubService/1.0"
+    protocol_version = "HTTP/1.1"
+    max_upload = 512 * 1024 * 1024
+
+    @property
+    def service(self) -> JobService:
+        return self.server.service
+
+    def _send_json(self, status: int, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        route = urlsplit(self.path).path
+        if route == "/health":
+            self._send_json(HTTPStatus.OK, self.service.health())
+        elif route == "/metrics":
+            body = self.service.metrics.registry.render().encode('utf-8')
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': f"Неизвестный адрес: {route}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/jobs":
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': f"Неизвестный адрес: {url.path}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > self.max_upload:
+            self.close_connection = True
+            self._send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': "Слишком большой файл"})
+            return
+        # Место резервируется до чтения тела: при перегрузке сервис не принимает сотни мегабайт впустую
+        try:
+            job_id = self.service.admit()
+        except ServiceOverloaded as e:
+            self.close_connection = True  # Непрочитанное тело не дает продолжить соединение
+            self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(e)}, {"Retry-After": "1"})
+            return
+        started = False
+        try:
+            body = self.rfile.read(length)
+            if self.headers.get_content_type() == "application/json":
+                try:
+                    job = json.loads(body or b"{}")
+                except ValueError as e:
+                    raise JobError(f"Некорректный JSON: {str(e)}")
+                if not isinstance(job, dict) or not job.get('path'):
+                    raise JobError("Нужен путь к книге (path) или сами байты книги")
+                started = True
+                result = self.service.run(job['path'], job.get('stages'), job.get('search_pattern'),
+                                          bool(job.get('keep_output')), job_id)
+            else:
+                if not body:
+                    raise JobError("Пустое тело запроса")
+                query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+                stages = query['stages'].split(",") if query.get('stages') else None
+                started = True
+                result = self.service.run_upload(body, query.get('name', "upload.epub"), stages, query.get('search'),
+                                                 query.get('keep', "") not in ("", "0", "false"), job_id)
+        except ServiceOverloaded as e:
+            self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(e)}, {"Retry-After": "1"})
+        except JobError as e:
+            self._send_json(e.status, {'error': str(e)})
+        except Exception as e:
+            events.problem(f"Ошибка при выполнении задания: {str(e)}")
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"{type(e).__name__}: {str(e)}"})
+        else:
+            self._send_json(HTTPStatus.OK, result)
+        finally:
+            if not started:
+                self.service.release(job_id)
+
+    def log_message(self, format: str, *args):
+        # У Unix-сокета нет адреса клиента; журнал запросов - диагностика, а не вывод по умолчанию
+        events.diagnostic(f"[service] {format % args}")
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        try:
+            os.unlink(self.server_address)
+        except FileNotFoundError:
+            pass
+        super().server_bind()
+
+def make_server(service: JobService, host: str = "127.0.0.1", port: int = 8750,
+                unix_socket: Optional[str] = None) -> socketserver.BaseServer:
+    """HTTP сервер для service на TCP порту или Unix-сокете (unix_socket)"""
+    if unix_socket:
+        server = UnixHTTPServer(unix_socket, ServiceRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.service = service
+    return server
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Долгоживущий сервис обработки EPUB по HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="адрес для TCP")
+    parser.add_argument("--port", type=int, default=8750, help="порт для TCP")
+    parser.add_argument("--unix-socket", default=None, help="слушать Unix-сокет вместо TCP порта")
+    parser.add_argument("--library", default="./library", help="директория библиотеки")
+    parser.add_argument("--output-root", default="./service_output", help="директория для изображений и глав по заданиям")
+    parser.add_argument("--max-concurrent", type=int, default=2, help="заданий в обработке одновременно")
+    parser.add_argument("--max-queued", type=int, default=8, help="заданий в ожидании, сверх которых отвечать 503")
+    parser.add_argument("--queue-timeout", type=float, default=None, help="сколько секунд задание может ждать слота")
+    parser.add_argument("--warmup", action="store_true", help="прогнать синтетическую книгу перед приемом заданий")
+    parser.add_argument("--verbose", action="store_true", help="выводить ход обработки и журнал запросов")
+    args = parser.parse_args(argv)
+    events.subscribe(events.ConsoleRenderer(verbose=args.verbose))
+
+    warm_up(sample=args.warmup)
+    service = JobService(args.library, args.output_root, args.max_concurrent, args.max_queued, args.queue_timeout,
+                         metrics=ProcessingMetrics().subscribe())
+    server = make_server(service, args.host, args.port, args.unix_socket)
+    print(f"Сервис слушает {args.unix_socket or f'http://{args.host}:{server.server_address[1]}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix_socket:
+            try:
+                os.unlink(args.unix_socket)
+            except FileNotFoundError:
+                pass
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
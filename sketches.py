@@ -0,0 +1,389 @@
+import json
+import math
+import zlib
+import heapq
+import hashlib
+import random
+import struct
+from zlib import crc32
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, Iterable, List, Mapping, Sequence
+
+from results import HeavyHitter, NgramResult
+
+# Слов в одном блоке обновления: точные счетчики блока живут только во время его обработки
+BLOCK_WORDS = 20000
+MASK64 = (1 << 64) - 1
+
+class SpaceSaving:
+    """Top-k самых частых элементов (Space-Saving) в памяти на capacity счетчиков.
+
+    Для каждого отслеживаемого элемента count - оценка сверху, count - error - оценка
+    снизу. Элемент, которого нет среди счетчиков, встречался не больше floor раз.
+    Сводки объединяются (merge) с теми же гарантиями, поэтому статистику глав и книг
+    можно собирать в статистику библиотеки.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.total = 0
+
+    @property
+    def floor(self) -> int:
+        """Наибольшее возможное число вхождений неотслеживаемого элемента"""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def update(self, counts: Mapping[str, int]):
+        """Добавляет точные счетчики фрагмента текста"""
+        self._merge(counts, {}, 0, sum(counts.values()))
+
+    def merge(self, other: 'SpaceSaving'):
+        self._merge(other.counts, other.errors, other.floor, other.total)
+
+    def _merge(self, counts: Mapping[str, int], errors: Mapping[str, int], other_floor: int, total: int):
+        floor = self.floor
+        merged, merged_errors = {}, {}
+        own_counts, own_errors = self.counts, self.errors
+        for item in own_counts.keys() | counts.keys():
+            # Отсутствующий в сводке элемент мог встречаться до floor раз: это входит и в оценку, и в ошибку
+            own = own_counts.get(item)
+            other = counts.get(item)
+            merged[item] = (own if own is not None else floor) + (other if other is not None else other_floor)
+            merged_errors[item] = (own_errors.get(item, 0) if own is not None else floor) + \
+                                  (errors.get(item, 0) if other is not None else other_floor)
+        if len(merged) > self.capacity:
+            merged = dict(heapq.nlargest(self.capacity, merged.items(), key=itemgetter(1)))
+        self.counts = merged
+        self.errors = {item: merged_errors[item] for item in merged}
+        self.total += total
+
+    def top(self, k: int) -> List[HeavyHitter]:
+        items = heapq.nlargest(k, self.counts.items(), key=itemgetter(1))
+        return [HeavyHitter(item, count, count - self.errors[item]) for item, count in items]
+
+    def to_dict(self) -> dict:
+        return {'capacity': self.capacity, 'total': self.total,
+                'items': [[item, count, self.errors[item]] for item, count in self.counts.items()]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'SpaceSaving':
+        summary = cls(data['capacity'])
+        summary.total = data['total']
+        summary.counts = {item: count for item, count, _ in data['items']}
+        summary.errors = {item: error for item, _, error in data['items']}
+        return summary
+
+class CountMinSketch:
+    """Count-min sketch: оценка числа вхождений любого элемента в памяти width * depth счетчиков.
+
+    Оценка не меньше истинного значения и с вероятностью 1 - e^-depth превышает его
+    не больше чем на e / width * total. Скетчи с одинаковыми параметрами складываются.
+    """
+
+    def __init__(self, width: int = 1 << 16, depth: int = 4, seed: int = 1):
+        if width & (width - 1):
+            raise ValueError("Ширина count-min sketch должна быть степенью двойки")
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        self.total = 0
+        rng = random.Random(seed)
+        # Строки - хеши multiply-shift от crc32 элемента: старшие log2(width) бит (a * x + b) mod 2^64
+        self.a = [rng.getrandbits(64) | 1 for _ in range(depth)]
+        self.b = [rng.getrandbits(64) for _ in range(depth)]
+        self.shift = 64 - (width.bit_length() - 1)
+        try:
+            import numpy as np
+        except ImportError:  # Без numpy счетчики - списки Python: те же значения, но медленнее
+            np = None
+        self.np = np
+        if np is not None:
+            self.table = np.zeros((depth, width), dtype=np.int64)
+        else:
+            self.table = [[0] * width for _ in range(depth)]
+
+    @property
+    def error_bound(self) -> int:
+        """Превышение оценки над истинным значением (с вероятностью 1 - e^-depth)"""
+        return math.ceil(math.e / self.width * self.total)
+
+    def _indexes(self, hashes, row: int):
+        if self.np is not None:
+            np = self.np
+            return (hashes * np.uint64(self.a[row]) + np.uint64(self.b[row])) >> np.uint64(self.shift)
+        a, b, shift = self.a[row], self.b[row], self.shift
+        return [((a * value + b) & MASK64) >> shift for value in hashes]
+
+    def update(self, counts: Mapping[str, int]):
+        if not counts:
+            return
+        hashes = [crc32(item.encode('utf-8')) for item in counts]
+        values = list(counts.values())
+        self.total += sum(values)
+        if self.np is not None:
+            np = self.np
+            hashes = np.array(hashes, dtype=np.uint64)
+            weights = np.array(values, dtype=np.float64)
+            for row in range(self.depth):
+                # bincount складывает веса по индексам за один проход (точно для счетчиков меньше 2^53)
+                self.table[row] += np.bincount(self._indexes(hashes, row).astype(np.intp), weights=weights,
+                                               minlength=self.width).astype(np.int64)
+        else:
+            for row in range(self.depth):
+                cells = self.table[row]
+                for index, value in zip(self._indexes(hashes, row), values):
+                    cells[index] += value
+
+    def estimate(self, item: str) -> int:
+        value = crc32(item.encode('utf-8'))
+        return int(min(self.table[row][((self.a[row] * value + self.b[row]) & MASK64) >> self.shift]
+                       for row in range(self.depth)))
+
+    def merge(self, other: 'CountMinSketch'):
+        if (other.width, other.depth, other.seed) != (self.width, self.depth, self.seed):
+            raise ValueError("Складывать можно только скетчи с одинаковыми шириной, глубиной и seed")
+        if self.np is not None and other.np is not None:
+            self.table += other.table
+        else:
+            for row in range(self.depth):
+                own, theirs = self.table[row], other.table[row]
+                for index in range(self.width):
+                    own[index] += int(theirs[index])
+        self.total += other.total
+
+    def to_bytes(self) -> bytes:
+        if self.np is not None:
+            return self.table.astype('<i8').tobytes()
+        return b''.join(struct.pack(f"<{self.width}q", *row) for row in self.table)
+
+    def load_bytes(self, data: bytes, total: int):
+        if self.np is not None:
+            self.table = self.np.frombuffer(data, dtype='<i8').astype(self.np.int64).reshape(self.depth, self.width)
+        else:
+            values = struct.unpack(f"<{self.depth * self.width}q", data)
+            self.table = [list(values[row * self.width:(row + 1) * self.width]) for row in range(self.depth)]
+        self.total = total
+
+    @property
+    def nbytes(self) -> int:
+        return self.width * self.depth * 8
+
+class NgramStats:
+    """Частоты слов и n-грамм в фиксированной памяти.
+
+    Для каждого порядка n (1 - слова, 2 - биграммы, ...) хранится сводка Space-Saving
+    на capacity элементов; общий count-min sketch уточняет их оценки сверху и отвечает
+    на запрос о любой n-грамме. update() принимает слова одного фрагмента (главы):
+    n-граммы не переходят через границу фрагментов.
+    """
+
+    def __init__(self, orders: Sequence[int] = (1, 2, 3), capacity: int = 1024, width: int = 1 << 16,
+                 depth: int = 4, with_sketch: bool = True):
+        self.orders = tuple(orders)
+        self.capacity = capacity
+        self.summaries = {n: SpaceSaving(capacity) for n in self.orders}
+        self.sketch = CountMinSketch(width, depth) if with_sketch else None
+
+    def update(self, words: Iterable[str]):
+        words = words if isinstance(words, list) else list(words)
+        for start in range(0, len(words), BLOCK_WORDS):
+            # Блоки перекрываются на n - 1 слово, чтобы не терять n-граммы на их границе
+            for n in self.orders:
+                block = words[start:start + BLOCK_WORDS + n - 1]
+                if len(block) < n:
+                    continue
+                grams = block if n == 1 else map(' '.join, zip(*(block[offset:] for offset in range(n))))
+                counts = Counter(grams)
+                self.summaries[n].update(counts)
+                if self.sketch is not None:
+                    self.sketch.update(counts)
+
+    def merge(self, other: 'NgramStats'):
+        for n in self.orders:
+            if n in other.summaries:
+                self.summaries[n].merge(other.summaries[n])
+        if self.sketch is not None and other.sketch is not None:
+            self.sketch.merge(other.sketch)
+
+    def top(self, n: int, k: int = 20) -> List[HeavyHitter]:
+        """k самых частых n-грамм; count уточняется оценкой count-min sketch"""
+        hitters = self.summaries[n].top(k)
+        if self.sketch is not None:
+            for hitter in hitters:
+                hitter.count = min(hitter.count, self.sketch.estimate(hitter.item))
+        return hitters
+
+    def to_result(self, k: int = 20) -> NgramResult:
+        """Top-k слов, биграмм и триграмм для отчета"""
+        summary = self.summaries.get(1)
+        return NgramResult(
+            total_words=summary.total if summary is not None else 0,
+            words=self.top(1, k) if 1 in self.summaries else [],
+            bigrams=self.top(2, k) if 2 in self.summaries else [],
+            trigrams=self.top(3, k) if 3 in self.summaries else [],
+            error_bound=self.sketch.error_bound if self.sketch is not None else 0,
+            memory_bytes=self.memory_bytes,
+        )
+
+    def estimate(self, gram: str) -> int:
+        """Оценка сверху числа вхождений n-граммы (слова через пробел)"""
+        summary = self.summaries.get(len(gram.split(' ')))
+        bounds = []
+        if summary is not None:
+            bounds.append(summary.counts.get(gram, summary.floor))
+        if self.sketch is not None:
+            bounds.append(self.sketch.estimate(gram))
+        return min(bounds) if bounds else 0
+
+    @property
+    def memory_bytes(self) -> int:
+        """Примерный объем структур: счетчики сводок и таблица скетча"""
+        summaries = sum(sum(len(item) + 100 for item in summary.counts) for summary in self.summaries.values())
+        return summaries + (self.sketch.nbytes if self.sketch is not None else 0)
+
+    def to_bytes(self, with_sketch: bool = True) -> bytes:
+        """Сжатое представление для каталога; без скетча - только сводки top-k"""
+        sketch = self.sketch if with_sketch else None
+        header = json.dumps({
+            'orders': self.orders, 'capacity': self.capacity,
+            'summaries': {str(n): summary.to_dict() for n, summary in self.summaries.items()},
+            'sketch': {'width': sketch.width, 'depth': sketch.depth, 'seed': sketch.seed,
+                       'total': sketch.total} if sketch is not None else None,
+        }, ensure_ascii=False).encode('utf-8')
+        body = sketch.to_bytes() if sketch is not None else b''
+        return zlib.compress(struct.pack('<I', len(header)) + header + body)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'NgramStats':
+        data = zlib.decompress(data)
+        (length,) = struct.unpack_from('<I', data)
+        header = json.loads(data[4:4 + length].decode('utf-8'))
+        sketch = header['sketch']
+        stats = cls(header['orders'], header['capacity'], with_sketch=False)
+        stats.summaries = {int(n): SpaceSaving.from_dict(summary) for n, summary in header['summaries'].items()}
+        if sketch is not None:
+            stats.sketch = CountMinSketch(sketch['width'], sketch['depth'], sketch['seed'])
+            stats.sketch.load_bytes(data[4 + length:], sketch['total'])
+        return stats
+
+class HyperLogLog:
+    """Оценка числа различных элементов в 2^p байтах (HyperLogLog).
+
+    Относительная стандартная ошибка около 1.04 / sqrt(2^p): 0.81% при p = 14
+    (16 КБ регистров) во всем диапазоне от единиц до миллиардов элементов.
+    Объединение множеств - поэлементный максимум регистров, поэтому словари книг
+    складываются в словарь автора, серии или всей библиотеки без потери точности.
+    """
+
+    def __init__(self, p: int = 14):
+        if not 4 <= p <= 18:
+            raise ValueError("Точность HyperLogLog должна быть от 4 до 18")
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+        try:
+            import numpy as np
+        except ImportError:  # Без numpy регистры обновляются в цикле Python: те же значения, но медленнее
+            np = None
+        self.np = np
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+    def update(self, items: Iterable[str]):
+        """Добавляет элементы; повторы не меняют регистры, поэтому хешируются только уникальные"""
+        blake2b = hashlib.blake2b
+        digests = b''.join(blake2b(item.encode('utf-8'), digest_size=8).digest() for item in set(items))
+        if not digests:
+            return
+        # Старшие p бит хеша - номер регистра, ранг - позиция первой единицы в остальных q битах
+        q = 64 - self.p
+        if self.np is not None:
+            np = self.np
+            values = np.frombuffer(digests, dtype='<u8')
+            ranks = (q + 1 - _hll_bit_length(np, values & np.uint64((1 << q) - 1))).astype(np.uint8)
+            registers = np.frombuffer(self.registers, dtype=np.uint8)
+            np.maximum.at(registers, (values >> np.uint64(q)).astype(np.intp), ranks)
+            return
+        registers, low = self.registers, (1 << q) - 1
+        for (value,) in struct.iter_unpack('<Q', digests):
+            index, rank = value >> q, q - (value & low).bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+        if other.p != self.p:
+            raise ValueError("Объединять можно только HyperLogLog одинаковой точности")
+        if self.np is not None:
+            own = self.np.frombuffer(self.registers, dtype=self.np.uint8)
+            self.np.maximum(own, self.np.frombuffer(other.registers, dtype=self.np.uint8), out=own)
+        else:
+            self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> int:
+        """Оценка числа различных элементов (оценщик Ertl 2017: без таблиц поправок и порогов)"""
+        q, m = 64 - self.p, self.m
+        histogram = [0] * (q + 2)
+        for rank, count in Counter(self.registers).items():
+            histogram[rank] = count
+        z = m * _hll_tau(1 - histogram[q + 1] / m)
+        for rank in range(q, 0, -1):
+            z = 0.5 * (z + histogram[rank])
+        z += m * _hll_sigma(histogram[0] / m)
+        if math.isinf(z):
+            return 0
+        return round(m * m / (2 * math.log(2)) / z)
+
+    def to_bytes(self, compress: bool = False) -> bytes:
+        """Байт точности и регистры. Каталог хранит их без сжатия: объединение тысяч
+        скетчей упирается в распаковку, а не в чтение"""
+        data = bytes([self.p]) + bytes(self.registers)
+        return zlib.compress(data) if compress else data
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        if not 4 <= data[0] <= 18:  # Первый байт потока zlib (0x78) не бывает точностью
+            data = zlib.decompress(data)
+        sketch = cls(data[0])
+        if len(data) != sketch.m + 1:
+            raise ValueError("Повреждены регистры HyperLogLog")
+        sketch.registers = bytearray(data[1:])
+        return sketch
+
+def _hll_bit_length(np, values):
+    """int.bit_length для массива uint64.
+
+    float64 хранит только 53 бита мантиссы: при q > 53 (p < 11) значение может округлиться
+    до следующей степени двойки. Поэтому frexp применяется к 32-битным половинам, которые
+    представимы точно.
+    """
+    _, high = np.frexp((values >> np.uint64(32)).astype(np.float64))
+    _, low = np.frexp((values & np.uint64(0xFFFFFFFF)).astype(np.float64))
+    return np.where(high > 0, high + 32, low)
+
+def _hll_sigma(x: float) -> float:
+    if x == 1:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous, z = z, z + x * y
+        y += y
+        if z == previous:
+            return z
+
+def _hll_tau(x: float) -> float:
+    if x == 0 or x == 1:
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
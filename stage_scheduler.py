@@ -0,0 +1,242 @@
+import os
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+class Resource:
+    """Класс ресурса, определяющий пул, в котором выполняется этап"""
+    IO = "io"
+    CPU = "cpu"
+    CPU_HEAVY = "cpu_heavy"
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[..., Any]  # Вызывается с входами этапа в качестве именованных аргументов
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()  # Одно имя - результат функции целиком, несколько - кортеж
+    resource: str = Resource.IO
+
+@dataclass
+class StageRun:
+    name: str
+    resource: str = Resource.IO
+    status: str = "pending"  # pending, running, done, failed, skipped
+    submitted: float = 0.0
+    started: float = 0.0
+    finished: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        """Время выполнения этапа без ожидания в очереди"""
+        return self.finished - self.started if self.started and self.finished else 0.0
+
+    @property
+    def queue_wait(self) -> float:
+        """Время между постановкой этапа в пул и началом выполнения"""
+        return self.started - self.submitted if self.started else 0.0
+
+@dataclass
+class ScheduleResult:
+    runs: Dict[str, StageRun] = field(default_factory=dict)
+    values: Dict[str, Any] = field(default_factory=dict)
+    critical_path: List[str] = field(default_factory=list)
+    critical_path_time: float = 0.0  # Время выполнения этапов критического пути
+    # Ожидание на критическом пути, не занятое его этапами: очередь общего пула (задачи других
+    # книг, подзадачи run_all), передача между этапами. Вместе с critical_path_time ~ wall_time
+    critical_path_wait: float = 0.0
+    wall_time: float = 0.0
+
+class StageScheduler:
+    """Планировщик этапов по графу зависимостей.
+
+    Каждый этап запускается, как только готовы все его входы, в пуле своего класса ресурсов.
+    Если этап упал, зависящие от него этапы помечаются пропущенными.
+    """
+
+    def __init__(self, stages: List[Stage], max_workers: Optional[Dict[str, int]] = None,
+                 instrumentation: Optional[Any] = None, executors: Optional[Dict[str, Executor]] = None):
+        cpu_count = os.cpu_count() or 4
+        self.max_workers = {Resource.IO: 8, Resource.CPU: cpu_count, Resource.CPU_HEAVY: 1}
+        self.max_workers.update(max_workers or {})
+        # Общие пулы по классам ресурсов (runtime.Runtime); для остальных классов создаются свои на время run
+        self.executors = executors or {}
+        # Если задан (instrumentation.Instrumentation), каждый этап измеряется как участок
+        self.instrumentation = instrumentation
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Имена этапов должны быть уникальными")
+
+        self.producers: Dict[str, str] = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in self.producers:
+                    raise ValueError(f"Выход {output} производят этапы {self.producers[output]} и {stage.name}")
+                self.producers[output] = stage.name
+
+    def dependencies(self, stage: Stage, available: Dict[str, Any]) -> List[str]:
+        """Этапы, производящие входы данного этапа"""
+        deps = []
+        for name in stage.inputs:
+            if name in available:
+                continue
+            if name not in self.producers:
+                raise ValueError(f"Вход {name} этапа {stage.name} никем не производится")
+            deps.append(self.producers[name])
+        return deps
+
+    def required(self, names: Iterable[str], available: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Этапы, нужные для выполнения names, вместе с их зависимостями (в порядке объявления)"""
+        available = available or {}
+        needed = set()
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name in needed:
+                continue
+            if name not in self.stages:
+                raise ValueError(f"Неизвестный этап {name}")
+            needed.add(name)
+            pending.extend(self.dependencies(self.stages[name], available))
+        return [name for name in self.stages if name in needed]
+
+    def select(self, names: Iterable[str], available: Optional[Dict[str, Any]] = None) -> 'StageScheduler':
+        """Планировщик только для выбранных этапов и их зависимостей; остальные не запускаются"""
+        return StageScheduler([self.stages[name] for name in self.required(names, available)],
+                              self.max_workers, self.instrumentation, self.executors)
+
+    def _check_acyclic(self, deps: Dict[str, List[str]]):
+        """Проверяет граф на циклы (алгоритм Кана)"""
+        remaining = {name: len(parents) for name, parents in deps.items()}
+        children: Dict[str, List[str]] = {name: [] for name in deps}
+        for name, parents in deps.items():
+            for parent in parents:
+                children[parent].append(name)
+        ready = [name for name, count in remaining.items() if count == 0]
+        visited = 0
+        while ready:
+            name = ready.pop()
+            visited += 1
+            for child in children[name]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    ready.append(child)
+        if visited != len(deps):
+            raise ValueError("Граф этапов содержит цикл")
+
+    def _run_stage(self, stage: Stage, run: StageRun, kwargs: Dict[str, Any]):
+        run.started = time.perf_counter()
+        run.status = "running"
+        try:
+            if self.instrumentation is None:
+                return stage.func(**kwargs)
+            with self.instrumentation.span(stage.name, submitted=run.submitted):
+                return stage.func(**kwargs)
+        finally:
+            run.finished = time.perf_counter()
+
+    def run(self, initial: Optional[Dict[str, Any]] = None) -> ScheduleResult:
+        """Выполняет все этапы и возвращает их тайминги, значения и критический путь"""
+        start = time.perf_counter()
+        result = ScheduleResult(values=dict(initial or {}))
+        deps = {name: self.dependencies(stage, result.values) for name, stage in self.stages.items()}
+        self._check_acyclic(deps)
+        result.runs = {name: StageRun(name=name, resource=stage.resource) for name, stage in self.stages.items()}
+
+        executors: Dict[str, Executor] = dict(self.executors)
+        owned: List[Executor] = []
+        futures = {}
+
+        def submit_ready():
+            for name, stage in self.stages.items():
+                run = result.runs[name]
+                if run.status != "pending":
+                    continue
+                parent_runs = [result.runs[parent] for parent in deps[name]]
+                failed = [parent.name for parent in parent_runs if parent.status in ("failed", "skipped")]
+                if failed:
+                    run.status = "skipped"
+                    run.error = f"Не выполнены зависимости: {', '.join(failed)}"
+                    continue
+                if all(parent.status == "done" for parent in parent_runs):
+                    if stage.resource not in executors:
+                        executors[stage.resource] = ThreadPoolExecutor(
+                            max_workers=self.max_workers.get(stage.resource, 1),
+                            thread_name_prefix=f"stage-{stage.resource}",
+                        )
+                        owned.append(executors[stage.resource])
+                    kwargs = {input_name: result.values[input_name] for input_name in stage.inputs}
+                    run.status = "queued"
+                    run.submitted = time.perf_counter()
+                    futures[executors[stage.resource].submit(self._run_stage, stage, run, kwargs)] = name
+
+        try:
+            submit_ready()
+            # Пропуск одного этапа может каскадно пропустить другие, поэтому повторяем до стабилизации
+            while futures or any(run.status == "pending" for run in result.runs.values()):
+                if not futures:
+                    submit_ready()
+                    if not futures:
+                        break
+                    continue
+                done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures.pop(future)
+                    run = result.runs[name]
+                    try:
+                        value = future.result()
+                        run.status = "done"
+                        outputs = self.stages[name].outputs
+                        if len(outputs) == 1:
+                            result.values[outputs[0]] = value
+                        elif outputs:
+                            result.values.update(zip(outputs, value))
+                    except Exception as e:
+                        run.status = "failed"
+                        run.error = str(e)
+                submit_ready()
+        finally:
+            # Общие пулы продолжают работать после этого запуска; если этап упал с
+            # исключением планировщика, ждем только свои задачи
+            if futures:
+                wait(list(futures))
+            for executor in owned:
+                executor.shutdown(wait=True)
+
+        result.wall_time = time.perf_counter() - start
+        pools = {name: id(executors[stage.resource]) for name, stage in self.stages.items() if stage.resource in executors}
+        result.critical_path = self._critical_path(result.runs, deps, pools)
+        path = [result.runs[name] for name in result.critical_path]
+        result.critical_path_time = sum(run.duration for run in path)
+        if path:
+            result.critical_path_wait = path[0].queue_wait + sum(
+                current.started - previous.finished for previous, current in zip(path, path[1:]))
+        return result
+
+    @staticmethod
+    def _critical_path(runs: Dict[str, StageRun], deps: Dict[str, List[str]], pools: Dict[str, int]) -> List[str]:
+        """Цепочка этапов, определившая общее время: от последнего завершившегося этапа назад
+        через то событие, которое позволило этапу начаться.
+
+        Обычно это зависимость, завершившаяся позже всех. Но если этап ждал в очереди
+        пула, его задержал этап того же пула, освободивший слот за время ожидания.
+        """
+        finished = [run for run in runs.values() if run.finished]
+        if not finished:
+            return []
+        current = max(finished, key=lambda run: run.finished)
+        path = [current.name]
+        while True:
+            parents = [runs[parent] for parent in deps[current.name] if runs[parent].finished]
+            pool = pools.get(current.name)
+            holders = [run for run in finished
+                       if pool is not None and pools.get(run.name) == pool and run.name not in path
+                       and current.submitted <= run.finished <= current.started]
+            candidates = holders or parents
+            if not candidates:
+                break
+            current = max(candidates, key=lambda run: run.finished)
+            path.append(current.name)
+        return list(reversed(path))
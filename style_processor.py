@@ -1,20 +1,11 @@
 import zipfile
 import re
 from typing import Dict, List
-from dataclasses import dataclass
 import xml.etree.ElementTree as ET
 import os
 
-@dataclass
-class StyleProcessingResult:
-    processed_styles: Dict[str, str] = None  # путь к файлу -> обработанный CSS
-    total_styles: int = 0
-    optimized_size: int = 0  # размер после оптимизации в байтах
-    original_size: int = 0   # исходный размер в байтах
-
-    def __post_init__(self):
-        if self.processed_styles is None:
-            self.processed_styles = {}
+import events
+from results import StyleProcessingResult
 
 class StyleProcessor:
     def __init__(self, epub_path: str):
@@ -36,13 +27,13 @@ class StyleProcessor:
                 rootfile = root.find('.//container:rootfile', namespaces)
                 
                 if rootfile is None:
-                    print("Ошибка: Не найден rootfile в META-INF/container.xml")
+                    events.problem("Ошибка: Не найден rootfile в META-INF/container.xml")
                     return []
                     
                 opf_path = rootfile.get('full-path')
                 
                 if opf_path is None:
-                     print("Ошибка: Не найден full-path в rootfile в META-INF/container.xml")
+                     events.problem("Ошибка: Не найден full-path в rootfile в META-INF/container.xml")
                      return []
                 
                 # Читаем OPF файл
@@ -60,14 +51,14 @@ class StyleProcessor:
                             style_file_path = os.path.join(os.path.dirname(opf_path), item.get('href', '')).replace('\\', '/')
                             style_files.append(style_file_path)
                 else:
-                     print(f"Warning: Манифест в OPF файле ({opf_path}) не найден.")
+                     events.problem(f"Манифест в OPF файле ({opf_path}) не найден.", level="warning")
                 
                 return style_files
         except KeyError:
-             print("Ошибка: Не найден container.xml или OPF файл в архиве EPUB.")
+             events.problem("Ошибка: Не найден container.xml или OPF файл в архиве EPUB.")
              return []
         except Exception as e:
-            print(f"Ошибка при получении списка стилей: {str(e)}")
+            events.problem(f"Ошибка при получении списка стилей: {str(e)}")
             return []
 
     def _optimize_css(self, css_content: str) -> str:
@@ -87,7 +78,7 @@ class StyleProcessor:
             
             return css.strip()
         except Exception as e:
-            print(f"Ошибка при оптимизации CSS: {str(e)}")
+            events.problem(f"Ошибка при оптимизации CSS: {str(e)}")
             return css_content
 
     def process_styles(self) -> StyleProcessingResult:
@@ -97,7 +88,7 @@ class StyleProcessor:
         try:
             style_files = self._get_style_files()
             if not style_files:
-                print("CSS файлы не найдены в манифесте.")
+                events.problem("CSS файлы не найдены в манифесте.", level="warning")
                 return result
             
             with zipfile.ZipFile(self.epub_path, 'r') as epub:
@@ -117,13 +108,13 @@ class StyleProcessor:
                         result.optimized_size += len(optimized_css.encode('utf-8'))
                         
                     except KeyError:
-                         print(f"Warning: Файл стиля {style_file} указан в манифесте, но не найден в архиве EPUB.")
+                         events.problem(f"Файл стиля {style_file} указан в манифесте, но не найден в архиве EPUB.", level="warning")
                     except Exception as e:
-                        print(f"Ошибка при обработке стиля {style_file}: {str(e)}")
+                        events.problem(f"Ошибка при обработке стиля {style_file}: {str(e)}")
             
             result.total_styles = len(result.processed_styles)
             return result
             
         except Exception as e:
-            print(f"Критическая ошибка при обработке стилей: {str(e)}")
+            events.problem(f"Критическая ошибка при обработке стилей: {str(e)}")
             return result 
\ No newline at end of file
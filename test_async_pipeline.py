@@ -0,0 +1,90 @@
+import asyncio
+import io
+import json
+import os
+import zipfile
+
+from PIL import Image
+
+import main
+from test_translation import build_epub
+
+
+def add_image(epub_path, name='cover.png'):
+    """Добавляет PNG изображение в манифест готового EPUB"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), (200, 30, 30)).save(buffer, format='PNG')
+    with zipfile.ZipFile(epub_path) as epub:
+        files = {item: epub.read(item) for item in epub.namelist()}
+    files['OPS/content.opf'] = files['OPS/content.opf'].replace(
+        b'</manifest>', f'<item id="img" href="{name}" media-type="image/png"/></manifest>'.encode())
+    files[f'OPS/{name}'] = buffer.getvalue()
+    with zipfile.ZipFile(epub_path, 'w') as epub:
+        for item, data in files.items():
+            epub.writestr(item, data)
+
+
+def test_process_async_writes_outputs(tmp_path):
+    """Асинхронная обработка пишет изображения, архив глав, библиотеку и отчет."""
+    epub_path = build_epub(tmp_path / 'book.epub', [('Глава 1', 'Первое слово. ' * 10), ('Глава 2', 'Второе.')])
+    add_image(epub_path)
+    processor = main.EpubProcessor(epub_path, 'слово', str(tmp_path / 'library'), str(tmp_path / 'out'))
+
+    result = asyncio.run(processor.process_async(output_file=str(tmp_path / 'report.json')))
+
+    assert result.text_analysis.word_count > 0
+    assert result.keyword_search.match_count == 10
+    assert result.image_extraction.count == 1
+    assert len(result.image_extraction.grayscale_image_paths) == 1
+    assert all(os.path.exists(path) for path in result.image_extraction.mirrored_image_paths.values())
+    with zipfile.ZipFile(result.chapters.output_zip) as archive:
+        assert sorted(archive.namelist()) == ['Глава 1.txt', 'Глава 2.txt']
+    assert os.path.exists(result.library_save_path)
+    with open(tmp_path / 'report.json', encoding='utf-8') as f:
+        assert json.load(f)['fingerprint'] == result.fingerprint
+
+
+def test_process_books_async_bounds_books_in_flight(tmp_path, monkeypatch):
+    """Одновременно обрабатывается не больше max_in_flight книг, ошибки не останавливают остальные."""
+    books = [build_epub(tmp_path / f'book{i}.epub', [(f'Глава {i}', 'Текст.')]) for i in range(5)]
+    (tmp_path / 'broken.epub').write_bytes(b'not a zip')
+    books.append(str(tmp_path / 'broken.epub'))
+
+    in_flight = {'now': 0, 'max': 0}
+    original = main.EpubProcessor.process_async
+
+    async def tracked(self, *args, **kwargs):
+        in_flight['now'] += 1
+        in_flight['max'] = max(in_flight['max'], in_flight['now'])
+        try:
+            return await original(self, *args, **kwargs)
+        finally:
+            in_flight['now'] -= 1
+
+    monkeypatch.setattr(main.EpubProcessor, 'process_async', tracked)
+    results = asyncio.run(main.process_books_async(
+        books, max_in_flight=2, library_dir=str(tmp_path / 'library'),
+        output_root=str(tmp_path / 'out'), report_dir=str(tmp_path / 'reports'),
+    ))
+
+    assert len(results) == 6
+    assert in_flight['max'] <= 2
+    assert results[books[0]].text_analysis.word_count > 0
+    assert results[books[-1]].text_analysis is None
+    assert len(os.listdir(tmp_path / 'reports')) == 6
+
+
+def test_process_books_async_same_file_names(tmp_path):
+    """Книги с одинаковым именем из разных директорий получают свои отчеты и выходные директории."""
+    books = []
+    for folder in ('a', 'b'):
+        (tmp_path / folder).mkdir()
+        books.append(build_epub(tmp_path / folder / 'book.epub', [(f'Глава {folder}', 'Текст.')]))
+    results = asyncio.run(main.process_books_async(
+        books, max_in_flight=2, library_dir=str(tmp_path / 'library'),
+        output_root=str(tmp_path / 'out'), report_dir=str(tmp_path / 'reports'),
+    ))
+
+    assert all(result is not None for result in results.values())
+    assert sorted(os.listdir(tmp_path / 'reports')) == ['00000-book.json', '00001-book.json']
+    assert sorted(os.listdir(tmp_path / 'out')) == ['00000-book', '00001-book']
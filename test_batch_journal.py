@@ -0,0 +1,86 @@
+import io
+import os
+import sys
+import contextlib
+
+import pytest
+
+import events
+from batch_journal import BatchJournal, BookCheckpoint, decode_value, encode_value, settings_key
+from batch_runner import BatchRunner
+from epub_synth import generate_epub
+from main import EpubProcessor
+
+
+def test_load_skips_torn_line_and_changed_books(tmp_path):
+    """Оборванная строка пропускается, а записи об измененной книге не учитываются."""
+    book = generate_epub(tmp_path / 'book.epub', chapters=1, words_per_chapter=50, images=0)
+    journal = BatchJournal(str(tmp_path / 'journal.jsonl'))
+    settings = settings_key(search_pattern=None)
+    journal.record_book(book, settings, ok=True)
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"type": "book", "bo')
+
+    assert list(journal.load(settings, settings).books) == [os.path.abspath(book)]
+    assert journal.load(settings_key(search_pattern='слово'), settings).books == {}
+
+    # Следующая запись не склеивается с оборванной строкой
+    journal.record_book(book, settings, ok=False, error='ошибка')
+    assert len(list(journal.records())) == 2
+
+    generate_epub(book, chapters=2, words_per_chapter=50, images=0)
+    assert journal.load(settings, settings).books == {}
+
+
+def test_interrupted_book_resumes_without_repeating_stages(tmp_path):
+    """Этапы, завершенные до сбоя, восстанавливаются из журнала, а обработанная книга пропускается."""
+    book = generate_epub(tmp_path / 'book.epub', chapters=2, words_per_chapter=100, images=2, image_size=(32, 32))
+    journal_path = str(tmp_path / 'journal.jsonl')
+    library, output = str(tmp_path / 'library'), str(tmp_path / 'out')
+    runner = BatchRunner(workers=1, library_dir=library, output_root=output, journal=journal_path, progress=False)
+    journal = BatchJournal(journal_path)
+
+    # Первый запуск "упал" после изображений и архива глав
+    with contextlib.redirect_stdout(io.StringIO()):
+        checkpoint = BookCheckpoint(journal, book, runner.options['stage_settings'])
+        first = EpubProcessor(book, None, library, os.path.join(output, '00000-book'), checkpoint=checkpoint)
+        first.process_parallel(['images', 'chapters'])
+    grayscale = next(iter(first.result.image_extraction.grayscale_image_paths.values()))
+    modified = os.path.getmtime(grayscale)
+
+    state = journal.load(runner.options['book_settings'], runner.options['stage_settings'])
+    checkpoint = BookCheckpoint(journal, book, runner.options['stage_settings'], state.stages[os.path.abspath(book)])
+    with contextlib.redirect_stdout(io.StringIO()):
+        resumed = EpubProcessor(book, None, library, os.path.join(output, '00000-book'), checkpoint=checkpoint)
+        result = resumed.process_parallel()
+    assert result.thread_statuses['extract_images'] == "Восстановлено из журнала"
+    assert result.chapters.output_zip == first.result.chapters.output_zip
+    assert 'extract_images' not in result.execution_times
+    assert result.text_analysis.word_count > 0
+    assert os.path.getmtime(grayscale) == modified
+
+    summary = runner.run([book])
+    assert summary.succeeded == 1 and not summary.outcomes[0].resumed
+    summary = runner.run([book])
+    assert summary.succeeded == 1 and summary.outcomes[0].resumed
+
+
+def test_journal_restores_only_result_types(tmp_path):
+    """Из журнала восстанавливаются только типы results.py; чужое имя типа не импортируется."""
+    from results import EpubMetadata
+    from library import LibraryEntry
+
+    metadata = EpubMetadata(title='Книга')
+    assert decode_value(encode_value({'metadata': metadata})) == {'metadata': metadata}
+    with pytest.raises(TypeError):
+        encode_value(LibraryEntry(name='book.epub'))
+
+    sys.modules.pop('this', None)
+    book = generate_epub(tmp_path / 'book.epub', chapters=1, words_per_chapter=20, images=0)
+    checkpoint = BookCheckpoint(BatchJournal(str(tmp_path / 'journal.jsonl')), book, '', stages={
+        'extract_metadata': {'metadata': {'__dataclass__': 'this:Zen', 'fields': {}}},
+    })
+    with events.recorded() as recorded:
+        assert checkpoint.completed() == {}
+    assert 'this' not in sys.modules
+    assert any(isinstance(event, events.Problem) and event.level == 'warning' for event in recorded)
@@ -0,0 +1,55 @@
+import os
+
+from batch_runner import BatchRunner, BookOutcome, collect_books, write_aggregate_report
+from test_translation import build_epub
+
+
+def flaky_handler(path, key, options):
+    """Обработчик, который роняет процесс на книгах с 'crash' в имени"""
+    if 'crash' in os.path.basename(path):
+        os._exit(17)
+    if 'slow' in os.path.basename(path):
+        import time
+        time.sleep(30)
+    return BookOutcome(path=path, ok=True)
+
+
+def test_collect_books_expands_dirs_and_globs(tmp_path):
+    """Директории и glob-шаблоны раскрываются в список EPUB файлов без дубликатов."""
+    (tmp_path / 'nested').mkdir()
+    for name in ('a.epub', 'nested/b.epub', 'nested/c.txt'):
+        (tmp_path / name).write_bytes(b'x')
+
+    books = collect_books([str(tmp_path), str(tmp_path / '**' / '*.epub')])
+    assert sorted(os.path.basename(book) for book in books) == ['a.epub', 'b.epub']
+
+
+def test_crash_and_timeout_are_contained_to_one_book(tmp_path):
+    """Падение или зависание процесса засчитывается только книге, которую он обрабатывал."""
+    books = [str(tmp_path / name) for name in ('one.epub', 'crash.epub', 'two.epub', 'slow.epub', 'three.epub')]
+    runner = BatchRunner(workers=2, timeout=2, progress=False, handler=flaky_handler)
+    summary = runner.run(books)
+
+    assert summary.total == 5
+    assert summary.succeeded == 3
+    failures = dict(summary.failures)
+    assert 'кодом 17' in failures[books[1]]
+    assert 'время' in failures[books[3]]
+
+
+def test_real_books_with_aggregate_report(tmp_path, monkeypatch):
+    """Реальные книги обрабатываются рабочими процессами, отчеты пишутся по книгам и в общий файл."""
+    monkeypatch.chdir(tmp_path)
+    books = [build_epub(tmp_path / f'book{i}.epub', [(f'Глава {i}', 'Текст книги. ' * 20)]) for i in range(2)]
+    (tmp_path / 'broken.epub').write_bytes(b'not a zip')
+    books.append(str(tmp_path / 'broken.epub'))
+
+    runner = BatchRunner(workers=2, library_dir=str(tmp_path / 'library'), output_root=str(tmp_path / 'out'),
+                         report_dir=str(tmp_path / 'reports'), collect_reports=True, progress=False)
+    summary = runner.run(books)
+    write_aggregate_report(summary, str(tmp_path / 'all.json'))
+
+    assert [outcome.ok for outcome in summary.outcomes] == [True, True, False]
+    assert summary.outcomes[0].report['text_analysis']['word_count'] > 0
+    assert os.path.exists(summary.outcomes[1].report_path)
+    assert os.path.exists(tmp_path / 'all.json')
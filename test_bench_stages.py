@@ -0,0 +1,23 @@
+from bench_stages import BenchResult, find_regressions, load_baseline, run_benchmarks, save_baseline
+from epub_synth import SynthSpec
+
+
+def test_baseline_roundtrip_and_regression_threshold(tmp_path):
+    """Базовая линия сохраняется и читается, замедление сверх порога считается регрессией."""
+    spec = SynthSpec(chapters=2, words_per_chapter=200, images=1, image_size=(16, 16), css_rules=5)
+    results = run_benchmarks(spec, rounds=1, only=['text_analyzer', 'image_mirrored'])
+    assert set(results) == {'text_analyzer', 'image_mirrored'}
+    assert all(result.median > 0 for result in results.values())
+
+    path = str(tmp_path / 'baseline.json')
+    save_baseline(path, spec, results)
+    loaded_spec, baseline = load_baseline(path)
+    assert loaded_spec == spec
+    assert baseline == results
+
+    current = {
+        'text_analyzer': BenchResult('text_analyzer', median=baseline['text_analyzer'].median * 1.1),
+        'image_mirrored': BenchResult('image_mirrored', median=baseline['image_mirrored'].median * 1.5),
+    }
+    regressions = find_regressions(baseline, current, threshold=0.2)
+    assert [regression.name for regression in regressions] == ['image_mirrored']
@@ -0,0 +1,16 @@
+from bench_startup import import_breakdown, loaded_modules, parse_importtime
+
+
+def test_parse_importtime():
+    """Строки -X importtime разбираются в модуль, время и уровень вложенности; заголовок пропускается."""
+    stderr = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       120 |        120 |   _io\n"
+              "import time:       300 |        900 | main\n")
+    records = parse_importtime(stderr)
+    assert [(r.name, r.self_us, r.cumulative_us, r.depth) for r in records] == [("_io", 120, 120, 1), ("main", 300, 900, 0)]
+
+
+def test_import_main_does_not_load_heavy_dependencies():
+    """import main не загружает PIL, bs4, lxml, asyncio и т.п. - они нужны только отдельным этапам."""
+    assert loaded_modules("import main") == []
+    assert any(record.name == "main" and record.cumulative_us > 0 for record in import_breakdown("main"))
@@ -0,0 +1,38 @@
+import zipfile
+
+from epub_synth import SynthSpec, generate_epub
+from image_extractor import ImageExtractor
+from style_processor import StyleProcessor
+from text_analyzer import TextAnalyzer
+from text_extractor import TextExtractor
+from toc_generator import TocGenerator
+
+
+def test_generated_book_matches_spec(tmp_path):
+    """Сгенерированная книга читается этапами обработки и соответствует спецификации."""
+    spec = SynthSpec(chapters=3, words_per_chapter=300, images=2, image_size=(32, 24),
+                     css_files=2, css_rules=10, toc_depth=3, sections_per_level=2)
+    path = generate_epub(str(tmp_path / 'synthetic.epub'), spec)
+
+    text = TextExtractor().extract_text(path).text
+    analysis = TextAnalyzer().analyze_text(text)
+    assert abs(analysis.word_count - 3 * 300) < 3 * 40  # Плюс заголовки глав и разделов
+    assert any('а' <= ch <= 'я' for ch in text) and any('a' <= ch <= 'z' for ch in text)
+    # Глава, 2 раздела второго уровня и по 2 подраздела третьего в каждом
+    assert TocGenerator(path).generate_toc().total_chapters == 3 * (1 + 2 + 4)
+    assert StyleProcessor(path).process_styles().total_styles == 2
+    assert ImageExtractor(path, str(tmp_path / 'images')).extract_images().count == 2
+
+
+def test_generation_is_deterministic(tmp_path):
+    """Одинаковая спецификация дает одинаковое содержимое, другой seed - другое."""
+    first = generate_epub(str(tmp_path / 'a.epub'), chapters=2, words_per_chapter=100, images=1, seed=7)
+    second = generate_epub(str(tmp_path / 'b.epub'), chapters=2, words_per_chapter=100, images=1, seed=7)
+    third = generate_epub(str(tmp_path / 'c.epub'), chapters=2, words_per_chapter=100, images=1, seed=8)
+
+    def contents(path):
+        with zipfile.ZipFile(path) as epub:
+            return {name: epub.read(name) for name in epub.namelist()}
+
+    assert contents(first) == contents(second)
+    assert contents(first)['OPS/chapter1.xhtml'] != contents(third)['OPS/chapter1.xhtml']
@@ -0,0 +1,38 @@
+import io
+import contextlib
+
+import events
+from epub_synth import generate_epub
+from main import EpubProcessor
+
+
+def test_stage_and_item_events_carry_book_and_stage(tmp_path):
+    """События этапов и файлов внутри них относятся к книге и этапу, который их породил."""
+    book = generate_epub(tmp_path / 'book.epub', chapters=3, words_per_chapter=50, images=1, image_size=(16, 16))
+    processor = EpubProcessor(book, None, str(tmp_path / 'library'), str(tmp_path / 'out'))
+    with events.recorded() as collected:
+        processor.process_parallel(['text_analysis', 'images'])
+
+    finished = {event.stage: event for event in collected if isinstance(event, events.StageFinished)}
+    assert set(finished) == {'extract_text', 'analyze_text', 'extract_images'}
+    assert all(event.book == book and event.status == "done" for event in finished.values())
+
+    documents = [event for event in collected if isinstance(event, events.ItemProcessed) and event.stage == 'extract_text']
+    assert [(event.done, event.total) for event in documents] == [(1, 3), (2, 3), (3, 3)]
+    assert not events.enabled()
+
+
+def test_silent_without_subscribers_and_rendered_with_them(tmp_path):
+    """Без подписчиков обработка ничего не выводит, ConsoleRenderer выводит ошибки этапов."""
+    broken = tmp_path / 'broken.epub'
+    broken.write_bytes(b'not a zip')
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        EpubProcessor(str(broken), None, str(tmp_path / 'library')).process_parallel(['toc'])
+    assert output.getvalue() == ""
+
+    rendered = io.StringIO()
+    with events.subscribed(events.ConsoleRenderer(stream=rendered)):
+        EpubProcessor(str(broken), None, str(tmp_path / 'library')).process_parallel(['toc'])
+    assert "Ошибка при генерации оглавления" in rendered.getvalue()
+    assert "Ошибка при выполнении generate_toc" in rendered.getvalue()
@@ -0,0 +1,116 @@
+import io
+import os
+import time
+import contextlib
+
+import events
+from ingest_daemon import IngestDaemon, InotifyWatcher
+
+
+def make_daemon(inbox, processed, **kwargs):
+    return IngestDaemon(str(inbox), settle_seconds=0.05, use_inotify=False, stats_interval=3600,
+                        process_book=processed.append, **kwargs)
+
+
+def wait_idle(daemon):
+    deadline = time.time() + 5
+    while daemon._in_flight and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_file_is_processed_after_it_settles(tmp_path):
+    """Файл попадает в обработку только после того, как перестал меняться."""
+    processed = []
+    daemon = make_daemon(tmp_path, processed)
+    book = tmp_path / 'book.epub'
+    book.write_bytes(b'part')
+
+    daemon.tick()
+    assert processed == [] and daemon.stats.settling == 1
+
+    # Файл дописывается - отсчет начинается заново
+    time.sleep(0.06)
+    book.write_bytes(b'part-two')
+    daemon.tick()
+    assert processed == []
+
+    time.sleep(0.06)
+    daemon.tick()
+    wait_idle(daemon)
+    daemon.close()
+    assert processed == [str(book)]
+    assert daemon.stats.processed == 1
+
+
+def test_unchanged_files_are_skipped_after_restart(tmp_path):
+    """Обработанные неизмененные файлы пропускаются и после перезапуска."""
+    processed = []
+    (tmp_path / 'a.epub').write_bytes(b'a')
+    (tmp_path / 'notes.txt').write_bytes(b'not a book')
+
+    daemon = make_daemon(tmp_path, processed)
+    daemon.tick()
+    time.sleep(0.06)
+    daemon.tick()
+    wait_idle(daemon)
+    daemon.close()
+
+    restarted = make_daemon(tmp_path, processed)
+    restarted.tick()
+    time.sleep(0.06)
+    restarted.tick()
+    restarted.close()
+
+    assert processed == [str(tmp_path / 'a.epub')]
+    assert restarted.stats.skipped_unchanged == 1
+
+
+def test_inotify_reports_written_files(tmp_path):
+    """inotify сообщает об именах записанных файлов."""
+    try:
+        watcher = InotifyWatcher(str(tmp_path))
+    except OSError:
+        return  # Платформа без inotify: используется опрос
+    (tmp_path / 'new.epub').write_bytes(b'data')
+    assert str(tmp_path / 'new.epub') in watcher.wait(1.0)
+    watcher.close()
+
+
+def test_file_rewritten_during_processing_is_processed_again(tmp_path):
+    """Файл, переписанный во время обработки, обрабатывается еще раз без новых событий и пересмотра."""
+    book = tmp_path / 'book.epub'
+    book.write_bytes(b'first')
+    processed = []
+
+    def rewrite_once(path):
+        processed.append(path)
+        if len(processed) == 1:
+            book.write_bytes(b'second version')
+
+    daemon = IngestDaemon(str(tmp_path), settle_seconds=0.05, use_inotify=False, stats_interval=3600,
+                          process_book=rewrite_once)
+    daemon.tick()
+    time.sleep(0.06)
+    daemon.tick()
+    wait_idle(daemon)
+    # Как при inotify: событий больше нет, полного пересмотра директории нет
+    daemon.tick(set())
+    time.sleep(0.06)
+    daemon.tick(set())
+    wait_idle(daemon)
+    daemon.close()
+    assert processed == [str(book), str(book)]
+    stat = os.stat(book)
+    assert daemon._load_state()[str(book)] == [stat.st_size, stat.st_mtime_ns]
+
+
+def test_status_is_reported_through_events(tmp_path):
+    """Демон не пишет в stdout сам: строки состояния приходят событиями Status."""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), events.recorded() as recorded:
+        daemon = make_daemon(tmp_path, [])
+        daemon.stop()
+        daemon.run()
+    assert output.getvalue() == ""
+    messages = [event.message for event in recorded if isinstance(event, events.Status)]
+    assert messages[0].startswith("Наблюдение за") and messages[-1].startswith("[ingest] обработано: 0")
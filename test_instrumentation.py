@@ -0,0 +1,56 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+from instrumentation import Instrumentation, bind, subtask
+from test_async_pipeline import add_image
+from test_translation import build_epub
+
+
+def test_span_records_cpu_io_and_subtasks(tmp_path):
+    """Участок измеряет процессорное время и ввод-вывод, подзадачи в пуле привязываются к этапу."""
+    instrumentation = Instrumentation(trace_memory=True)
+    path = tmp_path / 'data.bin'
+
+    with instrumentation.span('write', submitted=instrumentation.origin):
+        path.write_bytes(b'x' * 100000)
+        with subtask('inner'):
+            sum(i * i for i in range(100000))
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(bind(lambda: bytearray(10 ** 6), 'alloc')).result()
+
+    spans = {span.name: span for span in instrumentation.spans}
+    assert spans['write'].bytes_written >= 100000
+    assert spans['write'].queue_wait > 0
+    assert spans['inner'].parent == 'write' and spans['inner'].cpu_time > 0
+    assert spans['alloc'].parent == 'write' and spans['alloc'].thread != threading.current_thread().name
+    assert spans['alloc'].peak_memory >= 10 ** 6
+    # Без активного этапа подзадачи ничего не записывают
+    with subtask('orphan'):
+        pass
+    assert 'orphan' not in {span.name for span in instrumentation.spans}
+
+
+def test_process_parallel_exports_metrics_and_chrome_trace(tmp_path):
+    """Метрики этапов попадают в execution_times, а трассировка - в формат Chrome Trace Event."""
+    epub_path = build_epub(tmp_path / 'book.epub', [('Глава 1', 'Первое слово. ' * 10), ('Глава 2', 'Второе.')])
+    add_image(epub_path)
+    instrumentation = Instrumentation()
+    processor = main.EpubProcessor(epub_path, None, str(tmp_path / 'library'), str(tmp_path / 'out'),
+                                   instrumentation=instrumentation)
+
+    times = processor.process_parallel().execution_times
+
+    assert times['total_time'] <= times['stage_time_sum']
+    assert times['extract_text.cpu_time'] > 0
+    assert times['extract_text.bytes_read'] > 0
+    assert 'extract_images.queue_wait' in times
+    assert 'extract_text/xhtml:chapter1.xhtml' in times
+    assert 'extract_images/grayscale:cover.png' in times
+
+    trace_path = tmp_path / 'trace.json'
+    instrumentation.save_chrome_trace(str(trace_path))
+    events = json.loads(trace_path.read_text(encoding='utf-8'))['traceEvents']
+    names = {event['name'] for event in events if event['ph'] == 'X'}
+    assert {'extract_text', 'analyze_text', 'image:cover.png', 'mirrored:cover.png'} <= names
@@ -0,0 +1,77 @@
+import os
+from unittest.mock import patch
+
+from library import LibraryStore
+
+
+def write_book(path, content: bytes):
+    with open(path, 'wb') as f:
+        f.write(content)
+    return str(path)
+
+
+def test_add_same_book_twice_does_not_copy(tmp_path):
+    """Повторное добавление той же книги не создает второй копии."""
+    store = LibraryStore(str(tmp_path / 'library'))
+    book = write_book(tmp_path / 'book.epub', b'epub-content' * 100)
+
+    first = store.add(book)
+    with patch.object(store, '_materialize') as mock_materialize:
+        second = store.add(book)
+
+    mock_materialize.assert_not_called()
+    assert second.method == 'existing'
+    assert first.path == second.path
+    assert os.path.exists(first.path)
+
+
+def test_same_name_different_content_is_not_overwritten(tmp_path):
+    """Книги с одинаковым именем файла, но разным содержимым хранятся раздельно."""
+    store = LibraryStore(str(tmp_path / 'library'))
+    os.makedirs(tmp_path / 'a')
+    os.makedirs(tmp_path / 'b')
+    first = store.add(write_book(tmp_path / 'a' / 'book.epub', b'first edition'))
+    second = store.add(write_book(tmp_path / 'b' / 'book.epub', b'second edition'))
+
+    manifest = store.load_manifest()
+    assert first.name == 'book.epub'
+    assert second.name != first.name
+    assert manifest[first.name] != manifest[second.name]
+    with open(store.resolve(first.name), 'rb') as f:
+        assert f.read() == b'first edition'
+
+
+def test_footprint_counts_unique_objects(tmp_path):
+    """Объем хранилища учитывает каждое уникальное содержимое один раз."""
+    store = LibraryStore(str(tmp_path / 'library'), allow_hardlink=False)
+    content = b'x' * 1000
+    store.add(write_book(tmp_path / 'one.epub', content))
+    store.add(write_book(tmp_path / 'two.epub', content))
+
+    footprint = store.footprint()
+    assert footprint.books == 2
+    assert footprint.unique_objects == 1
+    assert footprint.logical_bytes == 2000
+    assert footprint.stored_bytes + footprint.shared_bytes == 1000
+
+
+def test_rewriting_source_in_place_does_not_change_stored_object(tmp_path):
+    """По умолчанию объект не делит inode с исходником; жесткая ссылка защищена и проверяется при чтении."""
+    store = LibraryStore(str(tmp_path / 'library'))
+    book = write_book(tmp_path / 'book.epub', b'first edition')
+    entry = store.add(book)
+    write_book(book, b'rewritten in place')
+    assert entry.method != 'hardlink'
+    assert LibraryStore.hash_file(store.resolve(entry.name)) == entry.digest
+
+    linked = LibraryStore(str(tmp_path / 'linked'), allow_hardlink=True)
+    book = write_book(tmp_path / 'linked.epub', b'first edition')
+    entry = linked.add(book)
+    if entry.method != 'hardlink':  # Файловая система поддерживает reflink
+        return
+    assert os.stat(entry.path).st_mode & 0o222 == 0
+    os.chmod(book, 0o644)
+    write_book(book, b'rewritten in place')
+    assert linked.resolve(entry.name) is None
+    restored = linked.add(write_book(tmp_path / 'copy.epub', b'first edition'))
+    assert restored.method != 'existing' and LibraryStore.hash_file(restored.path) == entry.digest
@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+from library_catalog import LibraryCatalog, CatalogEntry, VocabularyEstimate
+from metadata_extractor import EpubMetadata
+from text_analyzer import TextAnalysisResult, TextAnalyzer
+
+
+def make_catalog(tmp_path, books=()):
+    catalog = LibraryCatalog.for_library(str(tmp_path / 'library'))
+    for i, (author, language, date) in enumerate(books):
+        catalog.upsert(CatalogEntry(fingerprint=f'{i:064x}', name=f'book{i}.epub', path=f'/lib/{i}', size=100 + i,
+                                    title=f'Книга {i}', author=author, language=language, publication_date=date))
+    return catalog
+
+
+def test_upsert_keeps_existing_fields(tmp_path):
+    """Частичное обновление не затирает уже сохраненные поля."""
+    catalog = make_catalog(tmp_path)
+    result = SimpleNamespace(metadata=EpubMetadata(title='Война и мир', author='Толстой', language='ru'),
+                             text_analysis=None, toc=None, image_extraction=None)
+    catalog.upsert(LibraryCatalog.entry_from_result('abc', 'wp.epub', '/lib/abc', 10, result))
+
+    result.metadata = None
+    result.text_analysis = TextAnalysisResult(word_count=1000)
+    catalog.upsert(LibraryCatalog.entry_from_result('abc', 'wp.epub', '/lib/abc', 10, result))
+
+    entry = catalog.get('abc')
+    assert entry.author == 'Толстой'
+    assert entry.word_count == 1000
+    assert catalog.count() == 1
+
+
+def test_query_filters(tmp_path):
+    """Фильтры по автору, языку и дате работают вместе."""
+    catalog = make_catalog(tmp_path, [
+        ('Pushkin', 'ru', '1833'),
+        ('pushkin', 'ru', '1837-01-29'),
+        ('Austen', 'en', '1813'),
+    ])
+
+    assert catalog.count(author='PUSHKIN') == 2
+    assert [e.publication_date for e in catalog.query(language='ru', date_to='1835')] == ['1833']
+    assert [e.author for e in catalog.query(date_from='1830', order_by='publication_date')] == ['Pushkin', 'pushkin']
+    assert catalog.count(title='Книга 2') == 1
+
+
+def test_filters_use_indexes(tmp_path):
+    """Частые фильтры не требуют полного просмотра таблицы."""
+    catalog = make_catalog(tmp_path)
+    conn = catalog._connection()
+    for where in ("author = 'x'", "language = 'ru'", "publication_date >= '2000'"):
+        plan = ' '.join(str(row) for row in conn.execute(f"EXPLAIN QUERY PLAN SELECT * FROM books WHERE {where}"))
+        assert 'USING INDEX' in plan
+
+
+def test_vocabulary_union_by_series_and_old_catalog(tmp_path):
+    """Словари книг серии объединяются без двойного счета; каталог старой схемы получает новые колонки."""
+    import sqlite3
+
+    library = tmp_path / 'library'
+    library.mkdir()
+    old = sqlite3.connect(str(library / LibraryCatalog.filename))
+    old.execute("CREATE TABLE books (fingerprint TEXT PRIMARY KEY, name TEXT NOT NULL, path TEXT NOT NULL, "
+                "size INTEGER NOT NULL, title TEXT, author TEXT, language TEXT, publisher TEXT, publication_date TEXT, "
+                "description TEXT, word_count INTEGER, char_count INTEGER, sentence_count INTEGER, "
+                "paragraph_count INTEGER, toc_entries INTEGER, image_count INTEGER, added_at REAL NOT NULL)")
+    old.commit()
+    old.close()
+
+    catalog = LibraryCatalog.for_library(str(library))
+    analyzer = TextAnalyzer(vocabulary_precision=14)
+    vocabularies = [range(0, 6000), range(3000, 9000), range(20000, 21000)]
+    for i, (words, series) in enumerate(zip(vocabularies, ['Хроники', 'Хроники', None])):
+        analysis = analyzer.analyze_text(' '.join(f"слово{n}" for n in words))
+        result = SimpleNamespace(metadata=EpubMetadata(author='Автор', series=series or ""), text_analysis=analysis,
+                                 toc=None, image_extraction=None)
+        catalog.upsert(LibraryCatalog.entry_from_result(f'{i:064x}', f'{i}.epub', f'/lib/{i}', 10, result))
+        catalog.upsert_vocabulary(f'{i:064x}', TextAnalyzer.vocabulary_sketch(analysis))
+
+    assert abs(catalog.get(f'{0:064x}').vocabulary - 6000) < 6000 * 0.03
+    estimate = catalog.vocabulary(series='Хроники')
+    assert estimate.books == 2 and abs(estimate.distinct_words - 9000) < 9000 * 3 * estimate.relative_error
+    assert catalog.vocabulary(author='Автор').books == 3
+    assert catalog.vocabulary(language='fr') == VocabularyEstimate(0, 0, 0.0)
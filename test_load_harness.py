@@ -0,0 +1,55 @@
+import threading
+import time
+
+from epub_synth import SynthSpec
+from load_harness import LoadHarness, percentile, synthetic_corpus
+
+
+def test_percentile_nearest_rank():
+    """Перцентили считаются методом ближайшего ранга."""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 99) == 3.0
+    assert percentile([], 50) == 0.0
+
+
+def test_closed_loop_limits_concurrency_and_reports_failures():
+    """Закрытая нагрузка держит не больше concurrency книг и учитывает ошибки отдельно."""
+    state = {'active': 0, 'max_active': 0}
+    lock = threading.Lock()
+
+    def handler(path, workdir, key, stages):
+        with lock:
+            state['active'] += 1
+            state['max_active'] = max(state['max_active'], state['active'])
+        time.sleep(0.02)
+        with lock:
+            state['active'] -= 1
+        if path == 'broken.epub':
+            raise RuntimeError('битый архив')
+        return {'extract_text': {'queue_wait': 0.001, 'run_time': 0.02, 'cpu_time': 0.01}}
+
+    books = ['a.epub', 'b.epub', 'broken.epub', 'c.epub', 'd.epub', 'e.epub']
+    report = LoadHarness(books, concurrency=2, handler=handler).run()
+
+    assert state['max_active'] <= 2
+    assert report.books == 6 and report.failed == 1
+    assert report.failures == ['broken.epub: битый архив']
+    assert 0.015 < report.latency_p50 < 0.5
+    assert report.stages['extract_text'].runs == 5
+    assert abs(report.stages['extract_text'].cpu_share - 0.5) < 1e-9
+    assert report.peak_rss_mb > 0
+
+
+def test_open_loop_on_synthetic_corpus(tmp_path):
+    """Открытая нагрузка на синтетическом корпусе собирает метрики этапов EpubProcessor."""
+    books = synthetic_corpus(str(tmp_path / 'corpus'), 2, SynthSpec(chapters=2, words_per_chapter=100, images=0))
+    report = LoadHarness(books * 2, concurrency=2, arrival_rate=50, stages=['metadata', 'text_analysis'],
+                         workdir=str(tmp_path / 'work')).run()
+
+    assert report.mode == 'open' and report.failed == 0
+    assert report.books_per_second > 0
+    assert set(report.stages) == {'extract_metadata', 'extract_text', 'analyze_text'}
+    assert report.latency_p99 >= report.latency_p50 > 0
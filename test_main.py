@@ -52,6 +52,7 @@ def mock_processor():
         mock_metadata_extractor_instance.extract_date.return_value = "2023-01-01"
         mock_metadata_extractor_instance.extract_language.return_value = "ru"
         mock_metadata_extractor_instance.extract_description.return_value = "Это описание тестовой книги."
+        mock_metadata_extractor_instance.extract_series.return_value = "Тестовая серия"
 
         yield processor
 
@@ -139,13 +140,14 @@ def test_process_metadata_parallel(mock_processor):
     metadata_results = mock_processor.process_metadata_parallel()
 
     assert isinstance(metadata_results, dict)
-    assert len(metadata_results) == 6 # Ожидаем результаты для всех 6 полей
+    assert len(metadata_results) == 7 # Ожидаем результаты для всех 7 полей
     assert metadata_results['title'] == "Тестовая Книга"
     assert metadata_results['author'] == "Тест Авторович"
     assert metadata_results['publisher'] == "Тест Издательство"
     assert metadata_results['date'] == "2023-01-01"
     assert metadata_results['language'] == "ru"
     assert metadata_results['description'] == "Это описание тестовой книги."
+    assert metadata_results['series'] == "Тестовая серия"
 
     # Проверяем, что методы экстрактора метаданных были вызваны
     mock_processor.metadata_extractor.extract_title.assert_called_once()
@@ -153,4 +155,5 @@ def test_process_metadata_parallel(mock_processor):
     mock_processor.metadata_extractor.extract_publisher.assert_called_once()
     mock_processor.metadata_extractor.extract_date.assert_called_once()
     mock_processor.metadata_extractor.extract_language.assert_called_once()
-    mock_processor.metadata_extractor.extract_description.assert_called_once() 
\ No newline at end of file
+    mock_processor.metadata_extractor.extract_description.assert_called_once()
+    mock_processor.metadata_extractor.extract_series.assert_called_once() 
\ No newline at end of file
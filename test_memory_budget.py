@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+import zipfile
+
+import events
+import main
+from epub_synth import generate_epub
+from memory_budget import MemoryBudget
+from text_analyzer import TextAnalyzer
+
+
+def test_stream_analysis_matches_full_text():
+    """Потоковый анализ дает ту же статистику, что и анализ собранного текста."""
+    documents = ['Первый абзац. Второе предложение', '', 'без точки и слово!', 'Слово в конце?..']
+    text = '\n'.join(documents)
+    chunks = []
+    for index, document in enumerate(documents):
+        chunks += ['\n'] * bool(index) + [document]
+
+    full = TextAnalyzer().analyze_text(text, 'слово')
+    streamed = TextAnalyzer().analyze_stream(chunks, 'слово')
+
+    for name in ('word_count', 'char_count', 'sentence_count', 'paragraph_count', 'search_word_frequency'):
+        assert getattr(streamed, name) == getattr(full, name), name
+
+
+def test_budget_mode_streams_text_and_reports_degradations(tmp_path):
+    """В режиме бюджета текст не собирается целиком, а вынужденные пути попадают в отчет."""
+    epub_path = generate_epub(str(tmp_path / 'big.epub'), chapters=4, words_per_chapter=400,
+                              images=3, image_size=(64, 64))
+    regular = main.EpubProcessor(epub_path, 'книга', str(tmp_path / 'lib1'), str(tmp_path / 'out1'))
+    regular.process_parallel(['text_analysis', 'keyword_search'])
+
+    # Бюджет изображений меньше одного изображения: они обрабатываются строго по одному
+    budget = MemoryBudget(limit_mb=1, image_share=0.01)
+    processor = main.EpubProcessor(epub_path, 'книга', str(tmp_path / 'lib2'), str(tmp_path / 'out2'),
+                                   memory_budget=budget)
+    result = processor.process_parallel()
+
+    assert 'extract_text' not in result.thread_statuses
+    assert result.text_analysis.word_count == regular.result.text_analysis.word_count
+    assert result.text_analysis.sentence_count == regular.result.text_analysis.sentence_count
+    assert result.keyword_search.match_count == regular.result.keyword_search.match_count
+    assert len(result.image_extraction.grayscale_image_paths) == 3
+    assert any(note.startswith('search_keywords:') for note in result.degraded)
+    assert any('больше бюджета' in note for note in result.degraded)
+    assert processor.build_report()['degraded'] == result.degraded
+    assert result.execution_times['peak_rss_mb'] > 0
+
+
+def test_image_slots_limit_decoded_pixels():
+    """Одновременно декодируются только изображения, помещающиеся в бюджет."""
+    budget = MemoryBudget(limit_mb=1, image_share=1.0)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def decode():
+        # 200x200 RGBA x2 = 320 000 байт: в 1 МБ помещаются три таких изображения
+        with budget.image_slot(200, 200, 'page.png'):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=decode) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 3
+    assert any('ограничено бюджетом' in note for note in budget.degraded)
+
+
+def test_corrupt_image_under_budget_does_not_stop_stage(tmp_path):
+    """Испорченное изображение в режиме бюджета дает предупреждение, остальные изображения обрабатываются."""
+    source = generate_epub(str(tmp_path / 'source.epub'), chapters=2, words_per_chapter=50,
+                           images=2, image_size=(32, 32))
+    epub_path = str(tmp_path / 'corrupt.epub')
+    with zipfile.ZipFile(source) as original, zipfile.ZipFile(epub_path, 'w') as corrupt:
+        for info in original.infolist():
+            data = original.read(info)
+            corrupt.writestr(info, b'not an image' if info.filename == 'OPS/images/image1.png' else data)
+
+    for mode in ('parallel', 'async'):
+        problems = []
+        processor = main.EpubProcessor(epub_path, 'книга', str(tmp_path / f'lib-{mode}'),
+                                       str(tmp_path / f'out-{mode}'), memory_budget=MemoryBudget(limit_mb=64))
+        with events.subscribed(lambda event: isinstance(event, events.Problem) and problems.append(event)):
+            if mode == 'parallel':
+                result = processor.process_parallel(['images'])
+            else:
+                result = asyncio.run(processor.process_async(stages=['images']))
+
+        assert result.thread_statuses['extract_images'] == "Изображения успешно извлечены и преобразованы", mode
+        assert any(path.endswith('image2.jpg') for path in result.image_extraction.grayscale_image_paths), mode
+        assert any(event.level == 'warning' and event.item.endswith('image1.png') for event in problems), mode
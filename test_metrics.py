@@ -0,0 +1,57 @@
+from batch_runner import BatchRunner
+from epub_synth import generate_epub
+from main import EpubProcessor
+from metrics import MetricsRegistry, ProcessingMetrics
+
+
+def test_registry_renders_prometheus_text_and_merges():
+    """Счетчики и гистограммы выводятся в текстовом формате Prometheus и складываются между реестрами."""
+    registry = MetricsRegistry()
+    errors = registry.counter("errors_total", "Ошибки", ("stage",))
+    latency = registry.histogram("latency_seconds", "Задержка", buckets=(0.1, 1.0))
+    errors.inc(stage='extract "text"')
+    latency.observe(0.05)
+    latency.observe(0.5)
+
+    other = MetricsRegistry()
+    other.counter("errors_total", "Ошибки", ("stage",))
+    other.histogram("latency_seconds", "Задержка", buckets=(0.1, 1.0))
+    other.merge(registry.snapshot())
+    other.merge(registry.snapshot())
+
+    text = other.render()
+    assert '# TYPE errors_total counter' in text
+    assert 'errors_total{stage="extract \\"text\\""} 2' in text
+    assert 'latency_seconds_bucket{le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+    assert 'latency_seconds_count 4' in text
+
+
+def test_processing_metrics_from_events(tmp_path):
+    """Метрики обработки книги собираются из событий: этапы, байты, изображения, кэш библиотеки."""
+    book = generate_epub(tmp_path / 'book.epub', chapters=2, words_per_chapter=40, images=1, image_size=(16, 16))
+    with ProcessingMetrics() as collected:
+        for _ in range(2):
+            EpubProcessor(book, None, str(tmp_path / 'library'), str(tmp_path / 'out')).process_parallel(
+                ['text_analysis', 'images', 'library_save_path'])
+
+    assert collected.books.value(status="done") == 2
+    assert collected.stage_duration.count(stage='extract_text') == 2
+    assert collected.bytes.value(stage='extract_text') > 0
+    assert collected.images.value(transform='grayscale', status="ok") == 2
+    assert collected.cache.value(cache="library", result="hit") == 1
+
+
+def test_batch_writes_textfile(tmp_path):
+    """Пакет собирает метрики рабочих процессов и пишет их в textfile."""
+    books = [generate_epub(tmp_path / f'book{i}.epub', chapters=1, words_per_chapter=30, images=0, seed=i)
+             for i in range(2)]
+    textfile = tmp_path / 'metrics' / 'epub.prom'
+    runner = BatchRunner(workers=2, library_dir=str(tmp_path / 'library'), output_root=str(tmp_path / 'out'),
+                         stages=['metadata'], metrics_textfile=str(textfile), progress=False)
+    runner.run(books)
+
+    text = textfile.read_text(encoding='utf-8')
+    assert 'epub_books_processed_total{status="done"} 2' in text
+    assert 'epub_stage_duration_seconds_count{stage="extract_metadata"} 2' in text
+    assert 'epub_batch_last_run_timestamp_seconds' in text
@@ -0,0 +1,51 @@
+import random
+
+from epub_synth import generate_epub
+from library_catalog import LibraryCatalog
+from main import EpubProcessor
+from minhash import MinHasher, jaccard
+
+
+def test_signature_same_with_and_without_numpy_and_by_chunks():
+    """Подпись не зависит от наличия numpy и от деления текста на фрагменты; сходство оценивается верно."""
+    rng = random.Random(0)
+    words = [f"слово{rng.randrange(3000)}" for _ in range(5000)]
+    hasher = MinHasher()
+    signature = hasher.signature(words)
+
+    minhash = hasher.new()
+    for start in range(0, len(words), 333):
+        minhash.update(words[start:start + 333])
+    assert minhash.digest() == signature
+
+    pure = MinHasher()
+    pure.np = None
+    assert pure.signature(words) == signature
+    assert pure.signature(words[:3]) == hasher.signature(words[:3]) != []
+
+    edited = list(words)
+    for index in rng.sample(range(len(words)), 50):
+        edited[index] = "правка"
+    assert jaccard(signature, hasher.signature(edited)) > 0.7
+    assert jaccard(signature, hasher.signature(words[::-1])) < 0.1
+
+
+def test_catalog_finds_other_edition_of_same_text(tmp_path):
+    """Другое издание того же текста находится через LSH индекс каталога, другая книга - нет."""
+    library = str(tmp_path / 'library')
+    books = [generate_epub(tmp_path / 'a.epub', chapters=3, words_per_chapter=300, images=0, seed=1),
+             generate_epub(tmp_path / 'b.epub', chapters=3, words_per_chapter=300, images=0, seed=1,
+                           title="Другое издание"),
+             generate_epub(tmp_path / 'c.epub', chapters=3, words_per_chapter=300, images=0, seed=2)]
+    fingerprints = []
+    for book in books:
+        processor = EpubProcessor(book, None, library, str(tmp_path / 'out'))
+        processor.process_parallel(['text_analysis', 'library'])
+        assert len(processor.result.text_analysis.minhash) == 128
+        fingerprints.append(processor.result.fingerprint)
+
+    catalog = LibraryCatalog.for_library(library)
+    pairs = catalog.duplicates()
+    assert [(pair.first, pair.second) for pair in pairs] == [tuple(sorted(fingerprints[:2]))]
+    similar = catalog.similar(catalog.signature(fingerprints[0]), fingerprint=fingerprints[0])
+    assert [pair.second for pair in similar] == [fingerprints[1]]
@@ -0,0 +1,53 @@
+import os
+import pstats
+import time
+
+import pytest
+
+import main
+from profiling import StageProfiler
+from test_translation import build_epub
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+def test_cprofile_writes_pstats_and_collapsed_per_stage(tmp_path):
+    """Режим cprofile пишет .pstats и .collapsed для каждого этапа с именем книги."""
+    epub_path = build_epub(tmp_path / 'novel.epub', [('Глава 1', 'Первое слово. ' * 50)])
+    profiler = StageProfiler('cprofile', str(tmp_path / 'profiles'), 'novel')
+    processor = main.EpubProcessor(epub_path, None, str(tmp_path / 'library'), str(tmp_path / 'out'),
+                                   profiler=profiler)
+
+    processor.process_parallel(['metadata', 'text_analysis'])
+    files = profiler.close()
+
+    names = sorted(os.path.basename(path) for path in files)
+    assert names == sorted(f"novel.{stage}.{ext}" for stage in ('extract_metadata', 'extract_text', 'analyze_text')
+                           for ext in ('pstats', 'collapsed'))
+    stats = pstats.Stats(str(tmp_path / 'profiles' / 'novel.analyze_text.pstats'))
+    assert any(name == 'analyze_text' for _, _, name in stats.stats)
+    collapsed = (tmp_path / 'profiles' / 'novel.analyze_text.collapsed').read_text(encoding='utf-8')
+    assert 'analyze_text' in collapsed
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in collapsed.splitlines())
+
+
+def test_sampling_collects_stacks_of_running_stage(tmp_path):
+    """Режим sampling собирает стеки только внутри профилируемого этапа."""
+    profiler = StageProfiler('sampling', str(tmp_path), 'book', interval=0.001)
+    profiler.wrap('busy_stage', busy)(0.2)
+    files = profiler.close()
+
+    assert [os.path.basename(path) for path in files] == ['book.busy_stage.collapsed']
+    lines = (tmp_path / 'book.busy_stage.collapsed').read_text(encoding='utf-8').splitlines()
+    assert lines and all(line.startswith('busy (test_profiling.py') for line in lines)
+    assert sum(int(line.rsplit(' ', 1)[1]) for line in lines) > 10
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    """Неизвестный режим профилирования отклоняется сразу."""
+    with pytest.raises(ValueError):
+        StageProfiler('perf', str(tmp_path))
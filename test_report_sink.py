@@ -0,0 +1,83 @@
+import os
+import json
+
+from batch_runner import BatchRunner
+from epub_synth import generate_epub
+from main import EpubProcessor
+from report_sink import ReportAggregator, ReportSink, iter_reports, select_fields
+
+
+def test_sink_selects_fields_and_aggregator_streams(tmp_path):
+    """Сжатый NDJSON хранит только выбранные поля, агрегатор считает статистику по строкам."""
+    path = str(tmp_path / 'reports.ndjson.gz')
+    reports = [
+        {'epub_path': f'{i}.epub', 'ok': i != 2, 'metadata': {'title': f'Книга {i}', 'language': 'ru' if i else 'en'},
+         'text_analysis': {'word_count': 100 * (i + 1), 'char_count': 1}}
+        for i in range(3)
+    ]
+    with ReportSink(path, fields=['ok', 'metadata.language', 'text_analysis.word_count']) as sink:
+        for report in reports[:2]:
+            sink.write(report)
+    with ReportSink(path, fields=['ok', 'metadata.language', 'text_analysis.word_count']) as sink:
+        sink.write(reports[2])
+
+    lines = list(iter_reports(path))
+    assert lines[0] == {'epub_path': '0.epub', 'ok': True, 'metadata': {'language': 'en'},
+                        'text_analysis': {'word_count': 100}}
+    assert select_fields(reports[0], ['missing.field']) == {'epub_path': '0.epub'}
+
+    aggregator = ReportAggregator()
+    summary = aggregator.add_all(lines)
+    words = summary.numeric['text_analysis.word_count']
+    assert (summary.books, summary.failed) == (3, 1)
+    assert (words.mean, words.min, words.max, words.total) == (200, 100, 300, 600)
+    assert abs(words.stddev - 100) < 1e-9
+    assert aggregator.to_dict()['categories']['metadata.language'] == {'ru': 2, 'en': 1}
+
+
+
+def test_flushed_gzip_lines_survive_crash(tmp_path):
+    """Сброшенные строки .gz читаются из файла, оборванного сбоем посреди следующей записи."""
+    path = str(tmp_path / 'reports.ndjson.gz')
+    sink = ReportSink(path)
+    for i in range(3):
+        sink.write({'epub_path': f'{i}.epub'})
+    sink.flush()
+    snapshot = open(path, 'rb').read()  # Состояние файла при падении процесса: gzip-член не закрыт
+    sink.close()
+
+    crashed = str(tmp_path / 'crashed.ndjson.gz')
+    for tail in (b'', b'\x00garbage'):
+        with open(crashed, 'wb') as f:
+            f.write(snapshot + tail)
+        assert [line['epub_path'] for line in iter_reports(crashed)] == ['0.epub', '1.epub', '2.epub']
+
+def test_batch_streams_one_line_per_book(tmp_path):
+    """Пакет дописывает строку на каждую книгу, включая книги с ошибками."""
+    books = [generate_epub(tmp_path / f'book{i}.epub', chapters=1, words_per_chapter=50, images=0, seed=i)
+             for i in range(2)]
+    (tmp_path / 'broken.epub').write_bytes(b'not a zip')
+    books.append(str(tmp_path / 'broken.epub'))
+    stream = str(tmp_path / 'reports.ndjson')
+
+    runner = BatchRunner(workers=2, library_dir=str(tmp_path / 'library'), output_root=str(tmp_path / 'out'),
+                         report_stream=stream, report_fields=['text_analysis.word_count'], progress=False)
+    summary = runner.run(books)
+
+    lines = sorted(iter_reports(stream), key=lambda line: line['epub_path'])
+    assert [line['ok'] for line in lines] == [True, True, False]
+    assert lines[0]['text_analysis']['word_count'] > 0
+    assert set(lines[0]) == {'epub_path', 'text_analysis', 'ok', 'error', 'elapsed'}
+    assert all(outcome.report is None for outcome in summary.outcomes)
+
+
+def test_default_report_path_is_per_book(tmp_path):
+    """Отчет по умолчанию пишется рядом с книгой, а не в общий output_report.json."""
+    book = generate_epub(tmp_path / 'book.epub', chapters=1, words_per_chapter=20, images=0)
+    processor = EpubProcessor(book, None, str(tmp_path / 'library'))
+    processor.process_parallel(['metadata'])
+    processor.save_results(compact=True)
+
+    with open(tmp_path / 'book.report.json', encoding='utf-8') as f:
+        assert json.load(f)['metadata']['title']
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.tmp')] == []
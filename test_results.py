@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+import main
+import text_analyzer
+import toc_generator
+from batch_journal import decode_value, encode_value
+from bench_results import run_results_benchmark
+from results import EpubMetadata, ProcessingResult, TextAnalysisResult, TocEntry, TocResult
+
+
+def test_single_definition_shared_by_modules():
+    """main и модули этапов используют одни и те же классы результатов; в них нельзя дописать чужой атрибут."""
+    assert main.TextAnalysisResult is text_analyzer.TextAnalysisResult is TextAnalysisResult
+    assert main.TocResult is toc_generator.TocResult is TocResult
+    result = TextAnalysisResult()
+    assert not hasattr(result, '__dict__')
+    with pytest.raises(AttributeError):
+        result.unknown = 1
+
+
+def test_to_dict_from_dict_round_trip_with_nesting():
+    """to_dict дает JSON-совместимый словарь; from_dict восстанавливает вложенные результаты."""
+    toc = TocResult(entries=[TocEntry("Глава 1", "ch1.xhtml", 1, children=[TocEntry("1.1", "ch1.xhtml#a", 2)],
+                                      num_children=1)], count=2)
+    result = ProcessingResult(metadata=EpubMetadata(title="Книга"), text_analysis=TextAnalysisResult(word_count=5),
+                              toc=toc, critical_path=['extract_metadata'])
+    data = json.loads(json.dumps(result.to_dict()))
+    assert data['toc']['entries'][0]['children'][0]['title'] == "1.1"
+    restored = ProcessingResult.from_dict({**data, 'unknown': 1})
+    assert restored == result
+    assert isinstance(restored.toc.entries[0].children[0], TocEntry)
+    assert decode_value(encode_value(toc)) == toc
+
+
+def test_slotted_results_use_less_memory():
+    """Замер памяти: результат со slots не больше обычного dataclass с теми же полями."""
+    report = run_results_benchmark(count=2000, codec_count=200, only=['TextAnalysisResult', 'CatalogEntry'])
+    assert [result.name for result in report.memory] == ['TextAnalysisResult', 'CatalogEntry']
+    assert all(result.slotted < result.plain for result in report.memory)
+    assert [result.name for result in report.codec] == ['TextAnalysisResult']
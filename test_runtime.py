@@ -0,0 +1,49 @@
+import threading
+
+from epub_synth import generate_epub
+from main import EpubProcessor
+from runtime import BudgetedExecutor, Runtime
+from stage_scheduler import Resource, Stage, StageScheduler
+
+
+def test_nested_run_all_does_not_deadlock():
+    """Вложенный run_all в пуле из одного потока выполняется вызывающим потоком, а не зависает."""
+    pool = BudgetedExecutor("cpu", 1)
+    try:
+        def outer(i):
+            return sum(future.result() for future in pool.run_all([lambda j=j: i * 10 + j for j in range(3)]))
+
+        futures = pool.run_all([lambda i=i: outer(i) for i in range(3)])
+        assert [future.result() for future in futures] == [3, 33, 63]
+        stats = pool.stats()
+        assert stats.caller_runs > 0
+        assert stats.queued == 0 and stats.running == 0
+        assert stats.submitted == stats.completed == 12
+    finally:
+        pool.shutdown()
+
+
+def test_scheduler_keeps_shared_pools_and_books_reuse_them(tmp_path):
+    """Планировщик не завершает общие пулы; книги обрабатываются в одних и тех же потоках."""
+    runtime = Runtime(io_workers=2, cpu_workers=2)
+    try:
+        threads = set()
+        stages = [Stage('read', lambda: threads.add(threading.current_thread().name), resource=Resource.IO),
+                  Stage('work', lambda: threads.add(threading.current_thread().name), resource=Resource.CPU_HEAVY)]
+        for _ in range(2):
+            result = StageScheduler(stages, executors=runtime.executors()).run()
+            assert {run.status for run in result.runs.values()} == {"done"}
+        assert all(name.startswith("runtime-") for name in threads)
+
+        for i in range(2):
+            book = generate_epub(tmp_path / f'book{i}.epub', chapters=2, words_per_chapter=30, images=1,
+                                 image_size=(16, 16), seed=i)
+            processor = EpubProcessor(book, None, str(tmp_path / 'library'), str(tmp_path / f'out{i}'), runtime=runtime)
+            processor.process_parallel(['images', 'metadata'])
+            assert len(processor.result.image_extraction.grayscale_image_paths) == 1
+
+        stats = runtime.stats()
+        assert stats['cpu'].submitted > 0 and stats['io'].submitted > 0
+        assert threading.active_count() < 20
+    finally:
+        runtime.shutdown()
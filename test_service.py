@@ -0,0 +1,129 @@
+import json
+import threading
+import http.client
+
+import pytest
+
+from epub_synth import generate_epub
+from service import JobService, ServiceOverloaded, make_server
+
+
+@pytest.fixture
+def server(tmp_path):
+    service = JobService(str(tmp_path / 'library'), str(tmp_path / 'out'), upload_dir=str(tmp_path))
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=30)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_jobs_by_path_and_by_upload(server, tmp_path):
+    """Книга обрабатывается по пути и по присланным байтам; ответ - JSON отчет."""
+    book = generate_epub(tmp_path / 'book.epub', chapters=2, words_per_chapter=40, images=0)
+    status, result = request(server, "POST", "/jobs", json.dumps({'path': book, 'stages': ['metadata']}),
+                             {"Content-Type": "application/json"})
+    assert status == 200 and result['ok']
+    assert result['report']['metadata']['title']
+    first_job = result['job']
+
+    with open(book, 'rb') as f:
+        status, result = request(server, "POST", "/jobs?stages=text_analysis,images&name=book.epub&keep=1", f.read(),
+                                 {"Content-Type": "application/epub+zip"})
+    assert status == 200 and result['report']['text_analysis']['word_count'] > 0
+    assert result['job'] != first_job
+    assert [name for name in tmp_path.iterdir() if name.name.startswith('upload-')] == []
+    # Каталог сохраняется только по запросу; остальные задания не оставляют файлов
+    assert [path.name for path in (tmp_path / 'out').iterdir()] == [f"job-{result['job']}"]
+    assert result['output_dir'] == str(tmp_path / 'out' / f"job-{result['job']}")
+    for _ in range(2):
+        with open(book, 'rb') as f:
+            status, _ = request(server, "POST", "/jobs?stages=library&name=../dir/book.epub", f.read(),
+                                {"Content-Type": "application/epub+zip"})
+        assert status == 200
+    # Загрузки попадают в библиотеку под именем клиента, а не временного файла
+    with open(tmp_path / 'library' / 'manifest.json', encoding='utf-8') as f:
+        assert list(json.load(f)) == ['book.epub']
+
+    status, result = request(server, "POST", "/jobs", json.dumps({'path': book, 'stages': ['nope']}),
+                             {"Content-Type": "application/json"})
+    assert status == 400
+    status, health = request(server, "GET", "/health")
+    assert status == 200 and health['completed'] == 4 and health['active'] == 0
+
+    connection = http.client.HTTPConnection(*server.server_address, timeout=30)
+    connection.request("GET", "/metrics")
+    metrics = connection.getresponse().read().decode('utf-8')
+    connection.close()
+    assert 'epub_service_jobs_total{result="completed"} 4' in metrics
+    assert 'epub_pool_workers{pool="cpu"}' in metrics
+
+
+def test_admission_control_rejects_over_capacity(tmp_path):
+    """Сверх слотов и очереди задания отклоняются, а не накапливаются."""
+    book = tmp_path / 'book.epub'
+    book.write_bytes(b'book')
+    release = threading.Event()
+    started = threading.Event()
+
+    def handler(*args):
+        started.set()
+        release.wait(5)
+        return {'ok': True}
+
+    service = JobService(str(tmp_path / 'library'), None, max_concurrent=1, max_queued=0, handler=handler)
+    worker = threading.Thread(target=service.run, args=(str(book),))
+    worker.start()
+    started.wait(5)
+    with pytest.raises(ServiceOverloaded):
+        service.run(str(book))
+    release.set()
+    worker.join()
+    assert service.run(str(book))['ok']
+    assert (service.stats.completed, service.stats.rejected) == (2, 1)
+
+
+def test_overloaded_upload_is_rejected_before_reading_body(tmp_path):
+    """При перегрузке 503 отправляется сразу, не дожидаясь тела запроса."""
+    release = threading.Event()
+    started = threading.Event()
+
+    def handler(*args):
+        started.set()
+        release.wait(5)
+        return {'ok': True}
+
+    book = tmp_path / 'book.epub'
+    book.write_bytes(b'book')
+    service = JobService(str(tmp_path / 'library'), None, max_concurrent=1, max_queued=0, handler=handler)
+    server = make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    worker = threading.Thread(target=service.run, args=(str(book),))
+    worker.start()
+    try:
+        started.wait(5)
+        connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+        connection.putrequest("POST", "/jobs?name=book.epub")
+        connection.putheader("Content-Type", "application/epub+zip")
+        connection.putheader("Content-Length", str(100 * 1024 * 1024))
+        connection.endheaders()  # Тело так и не отправляется
+        response = connection.getresponse()
+        assert response.status == 503 and response.getheader("Retry-After") == "1"
+        connection.close()
+    finally:
+        release.set()
+        worker.join()
+        server.shutdown()
+        server.server_close()
+    assert (service.stats.waiting, service.stats.rejected) == (0, 1)
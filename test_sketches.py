@@ -0,0 +1,111 @@
+import random
+from collections import Counter
+
+from epub_synth import generate_epub
+from library_catalog import LibraryCatalog
+from main import EpubProcessor
+import numpy as np
+
+from sketches import CountMinSketch, HyperLogLog, NgramStats, SpaceSaving, _hll_bit_length
+
+
+def _zipf_words(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [f"слово{int(rng.paretovariate(1.1))}" for _ in range(count)]
+
+
+def test_space_saving_bounds_and_merge_of_chapters():
+    """Оценки Space-Saving ограничивают истинную частоту; сводки глав дают тот же top, что и весь текст."""
+    words = _zipf_words(30000)
+    exact = Counter(words)
+    chapters = [SpaceSaving(64) for _ in range(3)]
+    for index, summary in enumerate(chapters):
+        summary.update(Counter(words[index * 10000:(index + 1) * 10000]))
+    merged = SpaceSaving(64)
+    for summary in chapters:
+        merged.merge(summary)
+    assert merged.total == len(words)
+    for hitter in merged.top(64):
+        assert hitter.lower <= exact[hitter.item] <= hitter.count
+    assert [hitter.item for hitter in merged.top(5)] == [item for item, _ in exact.most_common(5)]
+    assert SpaceSaving.from_dict(merged.to_dict()).top(10) == merged.top(10)
+
+
+def test_count_min_sketch_same_without_numpy_and_round_trip():
+    """Count-min sketch не занижает частоты, без numpy считает так же, n-граммы переживают сериализацию."""
+    words = _zipf_words(5000, seed=1)
+    counts = Counter(words)
+    sketch, pure = CountMinSketch(width=1 << 10), CountMinSketch(width=1 << 10)
+    pure.np = None
+    pure.table = [[0] * pure.width for _ in range(pure.depth)]
+    sketch.update(counts)
+    pure.update(counts)
+    for item, count in counts.items():
+        assert count <= sketch.estimate(item) == pure.estimate(item) <= count + sketch.error_bound * 2
+
+    stats = NgramStats(width=1 << 10)
+    stats.update(words)
+    restored = NgramStats.from_bytes(stats.to_bytes())
+    assert restored.top(2, 5) == stats.top(2, 5)
+    assert restored.estimate(' '.join(words[:3])) >= 1
+    summaries = NgramStats.from_bytes(stats.to_bytes(with_sketch=False))
+    assert summaries.sketch is None and summaries.top(1, 5) == stats.summaries[1].top(5)
+
+
+def test_library_statistics_merge_books_once(tmp_path):
+    """Каталог складывает статистику книг в статистику библиотеки; повторное добавление книги не удваивает ее."""
+    library = str(tmp_path / 'library')
+    books = [generate_epub(tmp_path / f'{seed}.epub', chapters=3, words_per_chapter=300, images=0, seed=seed)
+             for seed in (1, 2)]
+    totals = []
+    for book in books + books[:1]:
+        processor = EpubProcessor(book, None, library, str(tmp_path / 'out'))
+        processor.process_parallel(['ngrams', 'library'])
+        assert processor.result.ngrams.words and processor.result.ngrams.trigrams
+        totals.append(processor.result.ngrams.total_words)
+
+    catalog = LibraryCatalog.for_library(library)
+    stats = catalog.library_ngrams()
+    assert stats.summaries[1].total == totals[0] + totals[1]
+    top_word = processor.result.ngrams.words[0]
+    assert stats.estimate(top_word.item) >= top_word.count
+    assert catalog.book_ngrams(processor.result.fingerprint).sketch is None
+
+
+def test_hyperloglog_error_and_union():
+    """HyperLogLog укладывается в заявленную ошибку, без numpy дает те же регистры, объединение = словарь суммы."""
+    first, second = HyperLogLog(), HyperLogLog()
+    first.update(f"слово{n}" for n in range(50000))
+    second.update(f"слово{n}" for n in range(30000, 80000))
+    pure = HyperLogLog()
+    pure.np = None
+    pure.update(f"слово{n}" for n in range(50000))
+    assert pure.registers == first.registers
+    assert abs(first.estimate() - 50000) < 50000 * 3 * first.relative_error
+
+    first.merge(second)
+    restored = HyperLogLog.from_bytes(first.to_bytes(compress=True))
+    assert HyperLogLog.from_bytes(first.to_bytes()).registers == restored.registers
+    assert abs(restored.estimate() - 80000) < 80000 * 3 * restored.relative_error
+    assert HyperLogLog().estimate() == 0
+
+
+def test_hyperloglog_low_precision_matches_pure_python():
+    """При p < 11 рангам нужно больше 53 бит: numpy путь совпадает с int.bit_length и циклом Python."""
+    edges = [0, 1, (1 << 53) - 1, 1 << 53, (1 << 54) - 1, (1 << 60) - 1, (1 << 64) - 1]
+    assert _hll_bit_length(np, np.array(edges, dtype=np.uint64)).tolist() == [value.bit_length() for value in edges]
+    for p in (4, 10):
+        fast, pure = HyperLogLog(p), HyperLogLog(p)
+        pure.np = None
+        fast.update(f"слово{n}" for n in range(5000))
+        pure.update(f"слово{n}" for n in range(5000))
+        assert fast.registers == pure.registers
+
+
+def test_ngrams_same_in_full_and_streaming_modes(tmp_path):
+    """N-граммы собранного текста считаются по главам, как в потоковом режиме, и не пересекают их границы."""
+    book = generate_epub(tmp_path / 'book.epub', chapters=4, words_per_chapter=200, images=0)
+    processor = EpubProcessor(book, None, str(tmp_path / 'library'), str(tmp_path / 'out'))
+    full = processor.analyze_ngrams(processor.text_extractor.extract_text(book))
+    streamed = processor.analyze_ngrams_streaming()
+    assert full == streamed
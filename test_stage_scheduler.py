@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+from stage_scheduler import Stage, StageScheduler, Resource
+
+
+def sleeper(seconds, value=None):
+    def run(**kwargs):
+        time.sleep(seconds)
+        return value
+    return run
+
+
+def test_independent_stages_do_not_wait_for_text():
+    """Независимые этапы стартуют сразу, а зависимые - как только готовы входы."""
+    stages = [
+        Stage('extract_text', sleeper(0.1, 'текст'), outputs=('text',)),
+        Stage('analyze_text', lambda text: len(text), inputs=('text',), outputs=('stats',), resource=Resource.CPU),
+        Stage('extract_metadata', sleeper(0.1, {'title': 'Книга'}), outputs=('metadata',)),
+        Stage('extract_images', sleeper(0.1), resource=Resource.CPU_HEAVY),
+    ]
+    result = StageScheduler(stages).run()
+
+    assert result.values['stats'] == 5
+    assert all(run.status == 'done' for run in result.runs.values())
+    assert result.runs['analyze_text'].started >= result.runs['extract_text'].finished
+    # Время всей обработки близко к самому длинному этапу, а не к сумме
+    assert result.wall_time < 0.25
+    assert result.critical_path[-1] in {'analyze_text', 'extract_metadata', 'extract_images'}
+
+
+def test_failed_stage_skips_dependents():
+    """Если этап упал, зависящие от него этапы пропускаются, остальные выполняются."""
+    def broken():
+        raise RuntimeError('битый архив')
+
+    stages = [
+        Stage('extract_text', broken, outputs=('text',)),
+        Stage('analyze_text', lambda text: text, inputs=('text',), outputs=('stats',)),
+        Stage('report', lambda stats: stats, inputs=('stats',)),
+        Stage('extract_metadata', lambda: 'ok', outputs=('metadata',)),
+    ]
+    result = StageScheduler(stages).run()
+
+    assert result.runs['extract_text'].status == 'failed'
+    assert result.runs['analyze_text'].status == 'skipped'
+    assert result.runs['report'].status == 'skipped'
+    assert result.values['metadata'] == 'ok'
+
+
+def test_critical_path_follows_dependencies():
+    """Критический путь проходит через цепочку зависимостей."""
+    stages = [
+        Stage('a', sleeper(0.05, 1), outputs=('x',)),
+        Stage('b', sleeper(0.05, 2), inputs=('x',), outputs=('y',)),
+        Stage('c', sleeper(0.01)),
+    ]
+    result = StageScheduler(stages).run()
+
+    assert result.critical_path == ['a', 'b']
+    assert result.critical_path_time >= 0.1
+
+
+def test_invalid_graphs_are_rejected():
+    """Неизвестные входы и циклы обнаруживаются до запуска."""
+    with pytest.raises(ValueError):
+        StageScheduler([Stage('a', lambda missing: None, inputs=('missing',))]).run()
+    with pytest.raises(ValueError):
+        StageScheduler([
+            Stage('a', lambda y: 1, inputs=('y',), outputs=('x',)),
+            Stage('b', lambda x: 2, inputs=('x',), outputs=('y',)),
+        ]).run()
+
+
+def test_select_runs_only_requested_stages_and_dependencies():
+    """Выбор этапов добавляет зависимости и не запускает остальные этапы."""
+    started = []
+
+    def track(name, value=None):
+        def run(**kwargs):
+            started.append(name)
+            return value
+        return run
+
+    stages = [
+        Stage('extract_text', track('extract_text', 'текст'), outputs=('text',)),
+        Stage('analyze_text', track('analyze_text', 5), inputs=('text',), outputs=('stats',)),
+        Stage('extract_metadata', track('extract_metadata')),
+        Stage('extract_images', track('extract_images')),
+    ]
+    scheduler = StageScheduler(stages)
+
+    assert scheduler.required(['analyze_text']) == ['extract_text', 'analyze_text']
+    assert scheduler.required(['analyze_text'], {'text': 'готово'}) == ['analyze_text']
+    result = scheduler.select(['analyze_text', 'extract_metadata']).run()
+    assert sorted(started) == ['analyze_text', 'extract_metadata', 'extract_text']
+    assert set(result.runs) == {'extract_text', 'analyze_text', 'extract_metadata'}
+    with pytest.raises(ValueError):
+        scheduler.required(['split_chapters'])
+
+
+def test_critical_path_follows_pool_slots_when_saturated():
+    """Если этапы ждут слота в пуле, критический путь идет через этапы, занимавшие слот."""
+    stages = [Stage(f'image{i}', sleeper(0.05), resource=Resource.CPU_HEAVY) for i in range(4)]
+    result = StageScheduler(stages, max_workers={Resource.CPU_HEAVY: 1}).run()
+
+    assert sorted(result.critical_path) == ['image0', 'image1', 'image2', 'image3']
+    assert result.critical_path_time >= 0.2
+    assert result.critical_path_time + result.critical_path_wait == pytest.approx(result.wall_time, abs=0.02)
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+import main
+from test_async_pipeline import add_image
+from test_translation import build_epub
+
+
+@pytest.fixture
+def book(tmp_path):
+    epub_path = build_epub(tmp_path / 'book.epub', [('Глава 1', 'Первое слово. ' * 10), ('Глава 2', 'Второе.')])
+    add_image(epub_path)
+    return epub_path
+
+
+def test_process_parallel_runs_only_selected_stages(tmp_path, book):
+    """Выбранные этапы выполняются вместе с зависимостями, остальные не запускаются."""
+    processor = main.EpubProcessor(book, None, str(tmp_path / 'library'), str(tmp_path / 'out'))
+
+    result = processor.process_parallel(['metadata', 'text_analysis'])
+
+    assert result.metadata is not None
+    assert result.text_analysis.word_count > 0
+    assert set(result.thread_statuses) == {'extract_metadata', 'extract_text', 'analyze_text'}
+    assert result.image_extraction is None and result.chapters is None
+    assert not os.path.exists(tmp_path / 'library') and not os.path.exists(tmp_path / 'out')
+    assert 'image_extractor' not in vars(processor)
+
+    with pytest.raises(ValueError):
+        processor.process_parallel(['keyword_search'])
+    with pytest.raises(ValueError):
+        processor.process_parallel(['thumbnails'])
+
+
+def test_lazy_result_computes_fields_on_first_access(tmp_path, book, monkeypatch):
+    """Ленивый результат выполняет этап при первом обращении к полю и переиспользует текст."""
+    processor = main.EpubProcessor(book, 'слово', str(tmp_path / 'library'), str(tmp_path / 'out'))
+    calls = []
+    extract_text = processor.extract_text
+    monkeypatch.setattr(processor, 'extract_text', lambda: calls.append(1) or extract_text())
+
+    lazy = processor.lazy_result()
+    assert processor.result.text_analysis is None
+    assert lazy.text_analysis.word_count > 0
+    assert lazy.keyword_search.match_count == 10
+    assert lazy.text_analysis is processor.result.text_analysis
+    assert calls == [1]
+    assert lazy.image_extraction.count == 1
+    assert processor.result.metadata is None
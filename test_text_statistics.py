@@ -0,0 +1,50 @@
+import json
+from array import array
+
+import numpy as np
+
+import text_statistics
+from batch_journal import decode_value, encode_value
+from text_analyzer import TextAnalyzer
+from text_statistics import merge_statistics, text_statistics as statistics_of, tokenize
+
+CHAPTERS = ["Кот спал. Собака лаяла громко! Кто там?",
+            "The quick brown fox jumps over the lazy dog. It was beautiful.",
+            "Длинное предложение без точки в конце главы"]
+
+
+def test_chapters_merge_into_book_statistics():
+    """Главы считаются отдельно, их сумма совпадает со статистикой текста целиком; потоковый анализ дает то же."""
+    text = '\n'.join(CHAPTERS)
+    starts = [0, len(CHAPTERS[0]) + 1, len(CHAPTERS[0]) + len(CHAPTERS[1]) + 2]
+    analyzer = TextAnalyzer()
+    result = analyzer.analyze_text(text, document_starts=starts)
+    assert result.word_count == 26
+    assert [stats.words for stats in result.chapter_statistics] == [7, 12, 7]
+    assert [stats.language for stats in result.chapter_statistics] == ['ru', 'en', 'ru']
+    first = result.chapter_statistics[0]
+    assert first.sentences == 3 and first.sentence_lengths[2] == 2 and first.sentence_lengths[3] == 1
+    assert first.word_lengths.tolist()[:7] == [0, 0, 0, 3, 1, 1, 2]
+    assert first.syllables == 12
+
+    whole = statistics_of(text.lower(), *tokenize(text.lower()))
+    assert result.statistics.word_lengths == whole.word_lengths
+    assert result.statistics.word_length_percentiles == whole.word_length_percentiles
+    assert result.statistics.syllables == whole.syllables
+    stream = analyzer.analyze_stream(iter(CHAPTERS))
+    assert stream.chapter_statistics == result.chapter_statistics and stream.statistics == result.statistics
+
+
+def test_statistics_compact_and_same_without_numpy(monkeypatch):
+    """Распределения хранятся в array и переживают JSON журнала; без numpy значения те же."""
+    lowered = ' '.join(CHAPTERS * 50).lower()
+    stats = statistics_of(lowered, *tokenize(lowered))
+    assert isinstance(stats.word_lengths, array) and stats.word_lengths.typecode == 'I'
+    lengths = [len(word) for word in tokenize(lowered)[0]]
+    expected = np.percentile(lengths, text_statistics.PERCENTILES, method='inverted_cdf')
+    assert stats.word_length_percentiles.tolist() == expected.astype(int).tolist()
+    assert decode_value(json.loads(json.dumps(encode_value(stats)))) == stats
+
+    monkeypatch.setattr(text_statistics, '_numpy', lambda: None)
+    assert statistics_of(lowered, *tokenize(lowered)) == stats
+    assert merge_statistics([stats, stats]).word_length_percentiles == stats.word_length_percentiles
@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from translation import AsyncBookTranslator, TokenBucket, translate_book
+from toc_generator import TocGenerator
+
+
+def build_epub(path, chapters):
+    """Собирает минимальный EPUB с NCX оглавлением из списка (заголовок, текст)"""
+    manifest = ['<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>']
+    nav_points = []
+    with zipfile.ZipFile(path, 'w') as epub:
+        epub.writestr('mimetype', 'application/epub+zip')
+        epub.writestr('META-INF/container.xml',
+                      '<?xml version="1.0"?><container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+                      '<rootfiles><rootfile full-path="OPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles></container>')
+        for i, (title, text) in enumerate(chapters, 1):
+            epub.writestr(f'OPS/chapter{i}.xhtml', f'<html><body><h1>{title}</h1><p>{text}</p></body></html>')
+            manifest.append(f'<item id="ch{i}" href="chapter{i}.xhtml" media-type="application/xhtml+xml"/>')
+            nav_points.append(f'<navPoint id="n{i}" playOrder="{i}"><navLabel><text>{title}</text></navLabel>'
+                              f'<content src="chapter{i}.xhtml"/></navPoint>')
+        epub.writestr('OPS/content.opf',
+                      '<?xml version="1.0"?><package xmlns="http://www.idpf.org/2007/opf" version="2.0">'
+                      f'<manifest>{"".join(manifest)}</manifest><spine toc="ncx"/></package>')
+        epub.writestr('OPS/toc.ncx',
+                      '<?xml version="1.0"?><ncx xmlns="http://www.daisy.org/z3986/2005/ncx/">'
+                      f'<navMap>{"".join(nav_points)}</navMap></ncx>')
+    return str(path)
+
+
+@pytest.fixture
+def mock_translation_server():
+    """Локальный сервис перевода с задержкой; каждый третий запрос получает 503"""
+    state = {'requests': 0, 'in_flight': 0, 'max_in_flight': 0, 'lock': threading.Lock()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            with state['lock']:
+                state['requests'] += 1
+                number = state['requests']
+                state['in_flight'] += 1
+                state['max_in_flight'] = max(state['max_in_flight'], state['in_flight'])
+            time.sleep(0.05)
+            with state['lock']:
+                state['in_flight'] -= 1
+
+            if number % 3 == 0:
+                body, status = b'{}', 503
+            else:
+                body, status = json.dumps({'translatedText': payload['q'].upper()}).encode('utf-8'), 200
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/translate', state
+    server.shutdown()
+    server.server_close()
+
+
+def test_translate_book_all_chapters(tmp_path, mock_translation_server):
+    """Все главы переводятся с соблюдением лимита конкурентности и собираются по порядку."""
+    endpoint, state = mock_translation_server
+    chapters = [(f'Глава {i}', f'текст главы номер {i}') for i in range(1, 9)]
+    epub_path = build_epub(tmp_path / 'book.epub', chapters)
+    progress = []
+
+    result = translate_book(
+        epub_path, endpoint,
+        max_concurrency=2, rate_limit=200, backoff_base=0.01,
+        progress_callback=lambda chapter, done, total: progress.append((done, total)),
+    )
+
+    assert result.translated_count == 8
+    assert result.failed_count == 0
+    assert state['max_in_flight'] <= 2
+    assert state['requests'] > 8  # Часть запросов была повторена после 503
+    assert progress[-1] == (8, 8)
+    assert result.chapter_order['chapter3.xhtml'] == 2
+    assembled = result.assemble().split('\n\n')
+    assert assembled[0] == 'ГЛАВА 1 ТЕКСТ ГЛАВЫ НОМЕР 1'
+    assert assembled[7] == 'ГЛАВА 8 ТЕКСТ ГЛАВЫ НОМЕР 8'
+
+
+def test_load_chapters_follows_toc(tmp_path):
+    """Главы читаются в порядке оглавления."""
+    epub_path = build_epub(tmp_path / 'book.epub', [('Первая', 'один'), ('Вторая', 'два')])
+    chapters = AsyncBookTranslator.load_chapters(epub_path, TocGenerator(epub_path).generate_toc())
+
+    assert [chapter.src for chapter in chapters] == ['chapter1.xhtml', 'chapter2.xhtml']
+    assert chapters[1].text == 'Вторая два'
+
+
+def test_token_bucket_limits_rate():
+    """Token bucket не выдает больше токенов, чем позволяет скорость."""
+    import asyncio
+
+    async def consume():
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(consume()) >= 0.09
@@ -1,30 +1,58 @@
 import re
-from dataclasses import dataclass, field
-from typing import Dict, List
+import base64
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Sequence
 from collections import Counter
 
-@dataclass
-class TextAnalysisResult:
-    word_count: int = 0
-    char_count: int = 0
-    sentence_count: int = 0
-    paragraph_count: int = 0
-    word_frequency: Dict[str, int] = field(default_factory=dict)
-    search_word_frequency: int = 0
+from results import TextAnalysisResult
+from sketches import HyperLogLog, NgramStats
+from text_statistics import merge_statistics, text_statistics, tokenize
+
+if TYPE_CHECKING:
+    from minhash import MinHasher
+
+def split_documents(text: str, document_starts: Optional[Sequence[int]] = None) -> Iterator[str]:
+    """Документы (главы) text по смещениям TextExtractionResult.document_starts; без них - весь текст"""
+    starts = list(document_starts) if document_starts else [0]
+    for start, end in zip(starts, starts[1:] + [len(text)]):
+        yield text[start:end]
 
 class TextAnalyzer:
-    def __init__(self):
+    def __init__(self, minhasher: Optional['MinHasher'] = None, vocabulary_precision: Optional[int] = None):
+        # Подпись MinHash для поиска дубликатов в каталоге считается по тем же словам (None - не считается)
+        self.minhasher = minhasher
+        # Точность p скетча HyperLogLog различных слов (None - словарь не оценивается)
+        self.vocabulary_precision = vocabulary_precision
+        # Сколько самых частых слов попадает в word_frequency (analyze)
+        self.frequency_capacity = 1024
         self.word_pattern = re.compile(r'\b[а-яА-ЯёЁa-zA-Z]+\b', re.UNICODE)
         self.sentence_pattern = re.compile(r'[.!?]+', re.UNICODE)
         self.paragraph_pattern = re.compile(r'\n\s*\n', re.UNICODE)
 
-    def analyze_text(self, text: str, search_pattern: str = None) -> TextAnalysisResult:
-        """Анализирует текст и возвращает статистику"""
+    def analyze_text(self, text: str, search_pattern: str = None,
+                     document_starts: Optional[Sequence[int]] = None) -> TextAnalysisResult:
+        """Анализирует текст и возвращает статистику.
+
+        document_starts - смещения глав в text (TextExtractionResult.document_starts);
+        без них распределения и индексы удобочитаемости считаются для текста целиком.
+        """
         result = TextAnalysisResult()
         
-        # Подсчет слов
-        words = re.findall(r'\b\w+\b', text.lower())
+        # Подсчет слов: тот же проход дает длины предложений для распределений по главам
+        words = []
+        for document in split_documents(text, document_starts):
+            lowered = document.lower()
+            chapter_words, sentence_lengths = tokenize(lowered)
+            if chapter_words:
+                result.chapter_statistics.append(text_statistics(lowered, chapter_words, sentence_lengths))
+                words += chapter_words
+        result.statistics = merge_statistics(result.chapter_statistics)
         result.word_count = len(words)
+        if self.minhasher is not None:
+            result.minhash = self.minhasher.signature(words)
+        if self.vocabulary_precision is not None:
+            vocabulary = HyperLogLog(self.vocabulary_precision)
+            vocabulary.update(words)
+            self._set_vocabulary(result, vocabulary)
         
         # Подсчет символов
         result.char_count = len(text)
@@ -43,6 +71,89 @@ class TextAnalyzer:
         
         return result
 
+    def analyze_stream(self, chunks: Iterable[str], search_pattern: str = None) -> TextAnalysisResult:
+        """Считает ту же статистику, что analyze_text для ''.join(chunks), не собирая текст целиком.
+
+        Фрагменты должны делиться по границам слов (например, документы книги,
+        разделенные '\n'); в памяти одновременно находится только один фрагмент.
+        Распределения chapter_statistics считаются по фрагментам, в которых есть слова.
+        """
+        result = TextAnalysisResult()
+        search_regex = re.compile(r'\b' + re.escape(search_pattern.lower()) + r'\b') if search_pattern else None
+        # Для предложений и абзацев важно только, пуст ли незавершенный последний сегмент
+        sentence_carry = paragraph_carry = False
+        pending_newline = ''
+        minhash = self.minhasher.new() if self.minhasher is not None else None
+        vocabulary = HyperLogLog(self.vocabulary_precision) if self.vocabulary_precision is not None else None
+
+        def count_segments(pieces: List[str], carry: bool):
+            first = carry or bool(pieces[0].strip())
+            if len(pieces) == 1:
+                return 0, first
+            complete = first + sum(1 for piece in pieces[1:-1] if piece.strip())
+            return complete, bool(pieces[-1].strip())
+
+        for chunk in chunks:
+            if not chunk:
+                continue
+            result.char_count += len(chunk)
+            lowered = chunk.lower()
+            words, sentence_lengths = tokenize(lowered)
+            if words:
+                result.chapter_statistics.append(text_statistics(lowered, words, sentence_lengths))
+            result.word_count += len(words)
+            if minhash is not None:
+                minhash.update(words)
+            if vocabulary is not None:
+                vocabulary.update(words)
+            if search_regex is not None:
+                result.search_word_frequency += len(search_regex.findall(lowered))
+
+            complete, sentence_carry = count_segments(re.split(r'[.!?]+', chunk), sentence_carry)
+            result.sentence_count += complete
+
+            # Разделитель абзацев может начаться в конце одного фрагмента и закончиться в следующем
+            pieces = (pending_newline + chunk).split('\n\n')
+            pending_newline = ''
+            if pieces[-1].endswith('\n'):
+                pending_newline = '\n'
+                pieces[-1] = pieces[-1][:-1]
+            complete, paragraph_carry = count_segments(pieces, paragraph_carry)
+            result.paragraph_count += complete
+
+        result.sentence_count += sentence_carry
+        result.paragraph_count += paragraph_carry
+        result.statistics = merge_statistics(result.chapter_statistics)
+        if minhash is not None:
+            result.minhash = minhash.digest()
+        if vocabulary is not None:
+            self._set_vocabulary(result, vocabulary)
+        return result
+
+    @staticmethod
+    def _set_vocabulary(result: TextAnalysisResult, vocabulary: HyperLogLog):
+        result.vocabulary = vocabulary.estimate()
+        # Регистры хранятся в результате строкой: результат этапа записывается в журнал как JSON
+        result.vocabulary_sketch = base64.b64encode(vocabulary.to_bytes(compress=True)).decode('ascii')
+
+    @staticmethod
+    def vocabulary_sketch(result: TextAnalysisResult) -> Optional[HyperLogLog]:
+        """Скетч различных слов из результата анализа (None, если он не считался)"""
+        if not result.vocabulary_sketch:
+            return None
+        return HyperLogLog.from_bytes(base64.b64decode(result.vocabulary_sketch))
+
+    def ngram_stats(self, chunks: Iterable[str]) -> NgramStats:
+        """Частоты слов, биграмм и триграмм в фиксированной памяти (см. sketches.py).
+
+        Фрагменты (документы, главы) учитываются по одному; n-граммы не переходят
+        через границу фрагмента.
+        """
+        stats = NgramStats()
+        for chunk in chunks:
+            stats.update(self.word_pattern.findall(chunk.lower()))
+        return stats
+
     def analyze(self, text: str, search_pattern: str = None) -> TextAnalysisResult:
         """Анализирует текст и возвращает результаты"""
         result = TextAnalysisResult()
@@ -69,17 +180,14 @@ class TextAnalyzer:
         words = self.word_pattern.findall(text.lower())
         result.word_count = len(words)
         
-        # Подсчитываем частоту слов
-        word_freq = {}
-        for word in words:
-            if len(word) > 2:  # Игнорируем короткие слова
-                word_freq[word] = word_freq.get(word, 0) + 1
-        
-        result.word_frequency = word_freq
+        # Частоты слов - top-k по сводке Space-Saving: словарь не растет с размером текста
+        stats = NgramStats(orders=(1,), capacity=self.frequency_capacity, with_sketch=False)
+        stats.update([word for word in words if len(word) > 2])  # Игнорируем короткие слова
+        result.word_frequency = {hitter.item: hitter.count for hitter in stats.top(1, self.frequency_capacity)}
         
         # Если указан поисковый паттерн, подсчитываем его частоту
         if search_pattern:
             search_pattern = search_pattern.lower()
-            result.search_word_frequency = word_freq.get(search_pattern, 0)
+            result.search_word_frequency = words.count(search_pattern)
                 
         return result 
\ No newline at end of file
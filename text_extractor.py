@@ -1,18 +1,20 @@
-from dataclasses import dataclass
+from typing import Iterator
 import zipfile
 import xml.etree.ElementTree as ET
 import re
+import time
 
-@dataclass
-class TextExtractionResult:
-    text: str = ""
-    encoding: str = "utf-8"
+import events
+from instrumentation import subtask
+from results import TextExtractionResult
 
 class TextExtractor:
-    def extract_text(self, epub_path: str) -> TextExtractionResult:
-        """Извлекает текст из EPUB файла"""
-        result = TextExtractionResult()
-        
+    def iter_documents(self, epub_path: str, result: TextExtractionResult = None) -> Iterator[str]:
+        """Последовательно выдает очищенный текст XHTML документов книги.
+
+        В памяти одновременно находится только текущий документ; кодировка
+        последнего прочитанного документа записывается в result, если он передан.
+        """
         try:
             with zipfile.ZipFile(epub_path, 'r') as epub:
                 # Находим файл OPF
@@ -27,41 +29,57 @@ class TextExtractor:
                 # Находим все XHTML файлы
                 manifest = opf_root.find('.//{http://www.idpf.org/2007/opf}manifest')
                 if manifest is not None:
-                    text_content = []
-                    for item in manifest.findall('.//{http://www.idpf.org/2007/opf}item'):
-                        if item.get('media-type') == 'application/xhtml+xml':
-                            file_path = item.get('href')
-                            if file_path:
-                                try:
-                                    full_path = f"OPS/{file_path}"
-                                    content = epub.read(full_path)
-                                    
-                                    # Пробуем разные кодировки
-                                    encodings = ['utf-8', 'cp1251', 'windows-1251', 'latin1']
-                                    text = None
-                                    
-                                    for encoding in encodings:
-                                        try:
-                                            text = content.decode(encoding)
+                    documents = [item.get('href') for item in manifest.findall('.//{http://www.idpf.org/2007/opf}item')
+                                 if item.get('media-type') == 'application/xhtml+xml' and item.get('href')]
+                    for done, file_path in enumerate(documents, 1):
+                        started = time.perf_counter()
+                        size = 0
+                        with subtask(f"xhtml:{file_path}"):
+                            try:
+                                full_path = f"OPS/{file_path}"
+                                content = epub.read(full_path)
+                                size = len(content)
+                                
+                                # Пробуем разные кодировки
+                                encodings = ['utf-8', 'cp1251', 'windows-1251', 'latin1']
+                                text = None
+                                
+                                for encoding in encodings:
+                                    try:
+                                        text = content.decode(encoding)
+                                        if result is not None:
                                             result.encoding = encoding
-                                            break
-                                        except UnicodeDecodeError:
-                                            continue
-                                    
-                                    if text is None:
-                                        raise UnicodeDecodeError("Не удалось декодировать текст")
-                                    
-                                    # Удаляем HTML теги и лишние пробелы
-                                    text = re.sub(r'<[^>]+>', ' ', text)
-                                    text = re.sub(r'\s+', ' ', text).strip()
-                                    text_content.append(text)
-                                except Exception as e:
-                                    print(f"Ошибка при обработке файла {file_path}: {str(e)}")
-                    
-                    result.text = '\n'.join(text_content)
+                                        break
+                                    except UnicodeDecodeError:
+                                        continue
+                                
+                                if text is None:
+                                    raise UnicodeDecodeError("Не удалось декодировать текст")
+                                
+                                # Удаляем HTML теги и лишние пробелы
+                                text = re.sub(r'<[^>]+>', ' ', text)
+                                text = re.sub(r'\s+', ' ', text).strip()
+                            except Exception as e:
+                                events.problem(f"Ошибка при обработке файла {file_path}: {str(e)}", item=file_path, book=epub_path)
+                                events.emit(events.ItemProcessed, item=file_path, done=done, total=len(documents),
+                                            duration=time.perf_counter() - started, error=str(e), size=size,
+                                            book=epub_path)
+                                continue
+                        events.emit(events.ItemProcessed, item=file_path, done=done, total=len(documents),
+                                    duration=time.perf_counter() - started, size=size, book=epub_path)
+                        yield text
         
         except Exception as e:
-            print(f"Ошибка при извлечении текста: {str(e)}")
+            events.problem(f"Ошибка при извлечении текста: {str(e)}", book=epub_path)
             raise
-        
-        return result 
\ No newline at end of file
+
+    def extract_text(self, epub_path: str) -> TextExtractionResult:
+        """Извлекает текст из EPUB файла"""
+        result = TextExtractionResult()
+        documents = list(self.iter_documents(epub_path, result))
+        offset = 0
+        for document in documents:
+            result.document_starts.append(offset)
+            offset += len(document) + 1
+        result.text = '\n'.join(documents)
+        return result
@@ -1,38 +1,14 @@
-from dataclasses import dataclass
 from typing import List, Dict
 import re
 import zipfile
 import xml.etree.ElementTree as ET
-from bs4 import BeautifulSoup
 import tempfile
 import shutil
 import os
 import gc
-from collections import OrderedDict
 
-@dataclass
-class FormattingResult:
-    bold_headers: Dict[str, str] = None  # Словарь: оригинальный текст -> текст с жирным шрифтом
-    uppercase_headers: Dict[str, str] = None  # Словарь: оригинальный текст -> текст в верхнем регистре
-    formatted_text: str = ""  # Итоговый отформатированный текст
-    formatted_headers_count: int = 0  # Количество отформатированных заголовков
-    _all_headers: Dict[str, str] = None  # Хранит все найденные заголовки
-
-    def __post_init__(self):
-        if self.bold_headers is None:
-            self.bold_headers = OrderedDict()
-        if self.uppercase_headers is None:
-            self.uppercase_headers = OrderedDict()
-        if self._all_headers is None:
-            self._all_headers = OrderedDict()
-
-    def add_header(self, text: str):
-        """Добавляет заголовок в словари, ограничивая их размер до 10 элементов"""
-        if text not in self._all_headers:
-            self._all_headers[text] = text
-            if len(self.bold_headers) < 10:
-                self.bold_headers[text] = f'<span style="font-weight: bold;">{text}</span>'
-                self.uppercase_headers[text] = text.upper()
+import events
+from results import FormattingResult
 
 class TextFormatter:
     def __init__(self):
@@ -80,7 +56,7 @@ class TextFormatter:
                                                 if header_text:
                                                     result.add_header(header_text)
                                     except Exception as e:
-                                        print(f"Ошибка при чтении TOC: {str(e)}")
+                                        events.problem(f"Ошибка при чтении TOC: {str(e)}")
                 
                 # Находим все XHTML файлы
                 manifest = opf_root.find('.//{http://www.idpf.org/2007/opf}manifest')
@@ -107,7 +83,8 @@ class TextFormatter:
                                     if text is None:
                                         raise UnicodeDecodeError("Не удалось декодировать текст")
                                     
-                                    # Используем BeautifulSoup для парсинга HTML
+                                    # Используем BeautifulSoup для парсинга HTML (загружается при первом вызове)
+                                    from bs4 import BeautifulSoup
                                     soup = BeautifulSoup(text, 'html.parser')
                                     
                                     # Ищем заголовки в HTML-тегах
@@ -117,12 +94,12 @@ class TextFormatter:
                                             result.add_header(text)
                                     
                                 except Exception as e:
-                                    print(f"Ошибка при обработке файла {file_path}: {str(e)}")
+                                    events.problem(f"Ошибка при обработке файла {file_path}: {str(e)}")
             
             result.formatted_headers_count = len(result._all_headers)
             
         except Exception as e:
-            print(f"Ошибка при форматировании текста: {str(e)}")
+            events.problem(f"Ошибка при форматировании текста: {str(e)}")
         
         return result
         
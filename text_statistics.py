@@ -0,0 +1,119 @@
+import re
+from array import array
+from collections import Counter
+from typing import Iterable, List, Sequence, Tuple
+
+from results import TextStatistics
+
+# Гистограммы по точной длине: бин i - слова из i символов (предложения из i слов), последний
+# бин - все длиннее. Процентили считаются по гистограммам, поэтому главы складываются в книгу
+# без хранения самих длин, и процентили книги точны, пока длины не попадают в последний бин
+WORD_LENGTH_BINS = 32
+SENTENCE_LENGTH_BINS = 256
+PERCENTILES = (50, 90, 99)
+
+WORD_PATTERN = re.compile(r'\w+')  # Те же слова, что r'\b\w+\b' в TextAnalyzer
+SENTENCE_PATTERN = re.compile(r'[.!?]+')
+# Слоги: в русском слове каждая гласная - слог (считаются str.count, без списка совпадений),
+# в латинице - группа гласных подряд
+CYRILLIC_VOWELS = 'аеёиоуыэюя'
+LATIN_SYLLABLE_PATTERN = re.compile(r'[aeiouy]+')
+
+# Коэффициенты индексов Флеша и Флеша-Кинкейда: (база, ASL, ASW) и (ASL, ASW, сдвиг), где
+# ASL - слов в предложении, ASW - слогов в слове. Для русского - адаптация Оборневой
+READABILITY_COEFFICIENTS = {
+    'en': ((206.835, 1.015, 84.6), (0.39, 11.8, -15.59)),
+    'ru': ((206.835, 1.3, 60.1), (0.5, 8.4, -15.59)),
+}
+
+def tokenize(lowered: str) -> Tuple[List[str], List[int]]:
+    """Слова текста (в нижнем регистре) и число слов в каждом предложении за один проход"""
+    words: List[str] = []
+    sentence_lengths: List[int] = []
+    findall = WORD_PATTERN.findall
+    for sentence in SENTENCE_PATTERN.split(lowered):
+        tokens = findall(sentence)
+        if tokens:
+            words += tokens
+            sentence_lengths.append(len(tokens))
+    return words, sentence_lengths
+
+def _numpy():
+    try:
+        import numpy as np
+    except ImportError:  # Без numpy гистограммы считаются Counter: те же значения, но медленнее
+        return None
+    return np
+
+def _histogram(lengths: Iterable[int], bins: int, np) -> Tuple[array, int]:
+    """Гистограмма длин по точному значению и их сумма"""
+    if np is not None:
+        values = np.fromiter(lengths, dtype=np.int64)
+        histogram = np.bincount(np.minimum(values, bins - 1), minlength=bins)
+        return array('I', histogram.astype(np.uint32).tobytes()), int(values.sum())
+    counter = Counter(lengths)
+    histogram = array('I', bytes(4 * bins))
+    for length, count in counter.items():
+        histogram[min(length, bins - 1)] += count
+    return histogram, sum(length * count for length, count in counter.items())
+
+def _percentiles(histogram: array, np) -> array:
+    """Процентили PERCENTILES: наименьшая длина, не меньше которой q% значений (inverted CDF)"""
+    total = sum(histogram)
+    if not total:
+        return array('I', [0] * len(PERCENTILES))
+    ranks = [max(1, -(-q * total // 100)) for q in PERCENTILES]
+    if np is not None:
+        cumulative = np.cumsum(np.frombuffer(histogram, dtype=np.uint32), dtype=np.int64)
+        return array('I', np.searchsorted(cumulative, ranks).astype(np.uint32).tobytes())
+    values, cumulative, index = [], 0, 0
+    for rank in ranks:
+        while cumulative + histogram[index] < rank:
+            cumulative += histogram[index]
+            index += 1
+        values.append(index)
+    return array('I', values)
+
+def text_statistics(lowered: str, words: Sequence[str], sentence_lengths: Sequence[int]) -> TextStatistics:
+    """Статистика фрагмента по результату tokenize(lowered)"""
+    np = _numpy()
+    stats = TextStatistics(words=len(words), sentences=len(sentence_lengths))
+    stats.word_lengths, stats.letters = _histogram(map(len, words), WORD_LENGTH_BINS, np)
+    stats.sentence_lengths, _ = _histogram(sentence_lengths, SENTENCE_LENGTH_BINS, np)
+    # Гласные вне слов (в числах их нет, в знаках препинания тоже) не встречаются: слоги считаются по всему тексту
+    stats.cyrillic_syllables = sum(map(lowered.count, CYRILLIC_VOWELS))
+    stats.syllables = stats.cyrillic_syllables + len(LATIN_SYLLABLE_PATTERN.findall(lowered))
+    return _finish(stats, np)
+
+def merge_statistics(parts: Iterable[TextStatistics]) -> TextStatistics:
+    """Статистика объединения фрагментов (глав в книгу, книг в коллекцию)"""
+    np = _numpy()
+    total = TextStatistics(word_lengths=array('I', bytes(4 * WORD_LENGTH_BINS)),
+                           sentence_lengths=array('I', bytes(4 * SENTENCE_LENGTH_BINS)))
+    for part in parts:
+        total.words += part.words
+        total.sentences += part.sentences
+        total.letters += part.letters
+        total.syllables += part.syllables
+        total.cyrillic_syllables += part.cyrillic_syllables
+        for own, other in ((total.word_lengths, part.word_lengths), (total.sentence_lengths, part.sentence_lengths)):
+            for index, count in enumerate(other):
+                own[index] += count
+    return _finish(total, np)
+
+def _finish(stats: TextStatistics, np) -> TextStatistics:
+    """Дополняет суммы и гистограммы процентилями, средними и индексами удобочитаемости"""
+    stats.word_length_percentiles = _percentiles(stats.word_lengths, np)
+    stats.sentence_length_percentiles = _percentiles(stats.sentence_lengths, np)
+    if not stats.words or not stats.sentences:
+        return stats
+    asl = stats.words / stats.sentences
+    asw = stats.syllables / stats.words
+    stats.mean_word_length = stats.letters / stats.words
+    stats.mean_sentence_length = asl
+    stats.language = 'ru' if 2 * stats.cyrillic_syllables >= stats.syllables else 'en'
+    (base, asl_weight, asw_weight), (grade_asl, grade_asw, grade_shift) = READABILITY_COEFFICIENTS[stats.language]
+    stats.flesch_reading_ease = base - asl_weight * asl - asw_weight * asw
+    stats.flesch_kincaid_grade = grade_asl * asl + grade_asw * asw + grade_shift
+    stats.automated_readability_index = 4.71 * stats.mean_word_length + 0.5 * asl - 21.43
+    return stats
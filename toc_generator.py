@@ -1,26 +1,10 @@
 import zipfile
 import xml.etree.ElementTree as ET
-from dataclasses import dataclass, field
 from typing import List, Optional, Dict
-from bs4 import BeautifulSoup
 import os
 
-@dataclass
-class TocEntry:
-    title: str
-    href: str
-    level: int
-    children: List['TocEntry'] = field(default_factory=list)
-    num_children: int = 0
-
-@dataclass
-class TocResult:
-    chapters: List[Dict[str, str]] = None
-    total_chapters: int = 0
-
-    def __post_init__(self):
-        if self.chapters is None:
-            self.chapters = []
+import events
+from results import TocEntry, TocResult
 
 class TocGenerator:
     def __init__(self, epub_path: str):
@@ -72,10 +56,11 @@ class TocGenerator:
                                         
                                         result.total_chapters = len(result.chapters)
                                     except Exception as e:
-                                        print(f"Ошибка при чтении NCX файла {ncx_path}: {str(e)}")
+                                        events.problem(f"Ошибка при чтении NCX файла {ncx_path}: {str(e)}",
+                                                       item=ncx_path, book=self.epub_path)
         
         except Exception as e:
-            print(f"Ошибка при генерации оглавления: {str(e)}")
+            events.problem(f"Ошибка при генерации оглавления: {str(e)}", book=self.epub_path)
             raise
         
         return result
@@ -86,15 +71,16 @@ class TocGenerator:
         
         try:
             with zipfile.ZipFile(self.epub_path, 'r') as epub:
-                print("Содержимое EPUB файла:")
-                for file in epub.namelist():
-                    print(f"- {file}")
+                # Список файлов архива нужен только для отладки: без подписчиков он не строится
+                if events.enabled():
+                    listing = "\n".join(f"- {file}" for file in epub.namelist())
+                    events.diagnostic(f"Содержимое EPUB файла:\n{listing}", book=self.epub_path)
 
                 # Находим файл OPF
                 container = epub.read('META-INF/container.xml')
                 root = ET.fromstring(container)
                 opf_path = root.find('.//{urn:oasis:names:tc:opendocument:xmlns:container}rootfile').get('full-path')
-                print(f"\nПуть к OPF файлу: {opf_path}")
+                events.diagnostic(f"Путь к OPF файлу: {opf_path}", book=self.epub_path)
                 
                 # Читаем OPF файл
                 opf_content = epub.read(opf_path)
@@ -104,64 +90,68 @@ class TocGenerator:
                 nav_path = None
                 manifest = opf_root.find('.//opf:manifest', self.namespaces)
                 if manifest is not None:
-                    print("\nЭлементы манифеста:")
                     for item in manifest.findall('.//opf:item', self.namespaces):
-                        item_id = item.get('id', '')
-                        item_href = item.get('href', '')
-                        item_media_type = item.get('media-type', '')
-                        item_properties = item.get('properties', '')
-                        print(f"- ID: {item_id}, HREF: {item_href}, Type: {item_media_type}, Props: {item_properties}")
+                        if events.enabled():
+                            events.diagnostic(f"Элемент манифеста: ID: {item.get('id', '')}, HREF: {item.get('href', '')}, "
+                                              f"Type: {item.get('media-type', '')}, Props: {item.get('properties', '')}",
+                                              book=self.epub_path)
                         
                         if item.get('properties') == 'nav':
                             nav_path = item.get('href')
-                            print(f"\nНайден навигационный файл: {nav_path}")
+                            events.diagnostic(f"Найден навигационный файл: {nav_path}", book=self.epub_path)
                             break
                 
                 if nav_path:
                     # EPUB3 формат
                     try:
                         nav_content = epub.read(nav_path)
+                        # bs4 нужен только для EPUB3 оглавления и загружается при первом таком файле
+                        from bs4 import BeautifulSoup
                         soup = BeautifulSoup(nav_content, 'html.parser')
                         nav = soup.find('nav', attrs={'epub:type': 'toc'})
                         if nav:
                             result.entries = self._process_epub3_nav(nav)
                             result.count = self._count_entries(result.entries)
-                            print(f"\nУспешно обработан EPUB3 навигационный файл")
+                            events.diagnostic("Успешно обработан EPUB3 навигационный файл", book=self.epub_path)
                         else:
-                            print("\nНе найден элемент nav с атрибутом epub:type='toc'")
+                            events.problem("Не найден элемент nav с атрибутом epub:type='toc'", item=nav_path,
+                                           level="warning", book=self.epub_path)
                     except Exception as e:
-                        print(f"\nОшибка при обработке EPUB3 навигационного файла: {str(e)}")
+                        events.problem(f"Ошибка при обработке EPUB3 навигационного файла: {str(e)}", item=nav_path,
+                                       book=self.epub_path)
                 else:
                     # EPUB2 формат (NCX)
-                    print("\nПробуем EPUB2 формат (NCX)")
+                    events.diagnostic("Пробуем EPUB2 формат (NCX)", book=self.epub_path)
                     spine = opf_root.find('.//opf:spine', self.namespaces)
                     if spine is not None:
                         toc_id = spine.get('toc')
-                        print(f"ID оглавления из spine: {toc_id}")
+                        events.diagnostic(f"ID оглавления из spine: {toc_id}", book=self.epub_path)
                         if toc_id:
                             for item in manifest.findall('.//opf:item', self.namespaces):
                                 if item.get('id') == toc_id:
                                     ncx_path = item.get('href')
-                                    print(f"Найден путь к NCX файлу: {ncx_path}")
+                                    events.diagnostic(f"Найден путь к NCX файлу: {ncx_path}", book=self.epub_path)
                                     if ncx_path:
                                         try:
                                             # Добавляем префикс OPS/ к пути файла
                                             full_ncx_path = f"OPS/{ncx_path}"
-                                            print(f"Полный путь к NCX файлу: {full_ncx_path}")
+                                            events.diagnostic(f"Полный путь к NCX файлу: {full_ncx_path}", book=self.epub_path)
                                             ncx_content = epub.read(full_ncx_path)
                                             ncx_root = ET.fromstring(ncx_content)
                                             nav_map = ncx_root.find('.//ncx:navMap', self.namespaces)
                                             if nav_map is not None:
                                                 result.entries = self._process_nav_points(nav_map)
                                                 result.count = self._count_entries(result.entries)
-                                                print("Успешно обработан NCX файл")
+                                                events.diagnostic("Успешно обработан NCX файл", book=self.epub_path)
                                             else:
-                                                print("Не найден элемент navMap в NCX файле")
+                                                events.problem("Не найден элемент navMap в NCX файле", item=full_ncx_path,
+                                                               level="warning", book=self.epub_path)
                                         except Exception as e:
-                                            print(f"Ошибка при обработке NCX файла: {str(e)}")
+                                            events.problem(f"Ошибка при обработке NCX файла: {str(e)}", item=full_ncx_path,
+                                                           book=self.epub_path)
         
         except Exception as e:
-            print(f"Ошибка при генерации оглавления: {str(e)}")
+            events.problem(f"Ошибка при генерации оглавления: {str(e)}", book=self.epub_path)
         
         return result
 
@@ -1,21 +1,18 @@
 import os
+import re
+import sys
+import time
+import random
+import asyncio
 import zipfile
-from typing import Optional, Dict, List
+import xml.etree.ElementTree as ET
+from typing import Optional, Dict, List, Callable
+import httpx
 from googletrans import Translator
 from dataclasses import dataclass, field
 
-# Импортируем необходимые dataclasses или их определения, если они не глобальны
-# В данном случае, полагаемся на то, что TocResult и ProcessingResult определены в main
-
-@dataclass
-class TocResult:
-    toc_text: str = ""
-    toc_html: str = ""
-    chapters: List[Dict[str, str]] = field(default_factory=list)
-    total_chapters: int = 0
-
-# Предполагается, что этот dataclass определен в main.py и доступен
-# from main import ProcessingResult
+import events
+from results import TocResult
 
 def translate_first_chapter(
     epub_archive: zipfile.ZipFile,
@@ -46,14 +43,14 @@ def translate_first_chapter(
                 first_chapter_path = first_chapter_path.split('#')[0]
 
         if not first_chapter_path:
-            print("Не удалось найти путь к первой главе из TOC.")
+            events.problem("Не удалось найти путь к первой главе из TOC.", stage="translate")
             if hasattr(result, 'translated_first_chapter'):
                  result.translated_first_chapter = "Не удалось найти путь к первой главе из TOC."
             return None
 
         # Формируем полный путь к файлу главы, добавляя директорию OPF
         full_chapter_path = opf_dir + first_chapter_path
-        print(f"Попытка перевести главу по пути: {full_chapter_path}")
+        events.diagnostic(f"Попытка перевести главу по пути: {full_chapter_path}", stage="translate")
 
         # Читаем содержимое файла первой главы из архива EPUB
         chapter_content = epub_archive.read(full_chapter_path).decode('utf-8')
@@ -62,26 +59,273 @@ def translate_first_chapter(
         text_to_translate = chapter_content[:1000]
 
         if not text_to_translate.strip():
-             print("Текст для перевода пуст после извлечения из файла.")
+             events.problem("Текст для перевода пуст после извлечения из файла.", item=full_chapter_path,
+                            level="warning", stage="translate")
              if hasattr(result, 'translated_first_chapter'):
                   result.translated_first_chapter = "Текст для перевода пуст."
              return None
 
-        print("Перевод первых 1000 символов первой главы...")
+        events.diagnostic("Перевод первых 1000 символов первой главы...", stage="translate")
         # Выполняем перевод
         translation = translator.translate(text_to_translate, src='auto', dest='en')
 
         # Сохраняем результат перевода
         if hasattr(result, 'translated_first_chapter'):
              result.translated_first_chapter = translation.text
-        print("Перевод завершен.")
+        events.diagnostic("Перевод завершен.", stage="translate")
 
         return translation.text
 
     except Exception as e:
-        print(f"Ошибка при переводе первой главы: {str(e)}")
+        events.problem(f"Ошибка при переводе первой главы: {str(e)}", stage="translate")
         if hasattr(result, 'translated_first_chapter'):
              result.translated_first_chapter = f"Ошибка при переводе: {str(e)}"
         # Пока не re-raise исключение
         # raise
-        return None 
\ No newline at end of file
+        return None 
+
+@dataclass
+class ChapterTranslation:
+    index: int  # Порядковый номер главы в оглавлении
+    title: str = ""
+    src: str = ""  # Путь к файлу главы внутри архива
+    text: str = ""
+    translated_text: str = ""
+    attempts: int = 0  # Количество HTTP запросов, включая повторные
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+@dataclass
+class BookTranslationResult:
+    chapters: Dict[int, ChapterTranslation] = field(default_factory=dict)
+    chapter_order: Dict[str, int] = field(default_factory=dict)  # src главы -> порядковый номер
+    translated_count: int = 0
+    failed_count: int = 0
+    total_time: float = 0.0
+
+    def assemble(self, separator: str = "\n\n") -> str:
+        """Собирает переведенные главы в исходном порядке"""
+        return separator.join(
+            self.chapters[index].translated_text
+            for index in sorted(self.chapters)
+            if self.chapters[index].error is None
+        )
+
+class TranslationError(Exception):
+    """Ошибка сервиса перевода, которую можно повторить"""
+
+class TokenBucket:
+    """Ограничитель частоты запросов по алгоритму token bucket"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate  # Токенов в секунду
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """Ожидает, пока в корзине не появится нужное количество токенов"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+class AsyncBookTranslator:
+    """Асинхронный перевод всех глав книги из оглавления.
+
+    Запросы отправляются через один общий HTTP клиент (с переиспользованием соединений)
+    в сервис с API в стиле LibreTranslate: POST {"q", "source", "target"} -> {"translatedText"}.
+    """
+
+    retry_statuses = {429, 500, 502, 503, 504}
+    retry_exceptions = (httpx.ConnectTimeout, httpx.ReadTimeout, httpx.WriteTimeout, httpx.PoolTimeout,
+                        httpx.NetworkError, TranslationError)
+
+    def __init__(
+        self,
+        endpoint: str,
+        source: str = "auto",
+        target: str = "en",
+        max_concurrency: int = 4,
+        rate_limit: float = 5.0,
+        burst: Optional[float] = None,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 10.0,
+        timeout: float = 30.0,
+        chunk_size: int = 4500,
+        progress_callback: Optional[Callable[[ChapterTranslation, int, int], None]] = None,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.endpoint = endpoint
+        self.source = source
+        self.target = target
+        self.max_concurrency = max_concurrency
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self.client = client
+
+    @staticmethod
+    def load_chapters(epub_path: str, toc_result) -> List[ChapterTranslation]:
+        """Читает тексты глав из архива в порядке оглавления.
+
+        Несколько записей оглавления, ссылающихся на один файл (через якоря),
+        объединяются в одну главу.
+        """
+        chapters = []
+        seen = set()
+        with zipfile.ZipFile(epub_path, 'r') as epub:
+            container = epub.read('META-INF/container.xml')
+            root = ET.fromstring(container)
+            opf_path = root.find('.//{urn:oasis:names:tc:opendocument:xmlns:container}rootfile').get('full-path')
+            opf_dir = os.path.dirname(opf_path)
+
+            for item in toc_result.chapters:
+                src = (item.get('src') or '').split('#')[0]
+                if not src or src in seen:
+                    continue
+                seen.add(src)
+
+                chapter = ChapterTranslation(index=len(chapters), title=item.get('title') or "", src=src)
+                try:
+                    content = epub.read(os.path.join(opf_dir, src).replace('\\', '/'))
+                    text = None
+                    for encoding in ['utf-8', 'cp1251', 'windows-1251', 'latin1']:
+                        try:
+                            text = content.decode(encoding)
+                            break
+                        except UnicodeDecodeError:
+                            continue
+                    # Удаляем HTML теги и лишние пробелы
+                    text = re.sub(r'<[^>]+>', ' ', text)
+                    chapter.text = re.sub(r'\s+', ' ', text).strip()
+                except KeyError:
+                    chapter.error = f"Файл главы {src} не найден в архиве"
+                chapters.append(chapter)
+        return chapters
+
+    def _split_into_chunks(self, text: str) -> List[str]:
+        """Разбивает текст на куски не длиннее chunk_size, по возможности по границам предложений"""
+        chunks = []
+        while len(text) > self.chunk_size:
+            cut = max(text.rfind('. ', 0, self.chunk_size), text.rfind(' ', 0, self.chunk_size))
+            if cut <= 0:
+                cut = self.chunk_size
+            else:
+                cut += 1
+            chunks.append(text[:cut].strip())
+            text = text[cut:]
+        if text.strip():
+            chunks.append(text.strip())
+        return chunks
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Экспоненциальная задержка с джиттером (или значение Retry-After от сервиса)"""
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _translate_chunk(self, client: httpx.AsyncClient, text: str, chapter: ChapterTranslation,
+                               bucket: TokenBucket, semaphore: asyncio.Semaphore) -> str:
+        """Переводит один кусок текста с ограничением частоты и повторными попытками"""
+        payload = {"q": text, "source": self.source, "target": self.target, "format": "text"}
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            await bucket.acquire()
+            async with semaphore:
+                chapter.attempts += 1
+                try:
+                    response = await client.post(self.endpoint, json=payload, timeout=self.timeout)
+                    if response.status_code in self.retry_statuses:
+                        retry_after = response.headers.get('Retry-After')
+                        raise TranslationError(f"Сервис перевода вернул статус {response.status_code}")
+                    response.raise_for_status()
+                    return response.json()["translatedText"]
+                except self.retry_exceptions as e:
+                    if attempt == self.max_retries:
+                        raise TranslationError(f"Не удалось перевести после {attempt + 1} попыток: {str(e)}")
+            await asyncio.sleep(self._backoff_delay(attempt, retry_after))
+
+    async def _translate_chapter(self, client, chapter: ChapterTranslation, bucket, semaphore, progress) -> ChapterTranslation:
+        """Переводит главу целиком, кусок за куском"""
+        start = time.monotonic()
+        if chapter.error is None:
+            try:
+                parts = []
+                for chunk in self._split_into_chunks(chapter.text):
+                    parts.append(await self._translate_chunk(client, chunk, chapter, bucket, semaphore))
+                chapter.translated_text = ' '.join(parts)
+            except Exception as e:
+                chapter.error = str(e)
+        chapter.elapsed = time.monotonic() - start
+
+        progress['done'] += 1
+        events.emit(events.ItemProcessed, book=progress['book'], stage="translate", item=chapter.title or chapter.src,
+                    done=progress['done'], total=progress['total'], duration=chapter.elapsed, error=chapter.error)
+        if self.progress_callback:
+            self.progress_callback(chapter, progress['done'], progress['total'])
+        return chapter
+
+    async def translate_book(self, epub_path: str, toc_result=None) -> BookTranslationResult:
+        """Переводит все главы из оглавления конкурентно"""
+        start = time.monotonic()
+        if toc_result is None:
+            from toc_generator import TocGenerator
+            toc_result = TocGenerator(epub_path).generate_toc()
+
+        chapters = self.load_chapters(epub_path, toc_result)
+        result = BookTranslationResult(chapter_order={chapter.src: chapter.index for chapter in chapters})
+
+        bucket = TokenBucket(self.rate_limit, self.burst)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        progress = {'done': 0, 'total': len(chapters), 'book': epub_path}
+
+        client = self.client or httpx.AsyncClient(timeout=self.timeout)
+        try:
+            translated = await asyncio.gather(*(
+                self._translate_chapter(client, chapter, bucket, semaphore, progress)
+                for chapter in chapters
+            ))
+        finally:
+            if self.client is None:
+                await client.aclose()
+
+        for chapter in translated:
+            result.chapters[chapter.index] = chapter
+            if chapter.error is None:
+                result.translated_count += 1
+            else:
+                result.failed_count += 1
+        result.total_time = time.monotonic() - start
+        return result
+
+def translate_book(epub_path: str, endpoint: str, toc_result=None, **kwargs) -> BookTranslationResult:
+    """Синхронная обертка над AsyncBookTranslator.translate_book"""
+    return asyncio.run(AsyncBookTranslator(endpoint, **kwargs).translate_book(epub_path, toc_result))
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Использование: python translation.py <путь_к_epub> <url_сервиса_перевода> [язык]")
+        sys.exit(1)
+
+    with events.subscribed(events.ConsoleRenderer(progress=True)):
+        book = translate_book(sys.argv[1], sys.argv[2], target=sys.argv[3] if len(sys.argv) > 3 else "en")
+    print(f"Переведено глав: {book.translated_count}, с ошибками: {book.failed_count}, время: {book.total_time:.2f} с")